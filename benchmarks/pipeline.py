@@ -0,0 +1,271 @@
+# Throughput of the model pipeline and the surfaceprop catalog at increasing sizes.
+#
+# Generates synthetic surfaceprop.yaml catalogs, game surfaceproperties files and
+# SMDs in a temporary folder, times each stage on them (best of --repeat runs)
+# and reports items per second, so a regression shows up as a stage that stops
+# scaling rather than as one slow number.
+#
+#     python benchmarks/pipeline.py
+#     python benchmarks/pipeline.py --quick
+#     python benchmarks/pipeline.py --catalog-sizes 1000 100000 --mesh-sizes 500000 --json pipeline.json
+#
+# Runs headless. The cache is redirected to the temporary folder, so the user's
+# cache is neither read nor overwritten.
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+CATALOG_SIZES = (1000, 10000, 50000)
+MESH_SIZES = (1000, 10000, 100000)
+BATCH_SIZES = (10, 50)
+QUICK_CATALOG_SIZES = (1000, 5000)
+QUICK_MESH_SIZES = (1000, 10000)
+QUICK_BATCH_SIZES = (10,)
+
+GAMES = ('Base', 'hl2', 'css', 'tf2', 'l4d2', 'csgo', 'portal2', 'gmod')
+WORDS = ('metal', 'sheet', 'wood', 'plank', 'crate', 'concrete', 'block', 'glass', 'window', 'rubber',
+         'tire', 'dirt', 'gravel', 'flesh', 'plastic', 'barrel', 'chain', 'link', 'fence', 'porcelain')
+# Typed one character at a time; the last word is misspelled to exercise the fuzzy index
+QUERY = 'metal sheet wdoo'
+
+
+def best_of(repeat, func):
+    # Best wall time in seconds; the minimum is the least disturbed by other processes
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def row(stage, size, unit, seconds, items=None):
+    items = size if items is None else items
+    return {
+        'stage': stage,
+        'size': size,
+        'ms': round(seconds * 1000, 3),
+        'unit': unit,
+        'per_second': round(items / seconds, 1) if seconds > 0 else None,
+    }
+
+
+def write_catalog_yaml(path, entries):
+    lines = ['types:']
+    per_category = 50
+    for idx in range(entries):
+        if idx % per_category == 0:
+            lines.append(f'  Category_{idx // per_category}:')
+        name = f'{WORDS[idx % len(WORDS)]}_{WORDS[(idx // 7) % len(WORDS)]}_{idx}'
+        description = f'{WORDS[(idx // 3) % len(WORDS)]} {WORDS[(idx // 11) % len(WORDS)]} surface {idx}'
+        games = ', '.join(GAMES[(idx + offset) % len(GAMES)] for offset in range(1 + idx % 3))
+        lines.append(f'    {name}:')
+        lines.append(f'      description: "{description}"')
+        lines.append(f'      supported_games: "{games}"')
+        lines.append(f'      density: {500 + idx % 2000}')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def write_game_dir(game_dir, entries):
+    scripts_dir = os.path.join(game_dir, 'scripts')
+    os.makedirs(scripts_dir, exist_ok=True)
+    with open(os.path.join(scripts_dir, 'surfaceproperties.txt'), 'w', encoding='utf-8') as f:
+        for idx in range(entries):
+            f.write(f'"{WORDS[idx % len(WORDS)]}_game_{idx}"\n{{\n'
+                    f'\t"base"\t\t"{WORDS[(idx // 5) % len(WORDS)]}"\n'
+                    f'\t"density"\t"{500 + idx % 2000}"\n'
+                    f'\t"gamematerial"\t"M"\n}}\n\n')
+
+
+def make_mesh(triangles):
+    # A latitude/longitude sphere with about the requested number of triangles,
+    # unshared vertices as in every SMD, and one bone
+    import numpy as np
+    import smd
+    rings = max(2, int((triangles / 4) ** 0.5))
+    segments = max(3, triangles // (2 * rings))
+    theta = np.linspace(0, np.pi, rings + 1)
+    phi = np.linspace(0, 2 * np.pi, segments + 1)
+    grid = np.stack(np.meshgrid(theta, phi, indexing='ij'), axis=-1)
+    points = np.stack([np.sin(grid[..., 0]) * np.cos(grid[..., 1]),
+                       np.sin(grid[..., 0]) * np.sin(grid[..., 1]),
+                       np.cos(grid[..., 0])], axis=-1) * 64.0
+    a, b = points[:-1, :-1], points[1:, :-1]
+    c, d = points[1:, 1:], points[:-1, 1:]
+    corners = np.concatenate([np.stack([a, b, c], axis=2).reshape(-1, 3, 3),
+                              np.stack([a, c, d], axis=2).reshape(-1, 3, 3)])
+    count = len(corners)
+
+    mesh = smd.SMDMesh('synthetic.smd')
+    mesh.nodes = [(0, 'root', -1)]
+    mesh.frame_times = [0]
+    mesh.skeleton = np.zeros((1, 1, 6), dtype=np.float32)
+    mesh.materials = ['synthetic_a', 'synthetic_b']
+    mesh.positions = corners.reshape(-1, 3).astype(np.float32)
+    norms = np.linalg.norm(mesh.positions, axis=1, keepdims=True)
+    mesh.normals = (mesh.positions / np.maximum(norms, 1e-6)).astype(np.float32)
+    mesh.uvs = (mesh.positions[:, :2] / 128.0 + 0.5).astype(np.float32)
+    mesh.parents = np.zeros(count * 3, dtype=np.int16)
+    mesh.bone_ids = np.full((count * 3, 1), -1, dtype=np.int16)
+    mesh.bone_weights = np.zeros((count * 3, 1), dtype=np.float32)
+    mesh.material_ids = (np.arange(count) % 2).astype(np.int32)
+    return mesh
+
+
+def bench_catalog(size, work_dir, repeat):
+    import surfaceprops
+    import search
+    yaml_path = os.path.join(work_dir, f'catalog_{size}.yaml')
+    write_catalog_yaml(yaml_path, size)
+    game_dir = os.path.join(work_dir, f'game_{size}')
+    write_game_dir(game_dir, size)
+    game_file = os.path.join(game_dir, 'scripts', 'surfaceproperties.txt')
+
+    rows = []
+    seconds, catalog = best_of(repeat, lambda: surfaceprops.load_catalog(yaml_path, use_cache=False))
+    rows.append(row('catalog.load_yaml', size, 'entries', seconds))
+    surfaceprops.load_catalog(yaml_path)
+    seconds, _ = best_of(repeat, lambda: surfaceprops.load_catalog(yaml_path))
+    rows.append(row('catalog.load_cached', size, 'entries', seconds))
+    seconds, _ = best_of(repeat, lambda: surfaceprops.parse_surfaceproperties(game_file))
+    rows.append(row('catalog.parse_surfaceproperties', size, 'entries', seconds))
+    surfaceprops.load_catalog(yaml_path, game_dirs=[game_dir])
+    seconds, merged = best_of(repeat, lambda: surfaceprops.load_catalog(yaml_path, game_dirs=[game_dir]))
+    rows.append(row('catalog.load_merged_cached', len(merged.keys), 'entries', seconds))
+    seconds, _ = best_of(repeat, lambda: catalog.filter_by_games(['hl2', 'tf2']))
+    rows.append(row('catalog.filter_by_games', size, 'entries', seconds))
+
+    entries = [(key.replace(' - ', ' '), catalog.surfaceprops[key].get('description') or '') for key in catalog.keys]
+    seconds, index = best_of(repeat, lambda: search.SearchIndex(entries))
+    rows.append(row('search.build_index', size, 'entries', seconds))
+
+    def type_query():
+        # A fresh index each run so the fuzzy cache does not carry over
+        catalog._search_index = None
+        catalog.search_index()
+        start = time.perf_counter()
+        for end in range(1, len(QUERY) + 1):
+            catalog.search(QUERY[:end], ['hl2', 'tf2'])
+        return time.perf_counter() - start
+
+    typing = min(type_query() for _ in range(repeat))
+    rows.append(row('search.keystroke', size, 'keystrokes', typing / len(QUERY), 1))
+    return rows
+
+
+def bench_mesh(size, work_dir, repeat):
+    import smd
+    import lod
+    import collision
+    import validate
+    mesh = make_mesh(size)
+    triangles = mesh.triangle_count
+    smd_path = os.path.join(work_dir, f'mesh_{size}.smd')
+
+    rows = []
+    seconds, _ = best_of(repeat, lambda: smd.write_smd(smd_path, mesh))
+    rows.append(row('smd.write_smd', triangles, 'triangles', seconds))
+    seconds, mesh = best_of(repeat, lambda: smd.read_smd(smd_path))
+    rows.append(row('smd.read_smd', triangles, 'triangles', seconds))
+    seconds, _ = best_of(repeat, lambda: validate.validate_mesh(mesh))
+    rows.append(row('validate.validate_mesh', triangles, 'triangles', seconds))
+    seconds, _ = best_of(repeat, lambda: lod.decimate(mesh, 0.5))
+    rows.append(row('lod.decimate', triangles, 'triangles', seconds))
+    seconds, _ = best_of(repeat, lambda: collision.convex_hull(mesh.positions))
+    rows.append(row('collision.convex_hull', triangles, 'triangles', seconds))
+    seconds, _ = best_of(repeat, lambda: collision.convex_decomposition(mesh, max_pieces=8))
+    rows.append(row('collision.convex_decomposition', triangles, 'triangles', seconds))
+    return rows
+
+
+def bench_batch(size, work_dir, repeat, workers):
+    import numpy as np
+    import qcgen
+    import smd
+    batch_dir = os.path.join(work_dir, f'batch_{size}')
+    os.makedirs(batch_dir, exist_ok=True)
+    mesh = make_mesh(2000)
+    smd_files = []
+    for idx in range(size):
+        smd_path = os.path.join(batch_dir, f'model_{idx}.smd')
+        mesh.positions = mesh.positions + np.float32(0.001)
+        smd.write_smd(smd_path, mesh)
+        smd_files.append(smd_path)
+
+    base = dict(qcgen.DEFAULT_SETTINGS, surfaceprop='metal', staticprop=True)
+    settings = [dict(base, body_smd=path, model_name=f'model_{idx}') for idx, path in enumerate(smd_files)]
+    rows = []
+    seconds, _ = best_of(repeat, lambda: [qcgen.build_qc_content(s) for s in settings])
+    rows.append(row('qcgen.build_qc_content', size, 'qcs', seconds))
+
+    base = dict(base, lod_ratios=[0.5, 0.25], collision_mode='hull', validate=True)
+    runs = [('1 worker', 1)]
+    if (workers or os.cpu_count() or 1) > 1:
+        runs.append((f'{workers or os.cpu_count()} workers', workers))
+    for label, pool_workers in runs:
+        seconds, results = best_of(repeat, lambda: qcgen.batch_generate(smd_files, base, workers=pool_workers))
+        failed = [result for result in results if result['error']]
+        if failed:
+            raise RuntimeError(f"batch failed for {failed[0]['smd']}: {failed[0]['error']}")
+        rows.append(row(f'qcgen.batch_generate ({label})', size, 'models', seconds))
+    return rows
+
+
+def print_table(rows):
+    print(f"{'stage':<44} {'size':>9} {'best ms':>11} {'per second':>22}")
+    for result in rows:
+        rate = f"{result['per_second']:,.0f} {result['unit']}" if result['per_second'] is not None else '-'
+        print(f"{result['stage']:<44} {result['size']:>9,} {result['ms']:>11,.2f} {rate:>22}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure catalog and model pipeline throughput on synthetic data.")
+    parser.add_argument('--catalog-sizes', type=int, nargs='*', help="surfaceprop entries per catalog.")
+    parser.add_argument('--mesh-sizes', type=int, nargs='*', help="Triangles per SMD.")
+    parser.add_argument('--batch-sizes', type=int, nargs='*', help="Models per batch run.")
+    parser.add_argument('--quick', action='store_true', help="Smaller sizes for a fast smoke run.")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=None, help="Workers for the parallel batch run (default: all CPUs).")
+    parser.add_argument('--json', metavar='FILE', help="Also write the results to FILE.")
+    args = parser.parse_args(argv)
+
+    catalog_sizes = args.catalog_sizes if args.catalog_sizes is not None else (QUICK_CATALOG_SIZES if args.quick else CATALOG_SIZES)
+    mesh_sizes = args.mesh_sizes if args.mesh_sizes is not None else (QUICK_MESH_SIZES if args.quick else MESH_SIZES)
+    batch_sizes = args.batch_sizes if args.batch_sizes is not None else (QUICK_BATCH_SIZES if args.quick else BATCH_SIZES)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.environ['QCGEN_CACHE_DIR'] = os.path.join(work_dir, 'cache')
+        for size in catalog_sizes:
+            rows += bench_catalog(size, work_dir, args.repeat)
+        for size in mesh_sizes:
+            rows += bench_mesh(size, work_dir, args.repeat)
+        for size in batch_sizes:
+            rows += bench_batch(size, work_dir, args.repeat, args.workers)
+
+    print_table(rows)
+    if args.json:
+        results = {
+            'repeat': args.repeat,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'results': rows,
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
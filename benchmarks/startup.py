@@ -0,0 +1,83 @@
+# Time-to-first-window for the QC File Generator GUI.
+#
+# Launches the app with --startup-time several times and reports the wall
+# time from process start to exit (interpreter startup, imports and the first
+# drawn window) alongside the in-process time the app reports.
+#
+#     python benchmarks/startup.py --runs 20 --json startup.json
+#     python benchmarks/startup.py --command dist/qc-generator.exe
+#
+# Needs a display; on a headless Linux box run it under xvfb-run.
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_once(command, env):
+    start = time.perf_counter()
+    completed = subprocess.run(command + ['--startup-time'], cwd=REPO_ROOT, env=env,
+                               capture_output=True, text=True, check=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    reported = json.loads(completed.stdout.strip().splitlines()[-1])
+    return wall_ms, reported['first_window_ms']
+
+
+def summarize(samples):
+    return {
+        'min': round(min(samples), 1),
+        'median': round(statistics.median(samples), 1),
+        'max': round(max(samples), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how long the GUI takes to show its first window.")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=1, help="Runs discarded first so the OS file cache is warm.")
+    parser.add_argument('--command', nargs='+', default=[sys.executable, 'main.py'], help="Program to launch, e.g. a PyInstaller build.")
+    parser.add_argument('--cold-cache', action='store_true', help="Give every run an empty qc-generator cache directory.")
+    parser.add_argument('--json', metavar='FILE', help="Also write the results to FILE.")
+    args = parser.parse_args(argv)
+
+    wall, first_window = [], []
+    for run in range(args.warmup + args.runs):
+        env = dict(os.environ)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            if args.cold_cache:
+                env['QCGEN_CACHE_DIR'] = cache_dir
+            try:
+                wall_ms, first_window_ms = run_once(args.command, env)
+            except subprocess.CalledProcessError as e:
+                print(f"Error: {' '.join(e.cmd)} exited with {e.returncode}\n{e.stderr}", file=sys.stderr)
+                return 1
+        if run >= args.warmup:
+            wall.append(wall_ms)
+            first_window.append(first_window_ms)
+
+    results = {
+        'command': args.command,
+        'runs': args.runs,
+        'cold_cache': args.cold_cache,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'process_wall_ms': summarize(wall),
+        'first_window_ms': summarize(first_window),
+    }
+    print(f"process start to exit: {results['process_wall_ms']}")
+    print(f"in-process first window: {results['first_window_ms']}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+# Per-stage totals for a timing trace written with QCGEN_TRACE.
+#
+#     QCGEN_TRACE=trace.jsonl python main.py --batch models --generate-lods 0.5
+#     python benchmarks/trace_summary.py trace.jsonl
+#     python benchmarks/trace_summary.py trace.jsonl --json summary.json
+#
+# Stages are listed by total time. Nested stages are counted in their parents
+# too, so the totals do not add up to the wall time.
+import os
+import sys
+import json
+import argparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import timing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a QCGEN_TRACE timing trace.")
+    parser.add_argument('trace', help="JSON lines file written with QCGEN_TRACE.")
+    parser.add_argument('--json', metavar='FILE', help="Also write the summary to FILE.")
+    args = parser.parse_args(argv)
+
+    try:
+        summary = timing.summarize(timing.read_trace(args.trace))
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(f"{'stage':<40} {'count':>7} {'total ms':>11} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for name, stats in summary.items():
+        print(f"{name:<40} {stats['count']:>7} {stats['total_ms']:>11,.1f} {stats['mean_ms']:>10,.2f} "
+              f"{stats['p50_ms']:>10,.2f} {stats['p95_ms']:>10,.2f} {stats['max_ms']:>10,.2f}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+import os
+import csv
+import json
+import qcgen
+
+# Manifest column -> settings key. Headers are matched case-insensitively with
+# spaces and dashes treated as underscores.
+COLUMNS = {
+    'smd': 'body_smd',
+    'smd_path': 'body_smd',
+    'body_smd': 'body_smd',
+    'model_name': 'model_name',
+    'working_folder': 'model_working_folder',
+    'model_working_folder': 'model_working_folder',
+    'surfaceprop': 'surfaceprop',
+    'mass': 'mass',
+    'static': 'staticprop',
+    'staticprop': 'staticprop',
+    'lods': 'lods',
+    'collision_model': 'collisionmodel',
+    'collisionmodel': 'collisionmodel',
+    'concave': 'concave',
+    'scale': 'scale',
+    'body_name': 'body_name',
+    'mostly_opaque': 'mostlyopaque',
+    'mostlyopaque': 'mostlyopaque',
+    'cast_texture_shadows': 'casttextureshadows',
+    'casttextureshadows': 'casttextureshadows',
+    'generate_lods': 'lod_ratios',
+    'generate_collision': 'collision_mode',
+    'template': 'qc_template',
+    'qc_template': 'qc_template',
+}
+
+BOOLEAN_SETTINGS = ('staticprop', 'concave', 'mostlyopaque', 'casttextureshadows')
+FLOAT_SETTINGS = ('mass', 'scale')
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'x')
+FALSE_VALUES = ('0', 'false', 'no', 'n', '')
+
+MANIFEST_EXTENSIONS = ('.csv', '.json')
+
+
+def _column_key(header):
+    return header.strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def read_manifest(path):
+    # Returns [(row_number, {column: value})]; row numbers match what a
+    # spreadsheet shows (CSV data starts on line 2) or the JSON list position.
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            columns = reader.fieldnames or []
+            rows = [(reader.line_num, row) for row in reader]
+    elif ext == '.json':
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get('rows', [])
+        if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+            raise ValueError(f"{os.path.basename(path)} must contain a list of objects, one per model")
+        rows = list(enumerate(data, start=1))
+        columns = sorted({column for _, row in rows for column in row})
+    else:
+        raise ValueError(f"Unsupported manifest type '{ext}', expected one of: {', '.join(MANIFEST_EXTENSIONS)}")
+
+    unknown = sorted(column for column in columns if column is not None and _column_key(column) not in COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown columns in {os.path.basename(path)}: {', '.join(unknown)}. Known columns: {', '.join(sorted(COLUMNS))}")
+    if not any(COLUMNS[_column_key(column)] == 'body_smd' for column in columns if column is not None):
+        raise ValueError(f"{os.path.basename(path)} has no smd column")
+
+    normalized = []
+    for row_number, row in rows:
+        values = {}
+        for column, value in row.items():
+            if column is None:
+                continue
+            if isinstance(value, str):
+                value = value.strip()
+            if value is None or value == '':
+                continue
+            values[COLUMNS[_column_key(column)]] = value
+        normalized.append((row_number, values))
+    return normalized
+
+
+def parse_lods(value):
+    # "20:model_lod1.smd; 40:model_lod2.smd" in a CSV cell, or in JSON a list of
+    # {"screen_size", "lod_model"} objects or [screen_size, lod_model] pairs
+    if isinstance(value, str):
+        pairs = []
+        for part in value.replace(',', ';').split(';'):
+            part = part.strip()
+            if not part:
+                continue
+            if ':' not in part:
+                raise ValueError(f"LOD '{part}' must look like screen_size:lod_model.smd")
+            screen_size, lod_model = part.split(':', 1)
+            pairs.append((screen_size, lod_model))
+    elif isinstance(value, list):
+        pairs = [(item.get('screen_size'), item.get('lod_model')) if isinstance(item, dict) else tuple(item) for item in value]
+    else:
+        raise ValueError("lods must be text like '20:model_lod1.smd; 40:model_lod2.smd' or a list")
+
+    lods = []
+    for screen_size, lod_model in pairs:
+        screen_size = str(screen_size).strip()
+        lod_model = str(lod_model or '').strip().replace('\\', '/')
+        try:
+            float(screen_size)
+        except ValueError:
+            raise ValueError(f"LOD screen size '{screen_size}' is not a number")
+        if not lod_model:
+            raise ValueError(f"LOD at screen size {screen_size} has no model")
+        lods.append({'screen_size': screen_size, 'lod_model': lod_model})
+    return lods
+
+
+def _parse_boolean(key, value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"{key} must be yes/no, true/false or 1/0, got '{value}'")
+
+
+def row_settings(values, base_settings, catalog, manifest_dir):
+    # Every problem in the row is collected instead of stopping at the first
+    settings = dict(base_settings)
+    settings['lods'] = list(base_settings.get('lods', []))
+    errors = []
+
+    for key, value in values.items():
+        try:
+            if key in BOOLEAN_SETTINGS:
+                settings[key] = _parse_boolean(key, value)
+            elif key in FLOAT_SETTINGS:
+                settings[key] = float(value)
+                if settings[key] <= 0:
+                    raise ValueError(f"{key} must be greater than 0")
+            elif key == 'lods':
+                settings['lods'] = parse_lods(value)
+            elif key == 'lod_ratios':
+                import lod
+                if not isinstance(value, str):
+                    # JSON lists get the same range check as "0.5, 0.25"
+                    value = ','.join(map(str, value if isinstance(value, (list, tuple)) else [value]))
+                settings['lod_ratios'] = lod.parse_ratios(value)
+            elif key == 'collision_mode':
+                import collision
+                if value not in collision.COLLISION_MODES:
+                    raise ValueError(f"generate_collision must be one of {', '.join(collision.COLLISION_MODES)}, got '{value}'")
+                settings['collision_mode'] = value
+            else:
+                settings[key] = str(value)
+        except (TypeError, ValueError) as e:
+            message = str(e)
+            errors.append(message if key in message else f"{key}: {message}")
+
+    smd_path = settings.get('body_smd', '')
+    if not smd_path:
+        errors.append("smd is empty")
+    else:
+        smd_path = os.path.normpath(os.path.join(manifest_dir, smd_path.replace('\\', '/')))
+        settings['body_smd'] = smd_path
+        if not smd_path.lower().endswith('.smd'):
+            errors.append(f"smd '{values['body_smd']}' is not an .smd file")
+        elif not os.path.isfile(smd_path):
+            errors.append(f"smd file not found: {smd_path}")
+
+    if settings.get('surfaceprop'):
+        key = catalog.find(settings['surfaceprop'])
+        if key is None:
+            errors.append(f"unknown surfaceprop '{settings['surfaceprop']}'")
+        else:
+            settings['surfaceprop'] = key
+
+    if settings.get('casttextureshadows') and not settings.get('staticprop'):
+        errors.append("cast_texture_shadows needs static")
+
+    if smd_path and not settings.get('lod_ratios'):
+        for lod_entry in settings['lods']:
+            if not os.path.isfile(os.path.join(os.path.dirname(smd_path), lod_entry['lod_model'])):
+                errors.append(f"LOD model not found: {lod_entry['lod_model']}")
+    if smd_path and settings.get('collisionmodel') and not settings.get('collision_mode'):
+        if not os.path.isfile(os.path.join(os.path.dirname(smd_path), settings['collisionmodel'])):
+            errors.append(f"collision model not found: {settings['collisionmodel']}")
+
+    if settings.get('qc_template'):
+        # Relative to the manifest like the SMD; compiled here so a broken template
+        # is reported once per row instead of failing in every worker
+        settings['qc_template'] = os.path.normpath(os.path.join(manifest_dir, settings['qc_template']))
+        try:
+            qcgen.qc_template(settings)
+        except (OSError, ValueError) as e:
+            errors.append(str(e))
+
+    if settings.get('auto_mass'):
+        settings['density'] = catalog.density(settings.get('surfaceprop', ''))
+        if not settings['density']:
+            errors.append("auto mass needs a surfaceprop with a density")
+
+    return settings, errors
+
+
+def load_rows(path, base_settings, catalog):
+    # Validates every row before anything is generated. Returns one entry per
+    # row: {'row', 'smd', 'settings' (None when invalid), 'errors'}.
+    manifest_dir = os.path.dirname(os.path.abspath(path))
+    rows = []
+    outputs = {}
+    for row_number, values in read_manifest(path):
+        settings, errors = row_settings(values, base_settings, catalog, manifest_dir)
+        smd_path = settings.get('body_smd', '')
+        if smd_path:
+            qc_path = os.path.normcase(qcgen.qc_path_for(smd_path))
+            if qc_path in outputs:
+                errors.append(f"writes the same QC as row {outputs[qc_path]}")
+            else:
+                outputs[qc_path] = row_number
+        rows.append({'row': row_number, 'smd': smd_path, 'settings': None if errors else settings, 'errors': errors})
+    return rows
+
+
+def generate_rows(rows, workers=None, progress=None, manifest=None):
+    # Runs every valid row on the process pool; a failing row only records its
+    # own error. Invalid rows are passed through with their validation errors.
+    valid = [row for row in rows if row['settings'] is not None]
+    results = qcgen.generate_many([(row['smd'], row['settings']) for row in valid], workers, progress, manifest)
+    for row, result in zip(valid, results):
+        row['result'] = result
+        if result['error']:
+            row['errors'].append(result['error'])
+    return rows
+
+
+def summarize(rows):
+    # One line per failed row with all of its errors
+    return [f"Row {row['row']} ({os.path.basename(row['smd']) or 'no smd'}): {'; '.join(row['errors'])}"
+            for row in rows if row['errors']]
@@ -0,0 +1,79 @@
+import os
+import sys
+import pickle
+import hashlib
+import tempfile
+
+CACHE_DIR_ENV = 'QCGEN_CACHE_DIR'
+CONFIG_DIR_ENV = 'QCGEN_CONFIG_DIR'
+
+
+def cache_dir(*parts):
+    base = os.environ.get(CACHE_DIR_ENV)
+    if not base:
+        if sys.platform == 'win32':
+            base = os.path.join(os.environ.get('LOCALAPPDATA') or os.path.expanduser('~'), 'qc-generator', 'cache')
+        else:
+            base = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'qc-generator')
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def config_dir(*parts):
+    # User preferences; unlike the cache, deleting this folder loses something
+    base = os.environ.get(CONFIG_DIR_ENV)
+    if not base:
+        if sys.platform == 'win32':
+            base = os.path.join(os.environ.get('APPDATA') or os.path.expanduser('~'), 'qc-generator')
+        else:
+            base = os.path.join(os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config'), 'qc-generator')
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def path_key(path):
+    # Stable file name for a cache entry that belongs to a given source path
+    return hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:20]
+
+
+def bytes_sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_pickle(path):
+    # A missing or unreadable cache is just a cache miss
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        return None
+
+
+def write_pickle(path, obj):
+    write_bytes(path, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def write_bytes(path, data):
+    # Write to a temp file and rename so readers never see a half-written file
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
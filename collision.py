@@ -0,0 +1,382 @@
+import os
+import re
+import numpy as np
+import smd
+import timing
+
+# studiomdl refuses collision models with more convex pieces than this
+MAX_CONVEX_PIECES = 20
+
+# Stop splitting once no piece is deeper than this fraction of the model size
+DEFAULT_CONCAVITY = 0.02
+
+# Flat pieces are given this much thickness (in model units) so they have volume
+MIN_THICKNESS = 0.5
+
+# A cut must shrink the enclosed hull volume by at least this fraction to be kept
+MIN_VOLUME_GAIN = 0.02
+
+# Candidate cut positions along each axis, as fractions of the piece's extent
+SPLIT_FRACTIONS = (0.25, 0.5, 0.75)
+
+# Surface samples used to measure concavity of each piece
+CONCAVITY_SAMPLES = 20000
+
+# Points are snapped to 1/QUANTIZE of the model size before building hulls
+QUANTIZE = 4096
+
+# Hulls are built from the extreme points along this many directions, which
+# bounds their complexity no matter how dense the render mesh is
+HULL_DIRECTIONS = 512
+
+# Source units are inches; surfaceprop densities are kg/m^3
+CUBIC_INCHES_TO_CUBIC_METERS = 0.0254 ** 3
+
+COLLISION_MODES = ('hull', 'decompose')
+COLLISION_MATERIAL = 'phys'
+COLLISION_FILE_PATTERN = re.compile(r'_phys\.smd$', re.IGNORECASE)
+
+
+def collision_path_for(smd_path):
+    return f"{os.path.splitext(smd_path)[0]}_phys.smd"
+
+
+def is_collision_file(smd_path):
+    return bool(COLLISION_FILE_PATTERN.search(smd_path))
+
+
+def _sphere_directions(count):
+    # Evenly spread unit vectors (Fibonacci sphere)
+    idx = np.arange(count) + 0.5
+    z = 1 - 2 * idx / count
+    radius = np.sqrt(1 - z * z)
+    theta = np.pi * (1 + 5 ** 0.5) * idx
+    return np.stack([radius * np.cos(theta), radius * np.sin(theta), z], axis=1)
+
+
+def _extreme_points(points, directions, chunk=65536):
+    support = np.full(len(directions), -np.inf)
+    chosen = np.zeros(len(directions), dtype=np.int64)
+    for start in range(0, len(points), chunk):
+        # directions x points, so the reduction runs along contiguous rows
+        projection = directions @ points[start:start + chunk].T
+        best = np.argmax(projection, axis=1)
+        value = projection[np.arange(len(directions)), best]
+        better = value > support
+        support[better] = value[better]
+        chosen[better] = best[better] + start
+    return points[np.unique(chosen)]
+
+
+def _plane(points, face):
+    a, b, c = points[face[0]], points[face[1]], points[face[2]]
+    normal = np.cross(b - a, c - a)
+    length = np.linalg.norm(normal)
+    if length == 0:
+        return normal, 0.0
+    normal /= length
+    return normal, float(normal @ a)
+
+
+def _thicken(points, normal):
+    return np.concatenate([points, points + normal * MIN_THICKNESS])
+
+
+def _initial_simplex(points, eps):
+    # Extreme pair on the widest axis, then farthest from that line and plane
+    axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+    i0, i1 = int(np.argmin(points[:, axis])), int(np.argmax(points[:, axis]))
+    direction = points[i1] - points[i0]
+    direction /= np.linalg.norm(direction)
+    offsets = points - points[i0]
+    line_distance = np.linalg.norm(offsets - np.outer(offsets @ direction, direction), axis=1)
+    i2 = int(np.argmax(line_distance))
+    if line_distance[i2] <= eps:
+        raise ValueError("Model is degenerate; all points are collinear")
+    normal = np.cross(points[i1] - points[i0], points[i2] - points[i0])
+    normal /= np.linalg.norm(normal)
+    plane_distance = offsets @ normal
+    i3 = int(np.argmax(np.abs(plane_distance)))
+    if abs(plane_distance[i3]) <= eps:
+        return None, normal
+    return [i0, i1, i2, i3], None
+
+
+def convex_hull(points):
+    # Quickhull: faces keep their outside point sets, and every distance test
+    # is vectorized over the points or faces involved.
+    points = np.asarray(points, dtype=np.float64)
+    extent = float((points.max(axis=0) - points.min(axis=0)).max()) if len(points) else 0.0
+    if len(points) < 4 or extent == 0:
+        raise ValueError("At least four non-coplanar points are required for a convex hull")
+
+    if len(points) > HULL_DIRECTIONS:
+        points = _extreme_points(points, _sphere_directions(HULL_DIRECTIONS))
+    points = np.unique(np.round(points / (extent / QUANTIZE)) * (extent / QUANTIZE), axis=0)
+    eps = extent * 1e-9
+    simplex, flat_normal = _initial_simplex(points, eps)
+    if simplex is None:
+        points = _thicken(points, flat_normal)
+        simplex, _ = _initial_simplex(points, eps)
+
+    centroid = points[simplex].mean(axis=0)
+    normals, offsets, faces = [], [], []
+    for face in ([0, 1, 2], [0, 1, 3], [0, 2, 3], [1, 2, 3]):
+        face = [simplex[idx] for idx in face]
+        normal, offset = _plane(points, face)
+        if normal @ centroid - offset > 0:
+            face = [face[0], face[2], face[1]]
+            normal, offset = -normal, -offset
+        faces.append(face)
+        normals.append(normal)
+        offsets.append(offset)
+
+    normals = np.array(normals)
+    offsets = np.array(offsets)
+    alive = np.ones(4, dtype=bool)
+
+    # Assign every point to the face it is farthest outside of
+    distances = points @ normals.T - offsets
+    best = np.argmax(distances, axis=1)
+    outside_mask = distances[np.arange(len(points)), best] > eps
+    outside_mask[simplex] = False
+    outside = {face_id: np.flatnonzero(outside_mask & (best == face_id)) for face_id in range(4)}
+
+    pending = [face_id for face_id, members in outside.items() if len(members)]
+    while pending:
+        face_id = pending.pop()
+        if not alive[face_id] or not len(outside.get(face_id, ())):
+            continue
+        members = outside[face_id]
+        apex = int(members[np.argmax(points[members] @ normals[face_id] - offsets[face_id])])
+
+        visible = np.flatnonzero(alive & (normals @ points[apex] - offsets > eps))
+        edges = set()
+        for visible_id in visible.tolist():
+            a, b, c = faces[visible_id]
+            edges.update(((a, b), (b, c), (c, a)))
+        horizon = [edge for edge in edges if (edge[1], edge[0]) not in edges]
+
+        orphans = np.concatenate([outside.pop(visible_id, np.zeros(0, dtype=np.int64)) for visible_id in visible.tolist()])
+        orphans = orphans[orphans != apex]
+        alive[visible] = False
+
+        new_ids = []
+        new_normals = []
+        new_offsets = []
+        for a, b in horizon:
+            face = [a, b, apex]
+            normal, offset = _plane(points, face)
+            new_ids.append(len(faces))
+            faces.append(face)
+            new_normals.append(normal)
+            new_offsets.append(offset)
+        new_normals = np.array(new_normals)
+        new_offsets = np.array(new_offsets)
+        normals = np.concatenate([normals, new_normals])
+        offsets = np.concatenate([offsets, new_offsets])
+        alive = np.concatenate([alive, np.ones(len(new_ids), dtype=bool)])
+
+        if len(orphans):
+            distances = points[orphans] @ new_normals.T - new_offsets
+            best = np.argmax(distances, axis=1)
+            still_outside = distances[np.arange(len(orphans)), best] > eps
+            for slot, new_id in enumerate(new_ids):
+                members = orphans[still_outside & (best == slot)]
+                if len(members):
+                    outside[new_id] = members
+                    pending.append(new_id)
+
+    hull_faces = np.array([faces[face_id] for face_id in np.flatnonzero(alive)], dtype=np.int64)
+    used, remapped = np.unique(hull_faces, return_inverse=True)
+    return points[used], remapped.reshape(-1, 3)
+
+
+def hull_volume(vertices, faces):
+    triangles = vertices[faces]
+    return float(np.einsum('ij,ij->i', triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2])).sum() / 6.0)
+
+
+def mesh_volume(positions):
+    # Sum of signed tetrahedra against the origin; exact for closed meshes and
+    # for collision models made of several closed pieces
+    # One float64 row per coordinate keeps the arithmetic below on contiguous memory
+    coords = np.asarray(positions).reshape(-1, 9).T.astype(np.float64)
+    x0, y0, z0, x1, y1, z1, x2, y2, z2 = coords
+    determinants = x0 * (y1 * z2 - z1 * y2) + y0 * (z1 * x2 - x1 * z2) + z0 * (x1 * y2 - y1 * x2)
+    return abs(float(determinants.sum())) / 6.0
+
+
+def estimate_mass(volume, density, scale=1.0):
+    # $scale applies to every axis, so the volume grows with its cube
+    return round(volume * scale ** 3 * CUBIC_INCHES_TO_CUBIC_METERS * density, 2)
+
+
+@timing.traced('collision.estimate_mass_from_smd', 'collision_smd')
+def estimate_mass_from_smd(collision_smd, density, scale=1.0):
+    return estimate_mass(mesh_volume(smd.read_smd(collision_smd).positions), density, scale)
+
+
+def _hull_depth(samples, vertices, faces):
+    # How far each sample lies inside the hull (0 on the boundary)
+    triangles = vertices[faces]
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    keep = lengths > 0
+    normals = normals[keep] / lengths[keep, None]
+    offsets = np.einsum('ij,ij->i', normals, triangles[keep, 0])
+    return np.maximum((offsets - samples @ normals.T).min(axis=1), 0.0)
+
+
+def _interpolate(a, b, da, db):
+    return a + (b - a) * (da / (da - db))[:, None]
+
+
+def _rotate(triangles, distances, first):
+    order = (first[:, None] + np.arange(3)) % 3
+    return np.take_along_axis(triangles, order[:, :, None], axis=1), np.take_along_axis(distances, order, axis=1)
+
+
+def clip_triangles(triangles, axis, value, keep_below=True):
+    # Keep the part of each triangle on one side of an axis-aligned plane.
+    # Triangles with one vertex kept become one triangle, with two kept become
+    # two; vertices are rotated rather than reordered so winding is preserved.
+    distances = triangles[:, :, axis] - value
+    if not keep_below:
+        distances = -distances
+    inside = distances <= 0
+    count = inside.sum(axis=1)
+    clipped = [triangles[count == 3]]
+
+    one = count == 1
+    if one.any():
+        t, d = _rotate(triangles[one], distances[one], np.argmax(inside[one], axis=1))
+        a, b, c = t[:, 0], t[:, 1], t[:, 2]
+        clipped.append(np.stack([a, _interpolate(a, b, d[:, 0], d[:, 1]), _interpolate(a, c, d[:, 0], d[:, 2])], axis=1))
+
+    two = count == 2
+    if two.any():
+        t, d = _rotate(triangles[two], distances[two], np.argmin(inside[two], axis=1))
+        o, b, c = t[:, 0], t[:, 1], t[:, 2]
+        ob = _interpolate(o, b, d[:, 0], d[:, 1])
+        oc = _interpolate(o, c, d[:, 0], d[:, 2])
+        clipped.append(np.stack([ob, b, c], axis=1))
+        clipped.append(np.stack([ob, c, oc], axis=1))
+
+    return np.concatenate(clipped)
+
+
+def _surface_samples(triangles):
+    samples = np.concatenate([triangles.mean(axis=1), triangles.reshape(-1, 3)])
+    if len(samples) > CONCAVITY_SAMPLES:
+        samples = samples[np.random.default_rng(0).choice(len(samples), CONCAVITY_SAMPLES, replace=False)]
+    return samples
+
+
+class _Piece:
+    # A closed region of the model, bounded by its clipped surface and the
+    # cutting planes. The hull of the clipped surface is the hull of the region.
+    def __init__(self, triangles, model_size):
+        self.triangles = triangles
+        self.vertices, self.faces = convex_hull(triangles.reshape(-1, 3))
+        self.samples = _surface_samples(triangles)
+        depth = _hull_depth(self.samples, self.vertices, self.faces)
+        self.concavity = float(depth.max()) / model_size
+
+
+def _split(piece, model_size):
+    # Try cuts at a few positions along each axis and keep the one whose two
+    # hulls enclose the least volume, i.e. that carves away the most empty space
+    best = None
+    lo = piece.vertices.min(axis=0)
+    hi = piece.vertices.max(axis=0)
+    for axis in range(3):
+        for fraction in SPLIT_FRACTIONS:
+            value = lo[axis] + (hi[axis] - lo[axis]) * fraction
+            below = clip_triangles(piece.triangles, axis, value, keep_below=True)
+            above = clip_triangles(piece.triangles, axis, value, keep_below=False)
+            if not len(below) or not len(above):
+                continue
+            try:
+                children = (_Piece(below, model_size), _Piece(above, model_size))
+            except ValueError:
+                continue
+            score = sum(hull_volume(child.vertices, child.faces) for child in children)
+            if best is None or score < best[0]:
+                best = (score, children)
+    if best is None or best[0] > hull_volume(piece.vertices, piece.faces) * (1 - MIN_VOLUME_GAIN):
+        return None
+    return best[1]
+
+
+def convex_decomposition(mesh, max_pieces=MAX_CONVEX_PIECES, concavity=DEFAULT_CONCAVITY, progress=None):
+    # Approximate decomposition: repeatedly split the most concave piece
+    # with an axis-aligned plane until it is convex enough or the cap is hit.
+    progress = progress or (lambda done, total: None)
+    triangles = mesh.positions.reshape(-1, 3, 3).astype(np.float64)
+    model_size = max(float((triangles.max(axis=(0, 1)) - triangles.min(axis=(0, 1))).max()), 1e-9)
+    pieces = [_Piece(triangles, model_size)]
+    while len(pieces) < max_pieces:
+        worst = max(range(len(pieces)), key=lambda idx: pieces[idx].concavity)
+        if pieces[worst].concavity <= concavity:
+            break
+        children = _split(pieces[worst], model_size)
+        if children is None:
+            # No cut helps; stop considering it
+            pieces[worst].concavity = 0.0
+            continue
+        pieces[worst:worst + 1] = list(children)
+        progress(len(pieces), max_pieces)
+    return [(piece.vertices, piece.faces) for piece in pieces]
+
+
+def hulls_to_mesh(hulls, template):
+    positions = np.concatenate([vertices[faces].reshape(-1, 3) for vertices, faces in hulls]).astype(np.float32)
+    triangles = positions.reshape(-1, 3, 3)
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-30)[:, None]
+
+    mesh = smd.SMDMesh()
+    mesh.nodes = list(template.nodes) or [(0, "root", -1)]
+    mesh.frame_times = list(template.frame_times[:1]) or [0]
+    mesh.skeleton = template.skeleton[:1] if len(template.skeleton) else np.zeros((1, len(mesh.nodes), 6), dtype=np.float32)
+    mesh.materials = [COLLISION_MATERIAL]
+    mesh.positions = positions
+    mesh.normals = np.repeat(normals, 3, axis=0).astype(np.float32)
+    mesh.uvs = np.zeros((len(positions), 2), dtype=np.float32)
+    mesh.parents = np.zeros(len(positions), dtype=np.int16)
+    mesh.bone_ids = np.zeros((len(positions), 1), dtype=np.int16)
+    mesh.bone_weights = np.ones((len(positions), 1), dtype=np.float32)
+    mesh.material_ids = np.zeros(len(triangles), dtype=np.int32)
+    return mesh
+
+
+@timing.traced('collision.generate_collision', 'smd_path', 'mode')
+def generate_collision(smd_path, mode='hull', max_pieces=MAX_CONVEX_PIECES, mesh=None, progress=None):
+    # progress(done, total) is reported in pieces; for a single hull it only
+    # moves once the hull is built.
+    if mode not in COLLISION_MODES:
+        raise ValueError(f"Unknown collision mode '{mode}', expected one of: {', '.join(COLLISION_MODES)}")
+    progress = progress or (lambda done, total: None)
+    if mesh is None:
+        mesh = smd.read_smd(smd_path)
+    if mesh.triangle_count == 0:
+        raise ValueError(f"{os.path.basename(smd_path)} has no triangles")
+
+    max_pieces = min(max_pieces, MAX_CONVEX_PIECES)
+    if mode == 'hull':
+        hulls = [convex_hull(mesh.positions)]
+    else:
+        hulls = convex_decomposition(mesh, max_pieces=max_pieces, progress=progress)
+    progress(1, 1)
+
+    collision_path = collision_path_for(smd_path)
+    smd.write_smd(collision_path, hulls_to_mesh(hulls, mesh))
+    return {
+        'collisionmodel': os.path.relpath(collision_path, os.path.dirname(smd_path)).replace("\\", "/"),
+        # More than one piece needs $concave or studiomdl shrinkwraps them back into one hull
+        'concave': len(hulls) > 1,
+        'piece_count': len(hulls),
+        'volume': sum(hull_volume(vertices, faces) for vertices, faces in hulls),
+    }
+
@@ -0,0 +1,209 @@
+import os
+import re
+import json
+import shlex
+import shutil
+import hashlib
+import threading
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cache
+import manifest
+import timing
+
+# Bump to force every model to recompile
+COMPILE_CACHE_VERSION = 2
+
+# Model file arguments in a QC ($body, $sequence, $collisionmodel, replacemodel, ...)
+QC_FILE_REFERENCE = re.compile(r'[^"]+\.(?:smd|dmx|vta|qci)$', re.IGNORECASE)
+
+# studiomdl prints "writing <path>:" for every file it produces
+WRITING_LINE = re.compile(r'^\s*writing\s+(.+?\.(?:mdl|vvd|vtx|phy|ani))\s*:?\s*$', re.IGNORECASE)
+# Files looked for next to <game>/models/<$modelname> when the log names none
+OUTPUT_EXTENSIONS = ('.mdl', '.vvd', '.phy', '.ani', '.dx90.vtx', '.dx80.vtx', '.sw.vtx', '.vtx')
+
+
+def referenced_files(qc_path):
+    # Every $include'd file plus the model files named anywhere in the QC or its
+    # includes; studiomdl resolves those against the QC's own folder
+    import qcfile
+    qc = qcfile.load_qc(qc_path)
+    qc_dir = os.path.dirname(qc['path'])
+    files = set(qc['files'][1:])
+
+    def collect(commands):
+        for command in commands:
+            for token in command['args']:
+                if QC_FILE_REFERENCE.match(token[1]):
+                    files.add(os.path.normpath(os.path.join(qc_dir, token[1].replace('\\', '/'))))
+            collect(command['block'] or [])
+
+    collect(qc['commands'])
+    return sorted(files)
+
+
+def compile_command(compiler, extra_args, qc_path):
+    if isinstance(extra_args, str):
+        extra_args = shlex.split(extra_args, posix=os.name != 'nt')
+    return [compiler] + list(extra_args) + [qc_path]
+
+
+def log_path_for(qc_path):
+    return os.path.splitext(qc_path)[0] + '.log'
+
+
+def model_outputs(command, qc_path):
+    # The compiled files that exist for this QC under -game (or VPROJECT)/models
+    game_dir = os.environ.get('VPROJECT')
+    if '-game' in command[:-1]:
+        index = command.index('-game')
+        if index + 1 < len(command) - 1:
+            game_dir = command[index + 1]
+    if not game_dir:
+        return []
+    import qcfile
+    modelname = next((qc_command['args'][0][1] for qc_command in qcfile.load_qc(qc_path)['commands']
+                      if qc_command['name'] == '$modelname' and qc_command['args']), None)
+    if not modelname:
+        return []
+    base = os.path.join(game_dir, 'models', os.path.splitext(modelname.replace('\\', '/').strip('/'))[0])
+    return [base + extension for extension in OUTPUT_EXTENSIONS if os.path.isfile(base + extension)]
+
+
+class CompileCache:
+    # Remembers the input key of every QC that compiled successfully, with the
+    # files the compile produced; a deleted output makes the entry stale
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache.cache_dir('compile'), 'results.json')
+        self.lock = threading.Lock()
+        data = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if data.get('version') != COMPILE_CACHE_VERSION:
+            data = {}
+        self.results = data.get('results', {})
+        self.files = data.get('files', {})
+
+    def key(self, command, qc_path):
+        with self.lock:
+            known = dict(self.files)
+        digest = hashlib.sha256()
+        digest.update(json.dumps(command[:-1]).encode('utf-8'))
+        # A different compiler build can produce different output
+        for path in [command[0], qc_path] + referenced_files(qc_path):
+            sha256, entry = manifest.file_digest(path, known)
+            if entry:
+                with self.lock:
+                    self.files[path] = entry
+            # The full path, so same-named files in different folders cannot trade places
+            digest.update(f'\0{os.path.normcase(os.path.abspath(path))}\0{sha256}'.encode('utf-8'))
+        return digest.hexdigest()
+
+    def is_current(self, qc_path, key):
+        with self.lock:
+            entry = self.results.get(os.path.abspath(qc_path))
+        if not entry or entry['key'] != key:
+            return False
+        return all(os.path.isfile(path) for path in entry['outputs'])
+
+    def record(self, qc_path, key, outputs):
+        with self.lock:
+            self.results[os.path.abspath(qc_path)] = {'key': key, 'outputs': sorted(set(outputs))}
+
+    def forget(self, qc_path):
+        with self.lock:
+            self.results.pop(os.path.abspath(qc_path), None)
+
+    def save(self):
+        with self.lock:
+            data = {'version': COMPILE_CACHE_VERSION, 'results': self.results, 'files': self.files}
+        cache.write_bytes(self.path, json.dumps(data, sort_keys=True).encode('utf-8'))
+
+
+def _resolve_compiler(compiler):
+    if os.path.isfile(compiler):
+        return os.path.abspath(compiler)
+    found = shutil.which(compiler)
+    if not found:
+        raise FileNotFoundError(f"Compiler not found: {compiler}")
+    return found
+
+
+@timing.traced('compiler.compile_one', 'qc_path')
+def _compile_one(compiler, extra_args, qc_path, compile_cache, on_event, cancel_event):
+    result = {'qc': qc_path, 'status': None, 'returncode': None, 'log': log_path_for(qc_path), 'duration': 0.0, 'error': None}
+    if cancel_event is not None and cancel_event.is_set():
+        result['status'] = 'cancelled'
+        return result
+
+    command = compile_command(compiler, extra_args, qc_path)
+    try:
+        key = compile_cache.key(command, qc_path)
+    except Exception as e:
+        # An unreadable or unparsable QC fails this job only
+        result['status'], result['error'] = 'failed', str(e)
+        on_event('finished', result)
+        return result
+
+    if compile_cache.is_current(qc_path, key):
+        result['status'] = 'cached'
+        on_event('finished', result)
+        return result
+
+    on_event('started', result)
+    start = time.monotonic()
+    outputs = []
+    qc_dir = os.path.dirname(os.path.abspath(qc_path))
+    try:
+        with open(result['log'], 'w', encoding='utf-8') as log:
+            process = subprocess.Popen(command, cwd=qc_dir or None,
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, errors='replace')
+            for line in process.stdout:
+                log.write(line)
+                written = WRITING_LINE.match(line)
+                if written:
+                    outputs.append(os.path.join(qc_dir, written.group(1).strip()))
+                on_event('output', dict(result, line=line.rstrip('\n')))
+                if cancel_event is not None and cancel_event.is_set():
+                    process.kill()
+            result['returncode'] = process.wait()
+    except OSError as e:
+        result['error'] = str(e)
+
+    result['duration'] = time.monotonic() - start
+    if cancel_event is not None and cancel_event.is_set() and result['returncode'] != 0:
+        result['status'] = 'cancelled'
+    elif result['error'] is None and result['returncode'] == 0:
+        result['status'] = 'compiled'
+        try:
+            outputs = [path for path in outputs if os.path.isfile(path)] or model_outputs(command, qc_path)
+        except Exception:
+            outputs = []
+        compile_cache.record(qc_path, key, outputs)
+    else:
+        result['status'] = 'failed'
+        compile_cache.forget(qc_path)
+    on_event('finished', result)
+    return result
+
+
+def compile_all(qc_paths, compiler, extra_args=(), workers=None, on_event=None, cancel_event=None, compile_cache=None):
+    # Runs the compiler over the queued QCs on `workers` slots. on_event(kind, result)
+    # is called from worker threads with kind in started/output/finished.
+    compiler = _resolve_compiler(compiler)
+    compile_cache = compile_cache or CompileCache()
+    on_event = on_event or (lambda kind, result: None)
+    workers = workers or os.cpu_count() or 1
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_compile_one, compiler, extra_args, qc_path, compile_cache, on_event, cancel_event)
+                       for qc_path in qc_paths]
+            return [future.result() for future in futures]
+    finally:
+        compile_cache.save()
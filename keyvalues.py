@@ -0,0 +1,48 @@
+import re
+
+# Valve KeyValues text: "key" "value" pairs and "key" { ... } blocks, with //
+# comments, optional quotes and [$PLATFORM] conditionals (which are ignored).
+# Backslashes are literal, as in Valve's own parser without escape sequences, so
+# paths such as "materials\tile" keep their separators.
+TOKEN = re.compile(
+    r'//[^\n]*'
+    r'|\[[^\]\n]*\]'
+    r'|"(?P<string>[^"]*)"?'
+    r'|(?P<open>\{)'
+    r'|(?P<close>\})'
+    r'|(?P<word>[^\s{}"\[]+)',
+    re.DOTALL)
+
+
+def parse(text):
+    # Returns [(key, value)] where value is a string or a nested list of pairs;
+    # order and duplicate keys are kept
+    root = []
+    stack = [root]
+    key = None
+    for match in TOKEN.finditer(text):
+        kind = match.lastgroup
+        if kind is None:
+            continue
+        if kind == 'close':
+            if len(stack) > 1:
+                stack.pop()
+            key = None
+        elif kind == 'open':
+            block = []
+            stack[-1].append((key if key is not None else '', block))
+            stack.append(block)
+            key = None
+        else:
+            value = match.group(kind)
+            if key is None:
+                key = value
+            else:
+                stack[-1].append((key, value))
+                key = None
+    return root
+
+
+def parse_file(path):
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        return parse(f.read())
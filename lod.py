@@ -0,0 +1,211 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import smd
+import qcgen
+import timing
+
+DEFAULT_RATIOS = qcgen.DEFAULT_LOD_RATIOS
+
+# Triangles sampled while searching for the grid resolution that hits the target
+SEARCH_SAMPLE = 200000
+SEARCH_STEPS = 24
+MAX_RESOLUTION = 1 << 20
+
+LOD_FILE_PATTERN = re.compile(r'_lod\d+\.smd$', re.IGNORECASE)
+
+
+def lod_path_for(smd_path, level):
+    return f"{os.path.splitext(smd_path)[0]}_lod{level}.smd"
+
+
+def is_lod_file(smd_path):
+    return bool(LOD_FILE_PATTERN.search(smd_path))
+
+
+def suggest_screen_size(ratio):
+    # Halving the triangle count doubles the switch point: 0.5 -> 20, 0.25 -> 40, ...
+    return round(10 / ratio)
+
+
+def parse_ratios(text):
+    ratios = []
+    for part in text.replace(';', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        ratio = float(part)
+        if not 0 < ratio < 1:
+            raise ValueError(f"LOD reduction ratio must be between 0 and 1, got {part}")
+        ratios.append(ratio)
+    return ratios
+
+
+def _grid(bounds, resolution):
+    lo, hi = bounds
+    cell_size = max(float((hi - lo).max()), 1e-9) / resolution
+    dims = np.floor((hi - lo) / cell_size).astype(np.int64) + 1
+    return lo, cell_size, dims
+
+
+def _cell_keys(positions, lo, cell_size, dims):
+    cells = np.floor((positions - lo) / cell_size).astype(np.int64)
+    np.clip(cells, 0, dims - 1, out=cells)
+    return (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+
+
+def _surviving(corner_keys):
+    c0, c1, c2 = corner_keys[:, 0], corner_keys[:, 1], corner_keys[:, 2]
+    return (c0 != c1) & (c1 != c2) & (c0 != c2)
+
+
+def _find_resolution(triangles, bounds, target_fraction):
+    # Survivors grow with resolution, so bisect in log space on a sample
+    if len(triangles) > SEARCH_SAMPLE:
+        sample = triangles[np.random.default_rng(0).choice(len(triangles), SEARCH_SAMPLE, replace=False)]
+    else:
+        sample = triangles
+    flat = sample.reshape(-1, 3)
+
+    low, high = 1.0, float(MAX_RESOLUTION)
+    for _ in range(SEARCH_STEPS):
+        mid = (low * high) ** 0.5
+        lo, cell_size, dims = _grid(bounds, mid)
+        keys = _cell_keys(flat, lo, cell_size, dims).reshape(-1, 3)
+        if _surviving(keys).mean() < target_fraction:
+            low = mid
+        else:
+            high = mid
+    return high
+
+
+def _representatives(positions, cluster, cluster_count, triangles):
+    # Area-weighted plane quadrics accumulated per cluster (Lindstrom-style
+    # vertex clustering), solved for the point of least squared plane distance.
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    area2 = np.linalg.norm(normals, axis=1)
+    unit = normals / np.maximum(area2, 1e-30)[:, None]
+    d = -np.einsum('ij,ij->i', unit, triangles[:, 0])
+    nx, ny, nz = unit[:, 0], unit[:, 1], unit[:, 2]
+    coefficients = np.stack([nx * nx, nx * ny, nx * nz, ny * ny, ny * nz, nz * nz, nx * d, ny * d, nz * d], axis=1)
+    coefficients *= area2[:, None]
+
+    corner_cluster = cluster.reshape(-1, 3)
+    quadric = np.zeros((cluster_count, 9))
+    for corner in range(3):
+        for column in range(9):
+            quadric[:, column] += np.bincount(corner_cluster[:, corner], weights=coefficients[:, column], minlength=cluster_count)
+
+    counts = np.bincount(cluster, minlength=cluster_count).astype(np.float64)
+    mean = np.stack([np.bincount(cluster, weights=positions[:, axis], minlength=cluster_count) for axis in range(3)], axis=1)
+    mean /= counts[:, None]
+
+    a = np.empty((cluster_count, 3, 3))
+    a[:, 0, 0], a[:, 0, 1], a[:, 0, 2] = quadric[:, 0], quadric[:, 1], quadric[:, 2]
+    a[:, 1, 0], a[:, 1, 1], a[:, 1, 2] = quadric[:, 1], quadric[:, 3], quadric[:, 4]
+    a[:, 2, 0], a[:, 2, 1], a[:, 2, 2] = quadric[:, 2], quadric[:, 4], quadric[:, 5]
+    b = -quadric[:, 6:9]
+
+    # Regularize toward the cluster mean so flat and creased clusters stay solvable
+    damping = 1e-3 * (np.trace(a, axis1=1, axis2=2) / 3 + 1e-12)
+    a += damping[:, None, None] * np.eye(3)
+    b += damping[:, None] * mean
+    return np.linalg.solve(a, b[:, :, None])[:, :, 0], mean
+
+
+def decimate(mesh, ratio):
+    if mesh.triangle_count == 0:
+        return mesh
+
+    positions = mesh.positions.astype(np.float64)
+    triangles = positions.reshape(-1, 3, 3)
+    bounds = positions.min(axis=0), positions.max(axis=0)
+    resolution = _find_resolution(triangles, bounds, ratio)
+    lo, cell_size, dims = _grid(bounds, resolution)
+    keys = _cell_keys(positions, lo, cell_size, dims)
+    unique_keys, cluster = np.unique(keys, return_inverse=True)
+    cluster = cluster.reshape(-1)
+    cluster_count = len(unique_keys)
+
+    representatives, mean = _representatives(positions, cluster, cluster_count, triangles)
+
+    # Keep each representative inside its own cell, otherwise use the mean
+    cell_lo = lo + np.stack(np.unravel_index(unique_keys, tuple(dims)), axis=1) * cell_size
+    outside = np.any((representatives < cell_lo - 1e-6 * cell_size) | (representatives > cell_lo + cell_size * (1 + 1e-6)), axis=1)
+    outside |= ~np.all(np.isfinite(representatives), axis=1)
+    representatives[outside] = mean[outside]
+
+    corner_cluster = cluster.reshape(-1, 3)
+    keep = _surviving(corner_cluster)
+
+    # Collapse duplicates that share the same clusters and winding
+    rotate = np.argmin(corner_cluster, axis=1)
+    order = (rotate[:, None] + np.arange(3)) % 3
+    canonical = np.take_along_axis(corner_cluster, order, axis=1).astype(np.int64)
+    if cluster_count < 2 ** 21:
+        canonical = (canonical[:, 0] * cluster_count + canonical[:, 1]) * cluster_count + canonical[:, 2]
+    survivors = np.flatnonzero(keep)
+    _, first = np.unique(canonical[survivors], axis=0, return_index=True)
+    survivors = np.sort(survivors[first])
+
+    vertex_idx = (survivors[:, None] * 3 + np.arange(3)).reshape(-1)
+    simplified = smd.SMDMesh(mesh.path)
+    simplified.nodes = list(mesh.nodes)
+    simplified.frame_times = list(mesh.frame_times)
+    simplified.skeleton = mesh.skeleton
+    simplified.materials = list(mesh.materials)
+    simplified.positions = representatives[cluster[vertex_idx]].astype(np.float32)
+    simplified.normals = mesh.normals[vertex_idx]
+    simplified.uvs = mesh.uvs[vertex_idx]
+    simplified.parents = mesh.parents[vertex_idx]
+    simplified.bone_ids = mesh.bone_ids[vertex_idx]
+    simplified.bone_weights = mesh.bone_weights[vertex_idx]
+    simplified.material_ids = mesh.material_ids[survivors]
+    return simplified
+
+
+@timing.traced('lod.write_level', 'ratio', 'lod_path')
+def _write_level(mesh, ratio, lod_path):
+    simplified = decimate(mesh, ratio)
+    smd.write_smd(lod_path, simplified)
+    return lod_path, simplified.triangle_count
+
+
+@timing.traced('lod.generate_lods', 'smd_path', 'ratios')
+def generate_lods(smd_path, ratios=DEFAULT_RATIOS, workers=None, mesh=None, progress=None):
+    # progress(done, total) is called after the SMD is read and after each level;
+    # an exception raised from it abandons the levels not started yet.
+    progress = progress or (lambda done, total: None)
+    total = len(ratios) + 1
+    if mesh is None:
+        mesh = smd.read_smd(smd_path)
+    progress(1, total)
+
+    jobs = [(ratio, lod_path_for(smd_path, level)) for level, ratio in enumerate(ratios, start=1)]
+    if workers == 1 or len(jobs) <= 1:
+        written = []
+        for ratio, lod_path in jobs:
+            written.append(_write_level(mesh, ratio, lod_path))
+            progress(len(written) + 1, total)
+    else:
+        # Each level is independent, so large meshes simplify on all cores at once
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_write_level, mesh, ratio, lod_path) for ratio, lod_path in jobs]
+            try:
+                for done, _ in enumerate(as_completed(futures), start=2):
+                    progress(done, total)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+            written = [future.result() for future in futures]
+
+    lods = []
+    for (ratio, _), (lod_path, triangle_count) in zip(jobs, written):
+        lods.append({
+            'screen_size': str(suggest_screen_size(ratio)),
+            'lod_model': os.path.relpath(lod_path, os.path.dirname(smd_path)).replace("\\", "/"),
+            'triangle_count': triangle_count,
+        })
+    return lods
@@ -1,16 +1,30 @@
+import time
+# Taken before any other import so --startup-time includes them
+STARTED_AT = time.perf_counter()
+
 import os
+import argparse
+import multiprocessing
+import threading
+import queue
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import yaml
 import sys
-import webbrowser
+import json
+import qcgen
+import surfaceprops
+import timing
+
+# numpy and the mesh modules (lod, collision, validate, materials, ...) are
+# imported where they are first used, so the window opens without loading them.
 
 def resource_path(relative_path):
     try:
         # PyInstaller creates a temp folder and stores the path in _MEIPASS
         base_path = sys._MEIPASS
     except Exception:
-        base_path = os.path.abspath(".")
+        # Next to this file, so the CLI works from any current directory
+        base_path = os.path.dirname(os.path.abspath(__file__))
 
     return os.path.join(base_path, relative_path)
 
@@ -42,18 +56,302 @@ class Tooltip:
             self.tipwindow = None
 
 
+class SearchBox:
+    # Entry that searches a long list as you type. The popup listbox only ever
+    # holds the rows in view and is refilled from the results when scrolled, so
+    # thousands of matches cost no more to show than a dozen.
+    VISIBLE_ROWS = 12
+    NAVIGATION_KEYS = ('Up', 'Down', 'Prior', 'Next', 'Return', 'KP_Enter', 'Escape', 'Tab',
+                       'Shift_L', 'Shift_R', 'Control_L', 'Control_R', 'Alt_L', 'Alt_R')
+
+    def __init__(self, master, variable, search, on_select, width=47):
+        # search(query) returns the matching values, best first
+        self.variable = variable
+        self.search = search
+        self.on_select = on_select
+        self.results = []
+        self.offset = 0
+        self.selected = 0
+        self.popup = None
+
+        self.frame = tk.Frame(master)
+        self.entry = ttk.Entry(self.frame, textvariable=variable, width=width)
+        self.entry.pack(side=tk.LEFT, fill='x', expand=True)
+        ttk.Button(self.frame, text="\u25be", width=2, command=self.toggle).pack(side=tk.LEFT)
+
+        self.entry.bind('<KeyRelease>', self.on_key)
+        self.entry.bind('<Down>', lambda event: self.move(1))
+        self.entry.bind('<Up>', lambda event: self.move(-1))
+        self.entry.bind('<Next>', lambda event: self.move(self.VISIBLE_ROWS))
+        self.entry.bind('<Prior>', lambda event: self.move(-self.VISIBLE_ROWS))
+        self.entry.bind('<Return>', self.accept)
+        self.entry.bind('<KP_Enter>', self.accept)
+        self.entry.bind('<Escape>', self.close)
+        self.entry.bind('<FocusOut>', lambda event: self.entry.after(150, self.close_if_unfocused))
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def on_key(self, event):
+        if event.keysym in self.NAVIGATION_KEYS:
+            return
+        self.show(self.variable.get())
+
+    def toggle(self):
+        if self.popup:
+            self.close()
+        else:
+            self.entry.focus_set()
+            self.show("")
+
+    def show(self, query):
+        self.results = self.search(query)
+        self.offset = 0
+        self.selected = 0
+        if self.popup is None:
+            self.open()
+        self.render()
+
+    def open(self):
+        self.popup = tk.Toplevel(self.entry)
+        self.popup.wm_overrideredirect(True)
+        x = self.entry.winfo_rootx()
+        y = self.entry.winfo_rooty() + self.entry.winfo_height()
+        self.popup.wm_geometry(f"+{x}+{y}")
+        self.listbox = tk.Listbox(self.popup, height=self.VISIBLE_ROWS, width=self.entry.cget('width'),
+                                  activestyle='none', exportselection=False, takefocus=0)
+        self.scrollbar = tk.Scrollbar(self.popup, orient='vertical', command=self.on_scroll)
+        self.listbox.pack(side=tk.LEFT, fill='both', expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill='y')
+        self.listbox.bind('<ButtonRelease-1>', self.on_click)
+        self.listbox.bind('<MouseWheel>', lambda event: self.scroll(-1 if event.delta > 0 else 1))
+        self.listbox.bind('<Button-4>', lambda event: self.scroll(-1))
+        self.listbox.bind('<Button-5>', lambda event: self.scroll(1))
+
+    def close(self, event=None):
+        if self.popup:
+            self.popup.destroy()
+            self.popup = None
+
+    def close_if_unfocused(self):
+        focus = self.entry.focus_get()
+        if focus is not self.entry and (self.popup is None or focus is not self.listbox):
+            self.close()
+
+    def render(self):
+        # Only the rows in view are ever inserted into the listbox
+        rows = self.results[self.offset:self.offset + self.VISIBLE_ROWS]
+        self.listbox.delete(0, tk.END)
+        if rows:
+            self.listbox.insert(tk.END, *rows)
+        else:
+            self.listbox.insert(tk.END, "No matches")
+        if self.offset <= self.selected < self.offset + len(rows):
+            self.listbox.selection_set(self.selected - self.offset)
+        total = max(len(self.results), 1)
+        self.scrollbar.set(self.offset / total, min(self.offset + self.VISIBLE_ROWS, total) / total)
+
+    def scroll(self, rows):
+        self.offset = max(0, min(self.offset + rows, len(self.results) - self.VISIBLE_ROWS))
+        self.render()
+        return 'break'
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.offset = 0
+            self.scroll(int(float(amount) * len(self.results)))
+        elif unit == 'pages':
+            self.scroll(int(amount) * self.VISIBLE_ROWS)
+        else:
+            self.scroll(int(amount))
+
+    def move(self, rows):
+        if self.popup is None:
+            self.show(self.variable.get())
+        if not self.results:
+            return 'break'
+        self.selected = max(0, min(self.selected + rows, len(self.results) - 1))
+        # Keep the selected row in view
+        if self.selected < self.offset:
+            self.offset = self.selected
+        elif self.selected >= self.offset + self.VISIBLE_ROWS:
+            self.offset = self.selected - self.VISIBLE_ROWS + 1
+        self.render()
+        return 'break'
+
+    def on_click(self, event):
+        if self.results:
+            self.selected = min(self.offset + self.listbox.nearest(event.y), len(self.results) - 1)
+            self.accept()
+
+    def accept(self, event=None):
+        if self.popup is None or not self.results:
+            return
+        self.variable.set(self.results[self.selected])
+        self.entry.icursor(tk.END)
+        self.close()
+        self.on_select()
+        return 'break'
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Task:
+    # Handed to background work so it can report progress and notice a cancel request
+    def __init__(self, runner, label, on_done, show_progress):
+        self.runner = runner
+        self.label = label
+        self.on_done = on_done
+        self.show_progress = show_progress
+        self.cancel_event = threading.Event()
+        self.controls = []
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def progress(self, done, total=None, message=None):
+        self.runner.events.put(('progress', self, (done, total, message)))
+
+    def checkpoint(self, done, total=None, message=None):
+        # Progress callback for qcgen/lod/collision work: raising TaskCancelled
+        # from it stops that work at its next report after cancel is pressed
+        if self.cancelled:
+            raise TaskCancelled()
+        self.progress(done, total, message)
+
+
+class TaskRunner:
+    # Runs work(task) on daemon threads. Progress and results come back through one
+    # queue that the Tk thread drains with after(), so widgets are only touched there.
+    POLL_MS = 50
+
+    def __init__(self, master, progressbar, cancel_button, status):
+        self.master = master
+        self.progressbar = progressbar
+        self.cancel_button = cancel_button
+        self.status = status
+        self.events = queue.Queue()
+        self.active = []
+        self.disabled = {}
+        self.polling = False
+        self.update_progress_widgets()
+
+    def run(self, work, on_done, label="", controls=(), show_progress=True):
+        # on_done(result, error) runs on the Tk thread; it is not called when a cancel stopped the work
+        task = Task(self, label, on_done, show_progress)
+        task.controls = list(controls)
+        for widget in task.controls:
+            if self.disabled.get(widget, 0) == 0:
+                widget.config(state='disabled')
+            self.disabled[widget] = self.disabled.get(widget, 0) + 1
+        self.active.append(task)
+
+        def target():
+            try:
+                with timing.span('gui.task', label=label):
+                    result = work(task)
+                self.events.put(('done', task, (result, None)))
+            except Exception as e:
+                self.events.put(('done', task, (None, e)))
+
+        threading.Thread(target=target, daemon=True).start()
+        if show_progress:
+            self.status.set(f"{label}...")
+            self.progressbar.config(mode='indeterminate', value=0)
+            self.progressbar.start(10)
+        self.update_progress_widgets()
+        if not self.polling:
+            self.polling = True
+            self.master.after(self.POLL_MS, self.poll)
+        return task
+
+    def is_running(self, task):
+        return task in self.active
+
+    def cancel(self):
+        for task in self.active:
+            if task.show_progress:
+                task.cancel_event.set()
+        self.status.set("Cancelling...")
+
+    def poll(self):
+        while True:
+            try:
+                kind, task, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                self.on_progress(task, *payload)
+            else:
+                self.on_done(task, *payload)
+
+        if self.active:
+            self.master.after(self.POLL_MS, self.poll)
+        else:
+            self.polling = False
+
+    def on_progress(self, task, done, total, message):
+        if not task.show_progress or task.cancelled or task not in self.active:
+            return
+        if total:
+            self.progressbar.stop()
+            self.progressbar.config(mode='determinate', maximum=total, value=done)
+        if message:
+            self.status.set(f"{task.label}: {message}")
+
+    def on_done(self, task, result, error):
+        self.active.remove(task)
+        for widget in task.controls:
+            self.disabled[widget] -= 1
+            if self.disabled[widget] == 0:
+                del self.disabled[widget]
+                widget.config(state='normal')
+        self.update_progress_widgets()
+
+        if isinstance(error, TaskCancelled) or (task.cancelled and error is not None):
+            self.status.set(f"{task.label} cancelled")
+            return
+        if task.show_progress:
+            # Work that finished before it saw the cancel has still written its files
+            self.status.set(f"{task.label} finished before it could be cancelled" if task.cancelled else "")
+        task.on_done(result, error)
+
+    def update_progress_widgets(self):
+        if any(task.show_progress for task in self.active):
+            self.cancel_button.config(state='normal')
+        else:
+            self.progressbar.stop()
+            self.progressbar.config(mode='determinate', value=0)
+            self.cancel_button.config(state='disabled')
+
+
+COLLISION_MODE_LABELS = {
+    'hull': "Single convex hull",
+    'decompose': "Convex decomposition",
+}
+
+
 class QCFileGenerator:
     def __init__(self, master):
         self.master = master
         master.title("QC File Generator")
 
         # Variables
-        self.surfaceprop_data = self.load_surfaceprop_yaml()
-        self.game_list = self.get_game_list()
+        # Filled in once surfaceprop.yaml has loaded in the background
+        self.surfaceprop_catalog = surfaceprops.SurfacePropCatalog({}, [])
+        # Set once the catalog (or its load error) is in; work that validates
+        # against the catalog waits on it
+        self.surfaceprop_loaded = threading.Event()
+        self.surfaceprop_data = {}
+        self.game_list = []
         self.surfaceprop = tk.StringVar()
         self.selected_games_vars = {}
-        for game in self.game_list:
-            self.selected_games_vars[game] = tk.BooleanVar(value=False)
+        # Game folders whose scripts/surfaceproperties*.txt are merged into the catalog
+        self.game_dirs = surfaceprops.load_game_dirs()
+        self.game_dirs_label = tk.StringVar(value=self.describe_game_dirs())
 
         self.model_working_folder = tk.StringVar(value="props_dev/dev")
         self.model_name = tk.StringVar()
@@ -68,17 +366,31 @@ class QCFileGenerator:
         self.collisionmodel = tk.StringVar()
         self.mass = tk.DoubleVar(value=35.0)
         self.concave = tk.BooleanVar()
+        self.collision_mode = tk.StringVar(value=COLLISION_MODE_LABELS['hull'])
+        self.max_convex_pieces = tk.IntVar(value=qcgen.DEFAULT_SETTINGS['max_convex_pieces'])
+        self.compiler_path = tk.StringVar()
+        self.compiler_args = tk.StringVar(value="-nop4 -verbose")
+        self.compile_after_generate = tk.BooleanVar(value=False)
+        self.materials_root = tk.StringVar()
+        self.qc_template = tk.StringVar()
+        self.status = tk.StringVar()
 
         # LODs
         self.lod_entries = []
+        self.lod_ratios = tk.StringVar(value=", ".join(str(ratio) for ratio in qcgen.DEFAULT_LOD_RATIOS))
 
         self.create_widgets()
+        self.load_surfaceprop_yaml()
 
     def create_widgets(self):
         # Menu Bar
         menubar = tk.Menu(self.master)
         filemenu = tk.Menu(menubar, tearoff=0)
         filemenu.add_command(label="Load SMD", command=self.open_smd_file)
+        filemenu.add_command(label="Load QC...", command=self.load_qc_file)
+        filemenu.add_command(label="Validate SMDs", command=self.validate_smds)
+        filemenu.add_command(label="Import Manifest...", command=self.import_manifest)
+        filemenu.add_command(label="Rewrite QC Folder...", command=self.open_rewrite_window)
         filemenu.add_separator()
         filemenu.add_command(label="Exit", command=self.master.quit)
         menubar.add_cascade(label="File", menu=filemenu)
@@ -104,32 +416,61 @@ class QCFileGenerator:
         self.working_folder_entry.grid(row=1, column=1, padx=5, pady=5)
         Tooltip(self.working_folder_entry, "Where the .mdl will be compiled to, and where materials references will point relative to the game/materials/models folder.\n\nFor example a working folder of 'props_dev/dev' the model will compile to 'game/models/props_dev/dev/' and materials will need to be placed in 'game/materials/models/props_dev/dev/'")
 
-        # Tabs
-        tab_control = ttk.Notebook(self.master)
-        tab_control.pack(expand=1, fill='both')
+        # Tabs are empty frames until first selected; see build_selected_tab
+        self.tab_control = ttk.Notebook(self.master)
+        self.tab_control.pack(expand=1, fill='both')
+        self.tab_builders = {}
 
         # Collision Tab
-        self.collision_tab = tk.Frame(tab_control)
-        tab_control.add(self.collision_tab, text='Collision')
-        self.create_collision_tab()
+        self.collision_tab = tk.Frame(self.tab_control)
+        self.tab_control.add(self.collision_tab, text='Collision')
+        self.tab_builders[str(self.collision_tab)] = self.create_collision_tab
 
         # Surface Properties Tab
-        self.surface_tab = tk.Frame(tab_control)
-        tab_control.add(self.surface_tab, text='Surface Properties')
-        self.create_surface_tab()
+        self.surface_tab = tk.Frame(self.tab_control)
+        self.tab_control.add(self.surface_tab, text='Surface Properties')
+        self.tab_builders[str(self.surface_tab)] = self.create_surface_tab
 
         # LOD Tab
-        self.lod_tab = tk.Frame(tab_control)
-        tab_control.add(self.lod_tab, text='LOD')
-        self.create_lod_tab()
+        self.lod_tab = tk.Frame(self.tab_control)
+        self.tab_control.add(self.lod_tab, text='LOD')
+        self.tab_builders[str(self.lod_tab)] = self.create_lod_tab
 
         # Advanced Settings Tab
-        self.advanced_tab = tk.Frame(tab_control)
-        tab_control.add(self.advanced_tab, text='Other Settings')
-        self.create_other_tab()
-        
+        self.advanced_tab = tk.Frame(self.tab_control)
+        self.tab_control.add(self.advanced_tab, text='Other Settings')
+        self.tab_builders[str(self.advanced_tab)] = self.create_other_tab
+
+        self.tab_control.bind('<<NotebookTabChanged>>', self.build_selected_tab)
+        self.build_selected_tab()
+
         # Generate Button
-        tk.Button(self.master, text="Generate QC File", command=self.generate_qc_file, bg='green', fg='white').pack(pady=10)
+        self.generate_button = tk.Button(self.master, text="Generate QC File", command=self.generate_qc_file, bg='green', fg='white')
+        self.generate_button.pack(pady=10)
+
+        # Status Bar
+        status_frame = tk.Frame(self.master)
+        status_frame.pack(fill='x', padx=5, pady=(0, 5))
+        tk.Label(status_frame, textvariable=self.status, anchor='w').pack(side=tk.LEFT, fill='x', expand=True)
+        cancel_button = tk.Button(status_frame, text="Cancel")
+        cancel_button.pack(side=tk.RIGHT)
+        progressbar = ttk.Progressbar(status_frame, length=200)
+        progressbar.pack(side=tk.RIGHT, padx=5)
+        self.tasks = TaskRunner(self.master, progressbar, cancel_button, self.status)
+        cancel_button.config(command=self.tasks.cancel)
+
+    def build_selected_tab(self, event=None):
+        # Each tab's widgets (and tooltips) are created the first time it is shown;
+        # their state lives in the Tk variables created in __init__
+        self.build_tab(self.tab_control.select())
+
+    def build_tab(self, tab):
+        builder = self.tab_builders.pop(str(tab), None)
+        if builder:
+            builder()
+
+    def is_tab_built(self, tab):
+        return str(tab) not in self.tab_builders
 
     def create_surface_tab(self):
         tk.Label(self.surface_tab, text="Surface Properties", font=('Arial', 12, 'bold')).pack(pady=10)
@@ -139,19 +480,14 @@ class QCFileGenerator:
 
         # Target Games
         tk.Label(form_frame, text="Target Games:").grid(row=0, column=0, sticky='ne')
-        games_frame = tk.Frame(form_frame)
-        games_frame.grid(row=0, column=1, padx=5, pady=5, sticky='w')
-
-        for idx, game in enumerate(self.game_list):
-            chk = tk.Checkbutton(games_frame, text=game, variable=self.selected_games_vars[game], command=self.update_surfaceprop_options)
-            chk.grid(row=idx//4, column=idx%4, sticky='w')
+        self.games_frame = tk.Frame(form_frame)
+        self.games_frame.grid(row=0, column=1, padx=5, pady=5, sticky='w')
 
         # Surfaceprop
         tk.Label(form_frame, text="$surfaceprop:").grid(row=1, column=0, sticky='ne')
-        self.surfaceprop_combobox = ttk.Combobox(form_frame, textvariable=self.surfaceprop, width=47, state='readonly')
-        self.surfaceprop_combobox['values'] = []
-        self.surfaceprop_combobox.grid(row=1, column=1, padx=5, pady=5)
-        self.surfaceprop_combobox.bind('<<ComboboxSelected>>', self.update_surfaceprop_details)
+        self.surfaceprop_search = SearchBox(form_frame, self.surfaceprop, self.search_surfaceprops, lambda: self.update_surfaceprop_details(None))
+        self.surfaceprop_search.grid(row=1, column=1, padx=5, pady=5, sticky='we')
+        Tooltip(self.surfaceprop_search.entry, "Type to search categories, names and descriptions, e.g. 'metal box' or 'glass'. Results are limited to the ticked games, or cover every game when none is ticked.")
 
         # Description and Supported Games
         tk.Label(form_frame, text="Description:").grid(row=2, column=0, sticky='ne')
@@ -162,6 +498,47 @@ class QCFileGenerator:
         self.surfaceprop_games_text = tk.Text(form_frame, width=47, height=2, wrap='word')
         self.surfaceprop_games_text.grid(row=3, column=1, padx=5, pady=5)
 
+        # Game Folders
+        tk.Label(form_frame, text="Game Folders:").grid(row=4, column=0, sticky='ne')
+        game_dirs_frame = tk.Frame(form_frame)
+        game_dirs_frame.grid(row=4, column=1, padx=5, pady=5, sticky='w')
+        game_dirs_label = tk.Label(game_dirs_frame, textvariable=self.game_dirs_label, justify='left', anchor='w', wraplength=330)
+        game_dirs_label.pack(side=tk.TOP, anchor='w')
+        Tooltip(game_dirs_label, "Surface properties from each folder's scripts/surfaceproperties*.txt (in surfaceproperties_manifest.txt order when it has one) are added to the list, tagged with the folder name as their game.")
+        tk.Button(game_dirs_frame, text="Add Game Folder...", command=self.add_game_dir).pack(side=tk.LEFT)
+        tk.Button(game_dirs_frame, text="Clear", command=self.clear_game_dirs).pack(side=tk.LEFT)
+
+        self.create_game_checkbuttons()
+
+    def create_game_checkbuttons(self):
+        # Runs when the tab is built and again once the catalog has loaded
+        for child in self.games_frame.winfo_children():
+            child.destroy()
+        for idx, game in enumerate(self.game_list):
+            chk = tk.Checkbutton(self.games_frame, text=game, variable=self.selected_games_vars[game], command=self.update_surfaceprop_options)
+            chk.grid(row=idx//4, column=idx%4, sticky='w')
+
+    def describe_game_dirs(self):
+        return "\n".join(self.game_dirs) or "None"
+
+    def add_game_dir(self):
+        folder_selected = filedialog.askdirectory(title="Select a game or mod folder (containing scripts/)")
+        if folder_selected and folder_selected not in self.game_dirs:
+            self.set_game_dirs(self.game_dirs + [folder_selected])
+
+    def clear_game_dirs(self):
+        if self.game_dirs:
+            self.set_game_dirs([])
+
+    def set_game_dirs(self, game_dirs):
+        self.game_dirs = game_dirs
+        self.game_dirs_label.set(self.describe_game_dirs())
+        try:
+            surfaceprops.save_game_dirs(game_dirs)
+        except OSError as e:
+            self.status.set(f"Could not remember game folders: {e}")
+        self.load_surfaceprop_yaml()
+
     def create_other_tab(self):
         tk.Label(self.advanced_tab, text="Other Settings", font=('Arial', 12, 'bold')).pack(pady=10)
 
@@ -187,6 +564,42 @@ class QCFileGenerator:
         self.mostlyopaque_checkbutton.grid(row=4, column=0, columnspan=2, sticky='w')
         Tooltip(self.mostlyopaque_checkbutton, "Causes the model to be rendered in two passes.Can be used to improve the visual quality of models such as foliage or underbrush, by improving the lighting on the translucent materials.")
 
+        # Compiler
+        tk.Label(form_frame, text="Compiler:").grid(row=5, column=0, sticky='e')
+        compiler_frame = tk.Frame(form_frame)
+        compiler_frame.grid(row=5, column=1, padx=5, pady=5, sticky='w')
+        tk.Entry(compiler_frame, textvariable=self.compiler_path, width=40).pack(side=tk.LEFT)
+        tk.Button(compiler_frame, text="Browse", command=self.browse_compiler).pack(side=tk.LEFT)
+
+        tk.Label(form_frame, text="Compiler Args:").grid(row=6, column=0, sticky='e')
+        compiler_args_entry = tk.Entry(form_frame, textvariable=self.compiler_args, width=50)
+        compiler_args_entry.grid(row=6, column=1, padx=5, pady=5)
+        Tooltip(compiler_args_entry, "Arguments passed to the compiler before the QC file, e.g. -game \"C:/Steam/steamapps/common/Half-Life 2/hl2\" -nop4 -verbose")
+
+        self.compile_checkbutton = tk.Checkbutton(form_frame, text="Compile after generating", variable=self.compile_after_generate)
+        self.compile_checkbutton.grid(row=7, column=0, columnspan=2, sticky='w')
+        Tooltip(self.compile_checkbutton, "Runs the compiler on the generated QC. Models whose QC and referenced files have not changed since their last successful compile are skipped.")
+
+        # Materials
+        tk.Label(form_frame, text="Materials Folder:").grid(row=8, column=0, sticky='e')
+        materials_frame = tk.Frame(form_frame)
+        materials_frame.grid(row=8, column=1, padx=5, pady=5, sticky='w')
+        tk.Entry(materials_frame, textvariable=self.materials_root, width=40).pack(side=tk.LEFT)
+        tk.Button(materials_frame, text="Browse", command=self.browse_materials_root).pack(side=tk.LEFT)
+        self.check_materials_button = tk.Button(form_frame, text="Check Materials", command=self.check_materials)
+        self.check_materials_button.grid(row=9, column=1, padx=5, pady=5, sticky='w')
+        Tooltip(self.check_materials_button, "Looks up every material used by the SMD under the materials folder, using the $cdmaterials path, and lists missing VMT and VTF files.")
+
+        # QC Template
+        tk.Label(form_frame, text="QC Template:").grid(row=10, column=0, sticky='e')
+        template_frame = tk.Frame(form_frame)
+        template_frame.grid(row=10, column=1, padx=5, pady=5, sticky='w')
+        template_entry = tk.Entry(template_frame, textvariable=self.qc_template, width=40)
+        template_entry.pack(side=tk.LEFT)
+        tk.Button(template_frame, text="Browse", command=self.browse_qc_template).pack(side=tk.LEFT)
+        tk.Button(template_frame, text="Save Default...", command=self.save_default_template).pack(side=tk.LEFT)
+        Tooltip(template_entry, "Optional QC file with {{field}} placeholders used instead of the built in layout, for $bodygroup, $texturegroup, $include or extra $sequence blocks. Leave empty for the default. Save Default writes the built in layout as a starting point.")
+
         self.update_casttextureshadows_state()
 
     def update_casttextureshadows_state(self):
@@ -220,6 +633,67 @@ class QCFileGenerator:
         self.concave_checkbutton.grid(row=3, column=0, columnspan=2, sticky='w')
         Tooltip(self.concave_checkbutton, "By default, studiomdl will generate a single convex hull by 'shrinkwrapping' any concavities. This option will use the concave hull provided in the collision model.")
 
+        # Build the collision model from the render mesh
+        tk.Label(form_frame, text="Generate:").grid(row=4, column=0, sticky='e')
+        generate_frame = tk.Frame(form_frame)
+        generate_frame.grid(row=4, column=1, padx=5, pady=5, sticky='w')
+        mode_combobox = ttk.Combobox(generate_frame, textvariable=self.collision_mode, values=list(COLLISION_MODE_LABELS.values()), width=22, state='readonly')
+        mode_combobox.pack(side=tk.LEFT)
+        Tooltip(mode_combobox, "Single convex hull wraps the whole model. Convex decomposition splits it into several convex pieces, up to the max pieces studiomdl accepts.")
+        tk.Label(generate_frame, text="Max Pieces:").pack(side=tk.LEFT, padx=(5, 0))
+        tk.Spinbox(generate_frame, from_=1, to=qcgen.DEFAULT_SETTINGS['max_convex_pieces'], textvariable=self.max_convex_pieces, width=4).pack(side=tk.LEFT, padx=5)
+        self.generate_collision_button = tk.Button(generate_frame, text="Generate Collision", command=self.generate_collision)
+        self.generate_collision_button.pack(side=tk.LEFT)
+
+    def generate_collision(self):
+        if not self.body_smd.get():
+            messagebox.showerror("Error", "Please load an SMD file first. go to File > Load SMD")
+            return
+
+        mode = next(mode for mode, label in COLLISION_MODE_LABELS.items() if label == self.collision_mode.get())
+        try:
+            max_pieces = self.max_convex_pieces.get()
+        except tk.TclError:
+            max_pieces = qcgen.DEFAULT_SETTINGS['max_convex_pieces']
+
+        # Hulls can take a while on dense meshes, so build them off the UI thread
+        import collision
+        body_smd = self.body_smd.get()
+        self.tasks.run(lambda task: collision.generate_collision(body_smd, mode, max_pieces, progress=task.checkpoint),
+                       self.on_collision_generated, label="Generating collision model",
+                       controls=[self.generate_collision_button, self.generate_button])
+
+    def on_collision_generated(self, generated, error):
+        if error:
+            messagebox.showerror("Error", f"Failed to generate collision model:\n{error}")
+            return
+
+        self.collisionmodel.set(generated['collisionmodel'])
+        self.concave.set(generated['concave'])
+        self.update_mass_estimate()
+        messagebox.showinfo("Success", f"Collision model written to {generated['collisionmodel']} with {generated['piece_count']} convex piece(s).")
+
+    def update_mass_estimate(self):
+        # Pre-fill Mass from the collision model volume and the surfaceprop density
+        density = self.surfaceprop_catalog.density(self.surfaceprop.get())
+        if not density or not self.collisionmodel.get() or not self.body_smd.get():
+            return
+        collision_smd = os.path.join(os.path.dirname(self.body_smd.get()), self.collisionmodel.get())
+        if not os.path.isfile(collision_smd):
+            return
+        try:
+            scale = self.scale.get()
+        except tk.TclError:
+            scale = 1.0
+
+        import collision
+
+        def on_done(mass, error):
+            if error is None and mass:
+                self.mass.set(mass)
+
+        self.tasks.run(lambda task: collision.estimate_mass_from_smd(collision_smd, density, scale), on_done, show_progress=False)
+
     def create_lod_tab(self):
         tk.Label(self.lod_tab, text="Level of Detail (LOD) Settings", font=('Arial', 12, 'bold')).pack(pady=10)
 
@@ -247,22 +721,31 @@ class QCFileGenerator:
         # Add LOD Button
         tk.Button(self.lod_tab, text="Add LOD", command=self.add_lod_entry).pack(pady=5)
 
-    def add_lod_entry(self):
-        idx = len(self.lod_entries)
+        # Automatic LOD generation
+        generate_frame = tk.Frame(self.lod_tab)
+        generate_frame.pack(pady=5)
+        tk.Label(generate_frame, text="Reduction Ratios:").pack(side=tk.LEFT)
+        ratios_entry = tk.Entry(generate_frame, textvariable=self.lod_ratios, width=20)
+        ratios_entry.pack(side=tk.LEFT, padx=5)
+        Tooltip(ratios_entry, "Comma separated fraction of triangles to keep for each generated LOD, e.g. '0.5, 0.25' writes model_lod1.smd at half and model_lod2.smd at a quarter of the triangles.")
+        self.generate_lods_button = tk.Button(generate_frame, text="Generate LODs", command=self.generate_lods)
+        self.generate_lods_button.pack(side=tk.LEFT)
+
+    def add_lod_entry(self, screen_size_value="", lod_model_value=""):
         entry_frame = tk.Frame(self.lod_items_frame)
         entry_frame.pack(pady=5, fill='x')
 
         tk.Label(entry_frame, text="Screen Size:").grid(row=0, column=0, sticky='e')
-        screen_size = tk.StringVar()
+        screen_size = tk.StringVar(value=screen_size_value)
         tk.Entry(entry_frame, textvariable=screen_size, width=10).grid(row=0, column=1, padx=5, pady=5)
 
         tk.Label(entry_frame, text="LOD Model:").grid(row=0, column=2, sticky='e')
-        lod_model = tk.StringVar()
+        lod_model = tk.StringVar(value=lod_model_value)
         tk.Entry(entry_frame, textvariable=lod_model, width=20).grid(row=0, column=3, padx=5, pady=5)
 
         tk.Button(entry_frame, text="Browse", command=lambda: self.browse_lod_model(lod_model)).grid(row=0, column=4, padx=5)
 
-        tk.Button(entry_frame, text="Remove", command=lambda: self.remove_lod_entry(entry_frame, idx)).grid(row=0, column=5, padx=5)
+        tk.Button(entry_frame, text="Remove", command=lambda: self.remove_lod_entry(entry_frame)).grid(row=0, column=5, padx=5)
 
         self.lod_entries.append({
             'frame': entry_frame,
@@ -270,9 +753,43 @@ class QCFileGenerator:
             'lod_model': lod_model
         })
 
-    def remove_lod_entry(self, frame, idx):
+    def remove_lod_entry(self, frame):
         frame.destroy()
-        self.lod_entries.pop(idx)
+        self.lod_entries = [lod_entry for lod_entry in self.lod_entries if lod_entry['frame'] is not frame]
+
+    def generate_lods(self):
+        if not self.body_smd.get():
+            messagebox.showerror("Error", "Please load an SMD file first. go to File > Load SMD")
+            return
+
+        import lod
+        try:
+            ratios = lod.parse_ratios(self.lod_ratios.get())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+
+        body_smd = self.body_smd.get()
+        self.tasks.run(lambda task: lod.generate_lods(body_smd, ratios, progress=task.checkpoint),
+                       self.on_lods_generated, label="Generating LODs",
+                       controls=[self.generate_lods_button, self.generate_button])
+
+    def on_lods_generated(self, generated, error):
+        if error:
+            messagebox.showerror("Error", f"Failed to generate LODs:\n{error}")
+            return
+
+        # Replace rows that already point at a generated file, append the rest
+        for generated_lod in generated:
+            for lod_entry in self.lod_entries:
+                if lod_entry['lod_model'].get() == generated_lod['lod_model']:
+                    lod_entry['screen_size'].set(generated_lod['screen_size'])
+                    break
+            else:
+                self.add_lod_entry(generated_lod['screen_size'], generated_lod['lod_model'])
+
+        summary = "\n".join(f"{generated_lod['lod_model']}: {generated_lod['triangle_count']} triangles" for generated_lod in generated)
+        messagebox.showinfo("Success", f"Generated LODs:\n{summary}")
 
     def validate_float(self, P):
         if P == '':
@@ -293,6 +810,7 @@ class QCFileGenerator:
             # Get relative path to the main SMD file's directory
             rel_path = os.path.relpath(file_selected, smd_dir).replace("\\", "/")
             self.collisionmodel.set(rel_path)
+            self.update_mass_estimate()
 
     def browse_lod_model(self, lod_model_var):
         if not self.body_smd.get():
@@ -317,41 +835,153 @@ class QCFileGenerator:
             # Infer cdmaterials if Model Working Folder is specified
             self.infer_cdmaterials()
     
+    def load_qc_file(self):
+        file_selected = filedialog.askopenfilename(filetypes=[("QC files", "*.qc"), ("All Files", "*.*")])
+        if not file_selected:
+            return
+        import qcfile
+
+        def work(task):
+            qc = qcfile.load_qc(file_selected)
+            return qc, qcfile.qc_settings(qc)
+
+        self.tasks.run(work, self.on_qc_file_loaded, label="Loading QC", show_progress=False)
+
+    def on_qc_file_loaded(self, loaded, error):
+        if error:
+            messagebox.showerror("Error", f"Failed to load QC file:\n{error}")
+            return
+        qc, (settings, unsupported) = loaded
+
+        variables = {
+            'model_working_folder': self.model_working_folder,
+            'model_name': self.model_name,
+            'cdmaterials': self.cdmaterials,
+            'body_name': self.body_name,
+            'body_smd': self.body_smd,
+            'scale': self.scale,
+            'staticprop': self.staticprop,
+            'casttextureshadows': self.casttextureshadows,
+            'mostlyopaque': self.mostlyopaque,
+            'collisionmodel': self.collisionmodel,
+            'mass': self.mass,
+            'concave': self.concave,
+        }
+        for key, variable in variables.items():
+            if key in settings:
+                variable.set(settings[key])
+        if 'body_smd' in settings:
+            self.sequence.set(os.path.basename(settings['body_smd']))
+        if 'surfaceprop' in settings:
+            # The QC only names the subtype; show the catalog entry when there is one
+            self.surfaceprop.set(self.surfaceprop_catalog.find(settings['surfaceprop']) or settings['surfaceprop'])
+        if self.is_tab_built(self.advanced_tab):
+            self.update_casttextureshadows_state()
+
+        self.build_tab(self.lod_tab)
+        for lod_entry in list(self.lod_entries):
+            self.remove_lod_entry(lod_entry['frame'])
+        for lod_entry in settings['lods']:
+            self.add_lod_entry(lod_entry['screen_size'], lod_entry['lod_model'])
+
+        self.status.set(f"Loaded {qc['path']}")
+        notes = list(qc['errors'])
+        if unsupported:
+            notes.append(f"Not shown in the form, and not written when generating unless a QC template adds them: {', '.join(unsupported)}")
+        if notes:
+            self.show_report("Load QC", f"Loaded {os.path.basename(qc['path'])} ({len(qc['files'])} files).", notes)
+
+    def open_rewrite_window(self):
+        window = tk.Toplevel(self.master)
+        window.title("Rewrite QC Folder")
+        folder = tk.StringVar()
+        directive = tk.StringVar(value="$surfaceprop")
+        old_value = tk.StringVar()
+        new_value = tk.StringVar()
+        dry_run = tk.BooleanVar(value=False)
+
+        tk.Label(window, text="Folder:").grid(row=0, column=0, sticky='e')
+        folder_frame = tk.Frame(window)
+        folder_frame.grid(row=0, column=1, padx=5, pady=5, sticky='w')
+        tk.Entry(folder_frame, textvariable=folder, width=40).pack(side=tk.LEFT)
+        tk.Button(folder_frame, text="Browse", command=lambda: folder.set(filedialog.askdirectory(parent=window) or folder.get())).pack(side=tk.LEFT)
+
+        tk.Label(window, text="Directive:").grid(row=1, column=0, sticky='e')
+        ttk.Combobox(window, textvariable=directive, values=["$surfaceprop", "$cdmaterials", "$modelname", "$scale"], width=47).grid(row=1, column=1, padx=5, pady=5)
+
+        tk.Label(window, text="Only Where Currently:").grid(row=2, column=0, sticky='e')
+        old_value_entry = tk.Entry(window, textvariable=old_value, width=50)
+        old_value_entry.grid(row=2, column=1, padx=5, pady=5)
+        Tooltip(old_value_entry, "Leave empty to change every file, or enter the current value to only change files that use it, e.g. models/props_old.")
+
+        tk.Label(window, text="New Value:").grid(row=3, column=0, sticky='e')
+        tk.Entry(window, textvariable=new_value, width=50).grid(row=3, column=1, padx=5, pady=5)
+
+        tk.Checkbutton(window, text="Only list the files that would change", variable=dry_run).grid(row=4, column=1, sticky='w')
+
+        def run():
+            if not os.path.isdir(folder.get()):
+                messagebox.showerror("Error", "Please select a folder first.", parent=window)
+                return
+            if not directive.get().startswith('$') or not new_value.get():
+                messagebox.showerror("Error", "Please enter a $directive and a new value.", parent=window)
+                return
+            changes = [(directive.get(), new_value.get(), old_value.get() or None)]
+            self.rewrite_qc_folder(folder.get(), changes, dry_run.get())
+            window.destroy()
+
+        tk.Button(window, text="Rewrite", command=run).grid(row=5, column=1, pady=10, sticky='e')
+
+    def rewrite_qc_folder(self, folder, changes, dry_run):
+        import qcfile
+
+        def work(task):
+            done = []
+
+            def progress(result):
+                done.append(result)
+                task.checkpoint(len(done), None, os.path.basename(result['path']))
+
+            return qcfile.rewrite_tree(folder, changes, progress=progress, dry_run=dry_run)
+
+        def on_done(results, error):
+            if error:
+                messagebox.showerror("Error", f"Failed to rewrite QC files:\n{error}")
+                return
+            verb = "Would change" if dry_run else "Changed"
+            lines = [f"{verb} {result['path']}" for result in results if result['edits']]
+            lines += [f"FAILED {result['path']}: {result['error']}" for result in results if result['error']]
+            self.show_report("Rewrite QC Folder", f"{verb} {sum(1 for result in results if result['edits'])} of {len(results)} QC files.", lines or ["Nothing to change."])
+
+        self.tasks.run(work, on_done, label="Rewriting QC files", controls=[self.generate_button])
+
     def open_about(self):
+        import webbrowser
         webbrowser.open("https://github.com/Jacobdeanr/qc-generator")
 
     def infer_cdmaterials(self):
-        working_folder = self.model_working_folder.get().strip()
-        # Normalize working folder path
-        working_folder = working_folder.strip("/\\").replace("\\", "/")
-        if working_folder:
-            # Set $cdmaterials
-            cdmaterials_path = f"models/{working_folder}"
-            self.cdmaterials.set(cdmaterials_path)
-        else:
-            # If working folder is empty, clear cdmaterials
-            self.cdmaterials.set("")
+        # If working folder is empty, this clears cdmaterials
+        self.cdmaterials.set(qcgen.infer_cdmaterials(self.model_working_folder.get()))
+
+    def selected_games(self):
+        return [game for game, var in self.selected_games_vars.items() if var.get()]
 
+    @timing.traced('gui.update_surfaceprop_options')
     def update_surfaceprop_options(self):
-        selected_games = [game for game, var in self.selected_games_vars.items() if var.get()]
-        if not selected_games:
-            self.surfaceprop_combobox['values'] = []
-            self.surfaceprop.set('')  # Clear current selection
-            self.surfaceprop_description_text.delete(1.0, tk.END)
-            self.surfaceprop_games_text.delete(1.0, tk.END)
+        # The search box reads the ticked games on every keystroke; only a choice
+        # the new selection no longer offers is cleared
+        self.surfaceprop_search.close()
+        selected_games = self.selected_games()
+        if selected_games and self.surfaceprop.get() in self.surfaceprop_catalog.filter_by_games(selected_games):
             return
-
-        filtered_surfaceprops = []
-        for key, details in self.surfaceprop_data.items():
-            supported_games = details.get('supported_games', [])
-            if 'ALL' in supported_games or any(game in supported_games for game in selected_games):
-                filtered_surfaceprops.append(key)
-
-        self.surfaceprop_combobox['values'] = filtered_surfaceprops
-        self.surfaceprop.set('')
+        self.surfaceprop.set('')  # Clear current selection
         self.surfaceprop_description_text.delete(1.0, tk.END)
         self.surfaceprop_games_text.delete(1.0, tk.END)
 
+    def search_surfaceprops(self, query):
+        # With no game ticked every game's surfaceprops are searched
+        return self.surfaceprop_catalog.search(query, self.selected_games() or None)
+
     def update_surfaceprop_details(self, event):
         selected_surfaceprop = self.surfaceprop.get()
         details = self.surfaceprop_data.get(selected_surfaceprop, {})
@@ -365,123 +995,628 @@ class QCFileGenerator:
         self.surfaceprop_games_text.delete(1.0, tk.END)
         self.surfaceprop_games_text.insert(tk.END, supported_games)
 
+        self.update_mass_estimate()
+
 
     def load_surfaceprop_yaml(self):
+        # Read off the UI thread so a slow disk or network share does not hold up the window
         yaml_file_path = resource_path('surfaceprop.yaml')
+        game_dirs = list(self.game_dirs)
+        self.surfaceprop_loaded.clear()
+
+        def work(task):
+            with timing.span('gui.load_surfaceprop_yaml', games=len(game_dirs)) as span:
+                catalog = surfaceprops.load_catalog(yaml_file_path, game_dirs=game_dirs)
+                # Built here so the first keystroke in the search box does not pay for it
+                catalog.search_index()
+                span.set(entries=len(catalog.keys))
+            return catalog
+
+        self.tasks.run(work, self.on_surfaceprop_yaml_loaded, show_progress=False)
+
+    def on_surfaceprop_yaml_loaded(self, catalog, error):
+        if error is None:
+            self.surfaceprop_catalog = catalog
+        self.surfaceprop_loaded.set()
+        if isinstance(error, FileNotFoundError):
+            messagebox.showerror("Error", str(error))
+            return
+        if error:
+            messagebox.showerror("Error", f"Failed to load surfaceprop.yaml:\n{error}")
+            return
 
-        if not os.path.isfile(yaml_file_path):
-            messagebox.showerror("Error", f"surfaceprop.yaml file not found at {yaml_file_path}")
-            return {}
-
-        try:
-            with open(yaml_file_path, 'r') as file:
-                data = yaml.safe_load(file)
-
-            surfaceprops = {}
-            for type_category, subtypes in data.get('types', {}).items():
-                for subtype, details in subtypes.items():
-                    key = f"{type_category} - {subtype}"
-                    supported_games = details.get('supported_games', '').split(', ')
-                    surfaceprops[key] = {
-                        'description': details.get('description', ''),
-                        'supported_games': supported_games
-                    }
-            return surfaceprops
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load surfaceprop.yaml:\n{e}")
-            return {}
+        self.surfaceprop_data = catalog.surfaceprops
+        self.game_list = self.get_game_list()
+        # Reloading after the game folders change keeps the games already ticked
+        previous = {game: var.get() for game, var in self.selected_games_vars.items()}
+        self.selected_games_vars = {game: tk.BooleanVar(value=previous.get(game, False)) for game in self.game_list}
+        if self.is_tab_built(self.surface_tab):
+            self.create_game_checkbuttons()
+        if catalog.errors:
+            self.status.set("Game folders: " + "; ".join(catalog.errors))
+        elif self.game_dirs:
+            self.status.set(f"Loaded {len(catalog)} surface properties")
 
     def get_game_list(self):
-        games = set()
-        for details in self.surfaceprop_data.values():
-            games.update(details.get('supported_games', []))
-        game_list = sorted(games)
-        return game_list
+        # Built once when the catalog is compiled
+        return self.surfaceprop_catalog.game_list
+
+    def collect_settings(self):
+        return qcgen.default_settings(
+            model_working_folder=self.model_working_folder.get(),
+            model_name=self.model_name.get(),
+            cdmaterials=self.cdmaterials.get(),
+            body_name=self.body_name.get(),
+            body_smd=self.body_smd.get(),
+            surfaceprop=self.surfaceprop.get(),
+            scale=self.scale.get(),
+            staticprop=self.staticprop.get(),
+            casttextureshadows=self.casttextureshadows.get(),
+            mostlyopaque=self.mostlyopaque.get(),
+            collisionmodel=self.collisionmodel.get(),
+            mass=self.mass.get(),
+            concave=self.concave.get(),
+            qc_template=self.qc_template.get(),
+            lods=[{'screen_size': lod_entry['screen_size'].get(), 'lod_model': lod_entry['lod_model'].get()}
+                  for lod_entry in self.lod_entries],
+        )
 
-    def generate_qc_file(self):
+    def resolve_surfaceprop(self, settings):
+        # The search box is editable, so the field may hold a half-typed query
+        # rather than a surfaceprop; only a catalog entry is written to the QC
+        if not settings['surfaceprop']:
+            return
+        key = self.surfaceprop_catalog.find(settings['surfaceprop'].strip())
+        if key is None:
+            if not self.surfaceprop_loaded.is_set():
+                raise ValueError("Surface properties are still loading, try again in a moment.")
+            raise ValueError(f"Unknown surfaceprop '{settings['surfaceprop']}'. Pick one from the search results.")
+        settings['surfaceprop'] = key
+
+    def validate_smds(self):
         if not self.body_smd.get():
-            messagebox.showerror("Error", "Please open an SMD file first.")
+            messagebox.showerror("Error", "Please load an SMD file first. go to File > Load SMD")
             return
+        import validate
+        settings = self.collect_settings()
 
-        if not self.model_working_folder.get() or not self.model_name.get():
-            messagebox.showerror("Error", "Model Working Folder or Model Name not specified.")
+        def on_done(reports, error):
+            if error:
+                messagebox.showerror("Error", f"Failed to validate SMDs:\n{error}")
+                return
+            self.show_validation_report(reports)
+
+        self.tasks.run(lambda task: validate.validate_settings(settings), on_done, label="Validating SMDs", controls=[self.generate_button])
+
+    def import_manifest(self):
+        file_selected = filedialog.askopenfilename(title="Select a CSV or JSON manifest",
+                                                   filetypes=[("Manifests", "*.csv *.json"), ("CSV files", "*.csv"), ("JSON files", "*.json")])
+        if not file_selected:
             return
+        import bulk
+        import manifest
+
+        # The current form provides the defaults for empty cells
+        base_settings = self.collect_settings()
+        base_settings.update(body_smd="", model_name="", lods=[])
+
+        def work(task):
+            # Rows are checked against the catalog, so wait for it if it is still loading
+            while not self.surfaceprop_loaded.wait(0.1):
+                task.checkpoint(0, None, "waiting for surface properties")
+            rows = bulk.load_rows(file_selected, base_settings, self.surfaceprop_catalog)
+            valid = sum(1 for row in rows if row['settings'] is not None)
+            done = []
+
+            def progress(result):
+                done.append(result)
+                task.checkpoint(len(done), valid, os.path.basename(result['smd']))
+
+            return bulk.generate_rows(rows, progress=progress, manifest=manifest.Manifest.for_directory(file_selected))
+
+        def on_done(rows, error):
+            if error:
+                messagebox.showerror("Error", f"Failed to import {os.path.basename(file_selected)}:\n{error}")
+                return
+            failed = bulk.summarize(rows)
+            heading = f"{len(rows) - len(failed)} of {len(rows)} rows generated QC files."
+            if failed:
+                self.show_report("Manifest Import", heading, failed)
+            else:
+                messagebox.showinfo("Success", heading)
+
+        self.tasks.run(work, on_done, label="Importing manifest", controls=[self.generate_button])
+
+    def show_validation_report(self, reports, heading=""):
+        import validate
+        lines = []
+        for report in reports:
+            stats = report['stats']
+            lines.append(f"{os.path.basename(report['file'])} ({report['role']})")
+            if stats:
+                lines.append(f"    {stats['triangles']} triangles, {stats['vertices']} vertices, {stats['materials']} materials, {stats['bones']} bones")
+        lines.append("")
+        lines.extend(validate.summarize(reports) or ["No problems found."])
+        self.show_report("SMD Validation", heading, lines)
+
+    def show_report(self, title, heading, lines):
+        window = tk.Toplevel(self.master)
+        window.title(title)
+        if heading:
+            tk.Label(window, text=heading, font=('Arial', 10, 'bold'), anchor='w').pack(fill='x', padx=10, pady=(10, 0))
+
+        text_frame = tk.Frame(window)
+        text_frame.pack(fill='both', expand=True, padx=10, pady=10)
+        text = tk.Text(text_frame, width=100, height=20, wrap='word')
+        scrollbar = tk.Scrollbar(text_frame, orient="vertical", command=text.yview)
+        text.configure(yscrollcommand=scrollbar.set)
+        text.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
 
-        # Normalize working folder path
-        working_folder = self.model_working_folder.get().strip().strip("/\\").replace("\\", "/")
-        model_name = self.model_name.get().strip()
+        text.insert(tk.END, "\n".join(lines) + "\n")
+        text.config(state='disabled')
+        tk.Button(window, text="Close", command=window.destroy).pack(pady=(0, 10))
 
-        if not model_name.endswith(".mdl"):
-            model_name += ".mdl"
+    def browse_compiler(self):
+        file_selected = filedialog.askopenfilename(title="Select studiomdl or another compiler")
+        if file_selected:
+            self.compiler_path.set(file_selected)
 
-        # Construct $modelname
-        modelname_full = f"{working_folder}/{model_name}"
+    def browse_qc_template(self):
+        file_selected = filedialog.askopenfilename(title="Select QC Template", filetypes=[("QC Template", "*.qc *.qct *.txt"), ("All Files", "*.*")])
+        if file_selected:
+            self.qc_template.set(file_selected)
+
+    def save_default_template(self):
+        file_selected = filedialog.asksaveasfilename(title="Save Default QC Template", defaultextension=".qct", filetypes=[("QC Template", "*.qct")])
+        if not file_selected:
+            return
+        try:
+            with open(file_selected, 'w', encoding='utf-8') as f:
+                f.write(qcgen.DEFAULT_QC_TEMPLATE)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to save template:\n{e}")
+            return
+        self.qc_template.set(file_selected)
+
+    def browse_materials_root(self):
+        folder_selected = filedialog.askdirectory(title="Select the materials folder")
+        if folder_selected:
+            self.materials_root.set(folder_selected)
 
+    def check_materials(self):
+        smd_path = self.body_smd.get()
+        if not smd_path:
+            messagebox.showerror("Error", "Please open an SMD file first.")
+            return
+        if not self.materials_root.get():
+            messagebox.showerror("Error", "Please select a materials folder first.")
+            return
+
+        import materials
+        self.infer_cdmaterials()
+        cdmaterials = [self.cdmaterials.get()]
+        materials_root = self.materials_root.get()
+
+        def work(task):
+            indexes = materials.load_indexes([materials_root])
+            task.checkpoint(1, 2)
+            return materials.check_smd(smd_path, cdmaterials, indexes)
+
+        def on_done(report, error):
+            if error:
+                messagebox.showerror("Error", f"Failed to check materials:\n{error}")
+                return
+            problems = materials.problems(report)
+            if problems:
+                messagebox.showwarning("Missing Materials", "\n".join(problems))
+            else:
+                messagebox.showinfo("Materials", f"All {len(report)} materials were found.")
+
+        self.tasks.run(work, on_done, label="Checking materials", controls=[self.check_materials_button])
+
+    def compile_qc_files(self, qc_paths):
+        if not self.compiler_path.get():
+            messagebox.showerror("Error", "Please select a compiler in Other Settings first.")
+            return
+
+        import compiler
+        compiler_path = self.compiler_path.get()
+        compiler_args = self.compiler_args.get()
+
+        def work(task):
+            finished = []
+
+            def on_event(kind, result):
+                # Called from the compile threads; the runner hands it to the Tk thread
+                name = os.path.basename(result['qc'])
+                if kind == 'finished':
+                    finished.append(result)
+                    task.progress(len(finished), len(qc_paths), f"{name} {result['status']}")
+                elif kind == 'output':
+                    task.progress(len(finished), len(qc_paths), f"{name}: {result['line'][:100]}")
+
+            return compiler.compile_all(qc_paths, compiler_path, compiler_args, on_event=on_event, cancel_event=task.cancel_event)
+
+        def on_done(results, error):
+            if error:
+                messagebox.showerror("Error", f"Failed to run the compiler:\n{error}")
+                return
+            failed = [result for result in results if result['status'] == 'failed']
+            summary = ", ".join(f"{sum(result['status'] == status for result in results)} {status}" for status in ('compiled', 'cached', 'failed'))
+            self.status.set(f"Compile finished: {summary}")
+            if failed:
+                messagebox.showerror("Error", "Compile failed, see:\n" + "\n".join(result['log'] for result in failed))
+
+        self.tasks.run(work, on_done, label="Compiling", controls=[self.generate_button])
+
+    @timing.traced('gui.generate_qc_file')
+    def generate_qc_file(self):
         # Update cdmaterials
         self.infer_cdmaterials()
 
-        # Prepare QC file content
-        qc_content = "//Made with QC File Generator by Jacob Robbins\n//https://github.com/Jacobdeanr/qc-generator\n"
+        settings = self.collect_settings()
+        try:
+            self.resolve_surfaceprop(settings)
+            qcgen.build_qc_content(settings)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+
+        import validate
 
-        # Required fields
-        qc_content += f'$modelname "{modelname_full}"\n'
-        qc_content += f'$body "{self.body_name.get()}" "{os.path.basename(self.body_smd.get())}"\n'
-        
-        if not self.surfaceprop.get():
-            qc_content += f'$surfaceprop "Default"\n'
+        def work(task):
+            # studiomdl would reject the model anyway, so hard errors stop here
+            reports = validate.validate_settings(settings)
+            if validate.has_errors(reports):
+                return None, reports
+            # The SMD folder may be on a slow share, so write off the UI thread
+            task.checkpoint(1, 2)
+            return qcgen.write_qc_file(settings), reports
+
+        self.tasks.run(work, self.on_qc_file_generated, label="Validating and writing QC file", controls=[self.generate_button])
+
+    def on_qc_file_generated(self, generated, error):
+        if error:
+            messagebox.showerror("Error", f"Failed to write QC file:\n{error}")
+            return
+        qc_file_path, reports = generated
+        if qc_file_path is None:
+            self.show_validation_report(reports, "The QC file was not written because the SMDs have errors studiomdl would reject.")
+            return
+        messagebox.showinfo("Success", f"QC file generated at:\n{qc_file_path}")
+        if any(report['issues'] for report in reports):
+            self.show_validation_report(reports, "The QC file was written, but the SMDs have warnings.")
+
+        if self.compile_after_generate.get():
+            self.compile_qc_files([qc_file_path])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate QC files for Source Engine models.")
+    parser.add_argument('--batch', metavar='DIR', help="Generate a .qc next to every .smd under DIR without opening the GUI.")
+    parser.add_argument('--from-manifest', metavar='FILE', help="Generate one QC per row of a CSV or JSON manifest (columns: smd, model_name, working_folder, surfaceprop, mass, static, lods, collision_model, ...) without opening the GUI. The options below are the defaults for empty cells.")
+    parser.add_argument('--rewrite', metavar='DIR', help="Edit every .qc and .qci under DIR in place with --set and --replace, leaving all other lines untouched, without opening the GUI.")
+    parser.add_argument('--set', nargs=2, metavar=('DIRECTIVE', 'VALUE'), action='append', default=[], help="With --rewrite: give DIRECTIVE (e.g. '$surfaceprop') this value everywhere. Repeatable.")
+    parser.add_argument('--replace', nargs=3, metavar=('DIRECTIVE', 'OLD', 'NEW'), action='append', default=[], help="With --rewrite: change DIRECTIVE from OLD to NEW where it is OLD, e.g. '$cdmaterials' models/old models/new. Repeatable.")
+    parser.add_argument('--dry-run', action='store_true', help="With --rewrite: list the files that would change without writing them.")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes for batch mode (default: CPU count).")
+    parser.add_argument('--working-folder', default=qcgen.DEFAULT_SETTINGS['model_working_folder'], help="Model working folder used for $modelname and $cdmaterials.")
+    parser.add_argument('--surfaceprop', default="", help="Surface property, e.g. 'Metal - Canister' or 'Canister'.")
+    parser.add_argument('--game-dir', metavar='DIR', action='append', default=[], help="Game or mod folder whose scripts/surfaceproperties*.txt add to the surfaceprops --surfaceprop and manifests can use. Repeatable.")
+    parser.add_argument('--body-name', default=qcgen.DEFAULT_SETTINGS['body_name'])
+    parser.add_argument('--scale', type=float, default=qcgen.DEFAULT_SETTINGS['scale'])
+    parser.add_argument('--static', action='store_true', help="Write $staticprop.")
+    parser.add_argument('--cast-texture-shadows', action='store_true', help="Write $casttextureshadows (static props only).")
+    parser.add_argument('--mostly-opaque', action='store_true', help="Write $mostlyopaque instead of $opaque.")
+    parser.add_argument('--collision-model', default="", help="Collision SMD relative to each body SMD.")
+    parser.add_argument('--mass', type=float, default=qcgen.DEFAULT_SETTINGS['mass'])
+    parser.add_argument('--concave', action='store_true')
+    parser.add_argument('--auto-mass', action='store_true', help="Compute $mass from the collision model volume, $scale and the surfaceprop density.")
+    parser.add_argument('--generate-collision', choices=list(COLLISION_MODE_LABELS), default=None, help="Build <smd>_phys.smd from each SMD as a single convex hull or a convex decomposition, and use it as $collisionmodel.")
+    parser.add_argument('--max-convex-pieces', type=int, default=qcgen.DEFAULT_SETTINGS['max_convex_pieces'], help="Piece limit for --generate-collision decompose.")
+    parser.add_argument('--generate-lods', metavar='RATIOS', default="", help="Decimate each SMD into _lod1.smd, _lod2.smd, ... at these comma separated ratios, e.g. '0.5,0.25'.")
+    parser.add_argument('--template', metavar='FILE', default="", help="QC template with {{field}} placeholders to render instead of the built in layout. Watched in --watch mode.")
+    parser.add_argument('--print-template', action='store_true', help="Print the built in QC template, as a starting point for --template, and exit.")
+    parser.add_argument('--settings', metavar='FILE', help="JSON object of QC settings applied on top of the options above. Watched in --watch mode.")
+    parser.add_argument('--force', action='store_true', help="Regenerate every QC even if its inputs have not changed.")
+    parser.add_argument('--watch', action='store_true', help="Keep running and regenerate affected QCs whenever an SMD or the settings change.")
+    parser.add_argument('--compile', action='store_true', help="Run the compiler on every generated QC. Unchanged models that compiled before are skipped.")
+    parser.add_argument('--compiler', default='studiomdl', help="Compiler executable for --compile (default: studiomdl on PATH). Any command line tool taking the QC path last works.")
+    parser.add_argument('--compiler-args', default="-nop4 -verbose", help="Arguments passed to the compiler before the QC path.")
+    parser.add_argument('--compile-workers', type=int, default=None, help="Number of models compiled at once (default: CPU count).")
+    parser.add_argument('--validate', action='store_true', help="Check the body, LOD and collision SMDs against studiomdl limits. Models with errors get no QC.")
+    parser.add_argument('--validation-report', metavar='FILE', help="Write the --validate results of every checked model to FILE as JSON.")
+    parser.add_argument('--materials-root', metavar='DIR', action='append', default=[], help="materials folder (or a game folder containing one) to check each SMD's materials against. Repeat for several folders.")
+    parser.add_argument('--startup-time', action='store_true', help="Open the window, print the time it took to appear as JSON and exit. Used by benchmarks/startup.py.")
+    parser.add_argument('--debounce', type=float, default=0.5, help="Seconds of quiet to wait for after a change before regenerating in --watch mode.")
+    return parser.parse_args(argv)
+
+
+def build_base_settings(args, need_catalog=False):
+    # Returns (base_settings, catalog); the catalog is None when nothing needs it
+    import lod
+    lod_ratios = lod.parse_ratios(args.generate_lods)
+    base_settings = qcgen.default_settings(
+        model_working_folder=args.working_folder,
+        surfaceprop=args.surfaceprop,
+        body_name=args.body_name,
+        scale=args.scale,
+        staticprop=args.static,
+        casttextureshadows=args.static and args.cast_texture_shadows,
+        mostlyopaque=args.mostly_opaque,
+        collisionmodel=args.collision_model,
+        mass=args.mass,
+        concave=args.concave,
+        lod_ratios=lod_ratios,
+        auto_mass=args.auto_mass,
+        collision_mode=args.generate_collision,
+        max_convex_pieces=args.max_convex_pieces,
+        validate=args.validate or bool(args.validation_report),
+        qc_template=os.path.abspath(args.template) if args.template else "",
+    )
+
+    if args.settings:
+        with open(args.settings, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+        unknown = sorted(set(overrides) - set(qcgen.DEFAULT_SETTINGS))
+        if unknown:
+            raise ValueError(f"Unknown settings in {args.settings}: {', '.join(unknown)}")
+        base_settings.update(overrides)
+
+    if base_settings['qc_template']:
+        # Fail before the batch starts rather than once per model
+        qcgen.qc_template(base_settings)
+
+    if not (need_catalog or base_settings['surfaceprop'] or base_settings['auto_mass'] or args.game_dir):
+        return base_settings, None
+    catalog = surfaceprops.load_catalog(resource_path('surfaceprop.yaml'), game_dirs=args.game_dir)
+    for error in catalog.errors:
+        print(f"Warning: {error}", file=sys.stderr)
+
+    if base_settings['surfaceprop']:
+        # Checked once here, as bulk does per row, rather than writing a bogus $surfaceprop into every QC
+        key = catalog.find(base_settings['surfaceprop'])
+        if key is None:
+            raise ValueError(f"Unknown surfaceprop '{base_settings['surfaceprop']}'")
+        base_settings['surfaceprop'] = key
+
+    if base_settings['auto_mass']:
+        base_settings['density'] = catalog.density(base_settings['surfaceprop'])
+        if not base_settings['density']:
+            raise ValueError(f"--auto-mass needs a surfaceprop with a density, got '{base_settings['surfaceprop']}'")
+
+    # Part of every model's input hash, so editing surfaceprop.yaml regenerates
+    base_settings['catalog_version'] = catalog.version
+    return base_settings, catalog
+
+
+def find_batch_files(root_dir, base_settings):
+    import lod
+    import collision
+    smd_files = qcgen.find_smd_files(root_dir)
+    if base_settings['collisionmodel']:
+        # Collision meshes live next to the body SMDs but do not get their own QC
+        smd_files = [smd_path for smd_path in smd_files
+                     if os.path.basename(smd_path) != os.path.basename(base_settings['collisionmodel'])]
+    # Previously generated LODs are inputs to their body's QC, not models of their own
+    return [smd_path for smd_path in smd_files if not lod.is_lod_file(smd_path) and not collision.is_collision_file(smd_path)]
+
+
+def run_batch_pass(args, base_settings, smd_files):
+    import manifest
+    import validate
+    batch_manifest = manifest.Manifest.for_directory(args.batch)
+    if args.force:
+        batch_manifest.outputs = {}
+
+    with timing.span('batch.pass', models=len(smd_files)):
+        results = qcgen.batch_generate(smd_files, base_settings, workers=args.workers, manifest=batch_manifest)
+    failures = skipped = 0
+    for result in results:
+        if result['error']:
+            failures += 1
+            print(f"FAIL {result['smd']}: {result['error']}")
+        elif result['skipped']:
+            skipped += 1
         else:
-            qc_content += f'$surfaceprop "{self.surfaceprop.get().split(" - ")[-1]}"\n'
-        
-        qc_content += f'$cdmaterials "{self.cdmaterials.get()}"\n'
+            print(f"OK   {result['smd']} -> {result['qc']}")
+        for line in validate.summarize(result['validation']):
+            print(f"     {line}")
 
-        # Optional fields
-        if self.scale.get():
-            qc_content += f'$scale {self.scale.get()}\n'
+    print(f"{len(results) - failures - skipped} succeeded, {skipped} up to date, {failures} failed")
 
-        qc_content += f'$sequence "idle" "{os.path.basename(self.body_smd.get())}"\n'
+    if args.validation_report:
+        report = {result['smd']: result['validation'] for result in results if result['validation']}
+        with open(args.validation_report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
 
-        if self.staticprop.get():
-            qc_content += '$staticprop\n'
+    if args.materials_root:
+        check_batch_materials(args, base_settings, [result['smd'] for result in results if not result['error'] and not result['skipped']])
 
-        if self.casttextureshadows.get():
-            qc_content += '$casttextureshadows\n'
+    if args.compile:
+        failures += run_compile(args, [result['qc'] for result in results if not result['error']])
+    return failures
 
-        if self.mostlyopaque.get():
-            qc_content += '$mostlyopaque\n'
-        else:
-            qc_content += '$opaque\n'
-
-        # Collision settings
-        if self.collisionmodel.get():
-            qc_content += f'$collisionmodel "{self.collisionmodel.get()}"\n'
-            qc_content += "{\n"
-            if self.mass.get():
-                qc_content += f'\t$mass {self.mass.get()}\n'
-            if self.concave.get():
-                qc_content += '\t$concave\n'
-            qc_content += '}\n'
-
-        # LOD settings
-        base_model = os.path.basename(self.body_smd.get())
-        for lod_entry in self.lod_entries:
-            screen_size = lod_entry['screen_size'].get()
-            lod_model = lod_entry['lod_model'].get()
-            if screen_size and lod_model:
-                qc_content += f'$lod {screen_size}\n'
-                qc_content += '{\n'
-                qc_content += f'\treplacemodel "{base_model}" "{lod_model}"\n'
-                qc_content += '}\n'
-
-        # Write to QC file in the same directory as the SMD file
-        qc_file_path = os.path.splitext(self.body_smd.get())[0] + '.qc'
+
+def check_batch_materials(args, base_settings, smd_files):
+    import materials
+    # Missing materials are reported but do not fail the batch
+    try:
+        indexes = materials.load_indexes(args.materials_root)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return
+    cdmaterials = [qcgen.infer_cdmaterials(base_settings['model_working_folder'])]
+    for smd_path in smd_files:
         try:
-            with open(qc_file_path, 'w') as qc_file:
-                qc_file.write(qc_content)
-            messagebox.showinfo("Success", f"QC file generated at:\n{qc_file_path}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to write QC file:\n{e}")
+            report = materials.check_smd(smd_path, cdmaterials, indexes)
+        except (OSError, ValueError) as e:
+            print(f"MISSING  {smd_path}: could not read materials: {e}")
+            continue
+        for problem in materials.problems(report):
+            print(f"MISSING  {smd_path}: {problem}")
+
+
+def run_compile(args, qc_paths):
+    import compiler
+    def on_event(kind, result):
+        if kind == 'finished' and result['status'] != 'cached':
+            label = 'COMPILED' if result['status'] == 'compiled' else 'FAIL'
+            print(f"{label:<8} {result['qc']} ({result['duration']:.1f}s, log: {result['log']})")
+
+    try:
+        results = compiler.compile_all(qc_paths, args.compiler, args.compiler_args, workers=args.compile_workers, on_event=on_event)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return len(qc_paths)
+
+    counts = {status: sum(result['status'] == status for result in results) for status in ('compiled', 'cached', 'failed')}
+    print(f"{counts['compiled']} compiled, {counts['cached']} cached, {counts['failed']} failed")
+    return counts['failed']
+
+
+def run_manifest_import(args):
+    import bulk
+    import manifest
+    try:
+        # Rows may name their own surfaceprop, so the catalog is always loaded here
+        base_settings, catalog = build_base_settings(args, need_catalog=True)
+        rows = bulk.load_rows(args.from_manifest, base_settings, catalog)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    invalid = sum(1 for row in rows if row['settings'] is None)
+    print(f"{len(rows)} rows, {invalid} invalid")
+
+    import_manifest = manifest.Manifest.for_directory(args.from_manifest)
+    if args.force:
+        import_manifest.outputs = {}
+    bulk.generate_rows(rows, workers=args.workers, manifest=import_manifest)
+
+    skipped = 0
+    for row in rows:
+        result = row.get('result')
+        if row['errors']:
+            print(f"FAIL row {row['row']} {row['smd']}: {'; '.join(row['errors'])}")
+        elif result['skipped']:
+            skipped += 1
+        else:
+            print(f"OK   row {row['row']} {row['smd']} -> {result['qc']}")
+
+    failures = sum(1 for row in rows if row['errors'])
+    print(f"{len(rows) - failures - skipped} succeeded, {skipped} up to date, {failures} failed")
+
+    if args.compile:
+        failures += run_compile(args, [row['result']['qc'] for row in rows if not row['errors']])
+    return 1 if failures else 0
+
+
+def run_rewrite(args):
+    import qcfile
+    if not os.path.isdir(args.rewrite):
+        print(f"Error: {args.rewrite} is not a directory", file=sys.stderr)
+        return 2
+    changes = [(directive, value, None) for directive, value in args.set] + [(directive, new, old) for directive, old, new in args.replace]
+    if not changes:
+        print("Error: --rewrite needs at least one --set or --replace", file=sys.stderr)
+        return 2
+    bad = [change[0] for change in changes if not change[0].startswith('$')]
+    if bad:
+        print(f"Error: directives start with $, got: {', '.join(bad)}", file=sys.stderr)
+        return 2
+
+    results = qcfile.rewrite_tree(args.rewrite, changes, workers=args.workers, dry_run=args.dry_run)
+    failures = 0
+    for result in results:
+        if result['error']:
+            failures += 1
+            print(f"FAIL {result['path']}: {result['error']}")
+        elif result['edits']:
+            print(f"{'WOULD' if args.dry_run else 'EDIT'} {result['path']} ({result['edits']} changes)")
+    changed = sum(1 for result in results if result['edits'])
+    print(f"{changed} of {len(results)} files {'would change' if args.dry_run else 'changed'}, {failures} failed")
+    return 1 if failures else 0
+
+
+def run_batch(args):
+    if not os.path.isdir(args.batch):
+        print(f"Error: {args.batch} is not a directory", file=sys.stderr)
+        return 2
+
+    try:
+        base_settings, _ = build_base_settings(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    smd_files = find_batch_files(args.batch, base_settings)
+    if not smd_files and not args.watch:
+        print(f"No SMD files found under {args.batch}")
+        return 0
+
+    failures = run_batch_pass(args, base_settings, smd_files)
+    if not args.watch:
+        return 1 if failures else 0
+
+    settings_files = [resource_path('surfaceprop.yaml')] + [path for path in (args.settings, base_settings['qc_template']) if path]
+    for game_dir in args.game_dir:
+        settings_files += surfaceprops.surfaceproperties_files(game_dir)
+
+    def on_change(changed):
+        nonlocal base_settings
+        if any(path in settings_files for path in changed):
+            try:
+                base_settings, _ = build_base_settings(args)
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return
+            affected = find_batch_files(args.batch, base_settings)
+        else:
+            # A changed LOD or collision SMD affects the bodies next to it; the
+            # manifest skips any of them whose inputs did not actually change
+            directories = {os.path.dirname(path) for path in changed}
+            affected = [smd_path for smd_path in find_batch_files(args.batch, base_settings)
+                        if os.path.dirname(smd_path) in directories]
+        if affected:
+            run_batch_pass(args, base_settings, affected)
+
+    import watch
+    print(f"Watching {args.batch} for changes, press Ctrl+C to stop")
+    try:
+        watch.watch(args.batch, on_change, extra_paths=settings_files, debounce=args.debounce)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.print_template:
+        sys.stdout.write(qcgen.DEFAULT_QC_TEMPLATE)
+        return 0
+    if args.rewrite:
+        return run_rewrite(args)
+    if args.from_manifest:
+        return run_manifest_import(args)
+    if args.batch:
+        return run_batch(args)
 
-if __name__ == "__main__":
     root = tk.Tk()
     app = QCFileGenerator(root)
+    if args.startup_time:
+        # First window: widgets mapped and drawn, catalog possibly still loading
+        root.update()
+        print(json.dumps({'first_window_ms': round((time.perf_counter() - STARTED_AT) * 1000, 1)}))
+        root.destroy()
+        return 0
+    # Idle callbacks run once the window has been drawn
+    root.after_idle(lambda: timing.record('gui.first_window', STARTED_AT))
     root.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
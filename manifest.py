@@ -0,0 +1,103 @@
+import os
+import json
+import hashlib
+import cache
+
+# Bump to invalidate every manifest, e.g. when the QC output format changes
+MANIFEST_VERSION = 1
+
+
+def input_files(settings):
+    # Files whose contents feed into the QC. Generated LOD and collision SMDs
+    # are derived from the body SMD, so only hand-authored ones are listed.
+    smd_dir = os.path.dirname(settings['body_smd'])
+    files = [settings['body_smd']]
+    if not settings.get('lod_ratios'):
+        files += [os.path.join(smd_dir, lod_entry['lod_model']) for lod_entry in settings.get('lods', []) if lod_entry.get('lod_model')]
+    if settings.get('collisionmodel') and not settings.get('collision_mode'):
+        files.append(os.path.join(smd_dir, settings['collisionmodel']))
+    if settings.get('qc_template'):
+        files.append(settings['qc_template'])
+    return files
+
+
+def generated_files(settings):
+    # LOD and collision SMDs written alongside the QC; a model is only up to date
+    # while every one of them still exists
+    import lod
+    import collision
+    smd_path = settings['body_smd']
+    files = [lod.lod_path_for(smd_path, level) for level in range(1, len(settings.get('lod_ratios') or ()) + 1)]
+    if settings.get('collision_mode'):
+        files.append(collision.collision_path_for(smd_path))
+    return files
+
+
+def file_digest(path, known):
+    # Re-hash only when the size or mtime differs from the remembered stamp
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 'missing', None
+    entry = known.get(path)
+    if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+        return entry[2], entry
+    sha256 = cache.file_sha256(path)
+    return sha256, [stat.st_mtime_ns, stat.st_size, sha256]
+
+
+def input_digest(settings, known_files):
+    hashed_settings = dict(settings)
+    hashed_settings['lods'] = [{'screen_size': lod_entry.get('screen_size'), 'lod_model': lod_entry.get('lod_model')}
+                               for lod_entry in settings.get('lods', [])]
+    digest = hashlib.sha256()
+    digest.update(f'{MANIFEST_VERSION}\0'.encode())
+    digest.update(json.dumps(hashed_settings, sort_keys=True, default=str).encode('utf-8'))
+
+    files = {}
+    for path in input_files(settings):
+        sha256, entry = file_digest(path, known_files)
+        if entry:
+            files[path] = entry
+        digest.update(f'\0{path}\0{sha256}'.encode('utf-8'))
+    return digest.hexdigest(), files
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        data = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if data.get('version') != MANIFEST_VERSION:
+            data = {}
+        self.outputs = data.get('outputs', {})
+        self.files = data.get('files', {})
+
+    @classmethod
+    def for_directory(cls, root_dir):
+        return cls(os.path.join(cache.cache_dir('manifests'), cache.path_key(root_dir) + '.json'))
+
+    def previous(self, qc_path, settings):
+        return {
+            'digest': self.outputs.get(qc_path),
+            'files': {path: self.files[path] for path in input_files(settings) if path in self.files},
+        }
+
+    def record(self, qc_path, digest, files):
+        self.outputs[qc_path] = digest
+        self.files.update(files)
+
+    def forget(self, qc_path):
+        self.outputs.pop(qc_path, None)
+
+    def save(self):
+        # Inputs and QCs that were deleted or renamed are dropped so the manifest
+        # does not grow for the whole life of the directory
+        self.files = {path: entry for path, entry in self.files.items() if os.path.isfile(path)}
+        self.outputs = {qc_path: digest for qc_path, digest in self.outputs.items() if os.path.isfile(qc_path)}
+        data = {'version': MANIFEST_VERSION, 'outputs': self.outputs, 'files': self.files}
+        cache.write_bytes(self.path, json.dumps(data, sort_keys=True).encode('utf-8'))
@@ -0,0 +1,186 @@
+import os
+import re
+import time
+import cache
+import smd
+import timing
+
+# Bump to force a full rescan of every materials tree
+INDEX_VERSION = 1
+
+INDEXED_EXTENSIONS = ('.vmt', '.vtf')
+
+# Directories modified this recently may still change within the same mtime
+# tick, so they are rescanned next time instead of being trusted.
+RACY_WINDOW_NS = 2 * 10 ** 9
+
+# studiomdl drops the image extension exporters leave on material names
+SOURCE_IMAGE_EXTENSIONS = ('.vmt', '.bmp', '.tga', '.png', '.jpg', '.jpeg', '.psd', '.tif', '.tiff', '.dds')
+
+# VMT parameters that name a VTF relative to materials/
+TEXTURE_PARAMETER = re.compile(
+    r'^\s*"?\$(basetexture2?|bumpmap|normalmap|detail|envmapmask|selfillummask|phongexponenttexture|blendmodulatetexture)"?\s+"?([^"\s]+)"?',
+    re.IGNORECASE | re.MULTILINE)
+
+
+def normalize_material_path(name):
+    name = name.strip().replace('\\', '/').strip('/').lower()
+    root, ext = os.path.splitext(name)
+    if ext in SOURCE_IMAGE_EXTENSIONS or ext == '.vtf':
+        name = root
+    return name
+
+
+def materials_root_for(path):
+    # Accept either the materials folder itself or a game/content folder containing one
+    candidate = os.path.join(path, 'materials')
+    if os.path.basename(os.path.normpath(path)).lower() != 'materials' and os.path.isdir(candidate):
+        return candidate
+    return path
+
+
+class MaterialIndex:
+    # Every VMT/VTF under one materials/ root, keyed by its lower-case path
+    # relative to the root (Source looks materials up case-insensitively).
+    # Each directory is stored with its mtime, its subdirectories and its indexed
+    # files; adding, removing or renaming an entry changes the directory mtime, so a
+    # refresh only stats directories and rescans the ones that changed.
+    def __init__(self, root):
+        self.root = os.path.abspath(materials_root_for(root))
+        self.path = os.path.join(cache.cache_dir('materials'), cache.path_key(self.root) + '.pickle')
+        self.dirs = {}
+        self.files = {}
+        data = cache.read_pickle(self.path)
+        if isinstance(data, dict) and data.get('version') == INDEX_VERSION:
+            self.dirs = data['dirs']
+            self.files = data['files']
+
+    @timing.traced('materials.refresh')
+    def refresh(self):
+        if not os.path.isdir(self.root):
+            raise FileNotFoundError(f"Materials folder not found: {self.root}")
+
+        dirs = {}
+        changed = False
+        now = time.time_ns()
+        stack = ['']
+        # Symlinked folders are followed, but each directory is indexed once so a
+        # link back up the tree cannot recurse forever
+        visited = set()
+        while stack:
+            rel_dir = stack.pop()
+            full_dir = os.path.join(self.root, rel_dir) if rel_dir else self.root
+            try:
+                stat = os.stat(full_dir)
+            except OSError:
+                continue
+            if stat.st_ino:
+                if (stat.st_dev, stat.st_ino) in visited:
+                    continue
+                visited.add((stat.st_dev, stat.st_ino))
+            mtime = stat.st_mtime_ns
+
+            entry = self.dirs.get(rel_dir)
+            if entry is None or entry[0] != mtime:
+                entry = self._scan(full_dir, mtime, now)
+                self._replace_files(rel_dir, self.dirs.get(rel_dir), entry)
+                changed = True
+            dirs[rel_dir] = entry
+            prefix = rel_dir + '/' if rel_dir else ''
+            stack.extend(prefix + subdir for subdir in entry[1])
+
+        for rel_dir in self.dirs.keys() - dirs.keys():
+            self._replace_files(rel_dir, self.dirs[rel_dir], None)
+            changed = True
+
+        self.dirs = dirs
+        if changed:
+            cache.write_pickle(self.path, {'version': INDEX_VERSION, 'dirs': self.dirs, 'files': self.files})
+        return self
+
+    def _scan(self, full_dir, mtime, now):
+        subdirs = []
+        files = []
+        try:
+            with os.scandir(full_dir) as entries:
+                for dir_entry in entries:
+                    if dir_entry.is_dir():
+                        subdirs.append(dir_entry.name)
+                    elif dir_entry.name.lower().endswith(INDEXED_EXTENSIONS):
+                        files.append(dir_entry.name)
+        except OSError:
+            pass
+        if now - mtime < RACY_WINDOW_NS:
+            mtime = None
+        return mtime, tuple(subdirs), tuple(files)
+
+    def _replace_files(self, rel_dir, old_entry, new_entry):
+        prefix = rel_dir + '/' if rel_dir else ''
+        if old_entry is not None:
+            for name in old_entry[2]:
+                self.files.pop((prefix + name).lower(), None)
+        if new_entry is not None:
+            self.files.update(((prefix + name).lower(), prefix + name) for name in new_entry[2])
+
+    def __contains__(self, rel_path):
+        return rel_path.lower() in self.files
+
+    def full_path(self, rel_path):
+        actual = self.files.get(rel_path.lower())
+        return os.path.join(self.root, actual) if actual else None
+
+
+def load_indexes(roots):
+    return [MaterialIndex(root).refresh() for root in roots]
+
+
+def vmt_textures(vmt_path):
+    try:
+        with open(vmt_path, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+    except OSError:
+        return []
+    textures = []
+    for _, texture in TEXTURE_PARAMETER.findall(text):
+        texture = normalize_material_path(texture)
+        # Render targets are created by the engine, not loaded from disk
+        if texture and not texture.startswith('_rt_'):
+            textures.append(texture)
+    return textures
+
+
+def resolve_materials(material_names, cdmaterials_paths, indexes):
+    # Looks every material up as <cdmaterials>/<name>.vmt the way studiomdl does,
+    # then checks the VTFs its VMT points at.
+    cdmaterials_paths = [normalize_material_path(path) for path in cdmaterials_paths if path.strip()] or ['']
+    report = []
+    for material in material_names:
+        name = normalize_material_path(material)
+        candidates = [f"{cdmaterials}/{name}.vmt" if cdmaterials else f"{name}.vmt" for cdmaterials in cdmaterials_paths]
+        entry = {'material': material, 'vmt': None, 'searched': candidates, 'missing_textures': []}
+        for candidate in candidates:
+            index = next((index for index in indexes if candidate in index), None)
+            if index is not None:
+                entry['vmt'] = candidate
+                vmt_path = index.full_path(candidate)
+                if vmt_path:
+                    entry['missing_textures'] = [texture for texture in vmt_textures(vmt_path)
+                                                 if not any(f"{texture}.vtf" in other for other in indexes)]
+                break
+        report.append(entry)
+    return report
+
+
+def check_smd(smd_path, cdmaterials_paths, indexes):
+    return resolve_materials(smd.read_materials(smd_path), cdmaterials_paths, indexes)
+
+
+def problems(report):
+    # One human-readable line per missing VMT or VTF
+    lines = []
+    for entry in report:
+        if entry['vmt'] is None:
+            lines.append(f"{entry['material']}: no VMT at {' or '.join('materials/' + path for path in entry['searched'])}")
+        for texture in entry['missing_textures']:
+            lines.append(f"{entry['material']}: {entry['vmt']} uses missing texture materials/{texture}.vtf")
+    return lines
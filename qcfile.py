@@ -0,0 +1,323 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cache
+
+# QC files are read as latin-1, which maps every byte to one character and back,
+# so offsets into the text are byte offsets and unedited bytes survive a rewrite
+# whatever encoding the file was saved in.
+ENCODING = 'latin-1'
+
+TOKEN = re.compile(
+    r'//[^\n]*'
+    r'|/\*.*?(?:\*/|\Z)'
+    r'|"(?P<string>[^"\n]*)"?'
+    r'|(?P<open>\{)'
+    r'|(?P<close>\})'
+    r'|(?P<word>(?:[^\s{}"/]|/(?![/*]))+)',
+    re.DOTALL)
+
+QC_EXTENSIONS = ('.qc', '.qci')
+
+# Directives the form can hold, once each (any number of $lod); anything else, and
+# every further occurrence of these, is reported as unsupported
+FORM_DIRECTIVES = frozenset({
+    '$modelname', '$body', '$model', '$surfaceprop', '$cdmaterials', '$scale', '$sequence',
+    '$staticprop', '$casttextureshadows', '$mostlyopaque', '$opaque', '$collisionmodel', '$lod',
+    '$include',
+})
+
+# Parsed files keyed by absolute path, with the (mtime, size) they were read at
+_parse_cache = {}
+
+
+def tokenize(text):
+    # (kind, value, start, end, line) with kind in string/word/open/close; comments are skipped
+    tokens = []
+    line = 1
+    position = 0
+    for match in TOKEN.finditer(text):
+        line += text.count('\n', position, match.start())
+        position = match.start()
+        kind = match.lastgroup
+        if kind is not None:
+            tokens.append((kind, match.group(kind), match.start(), match.end(), line))
+    return tokens
+
+
+def _command(name, token, path, args):
+    return {'name': name, 'args': args, 'block': None, 'token': token, 'file': path, 'line': token[4]}
+
+
+def _parse_block(tokens, index, path, nested):
+    # Top level statements start at a $directive. Inside a { } block they also start
+    # at the first token of a line, for statements such as replacemodel or studio.
+    commands = []
+    command = None
+    while index < len(tokens):
+        token = tokens[index]
+        kind, value = token[0], token[1]
+        if kind == 'close':
+            index += 1
+            if nested:
+                return commands, index
+            command = None
+            continue
+        if kind == 'open':
+            block, index = _parse_block(tokens, index + 1, path, True)
+            if command is None:
+                # A bare { } group, as in $texturegroup
+                command = _command(None, token, path, [])
+                commands.append(command)
+            command['block'] = block
+            # A block always ends its statement
+            command = None
+            continue
+
+        if command is None or (kind == 'word' and value.startswith('$')):
+            starts_statement = True
+        elif nested:
+            starts_statement = token[4] != (command['args'][-1][4] if command['args'] else command['line'])
+        else:
+            starts_statement = False
+        if starts_statement:
+            if kind == 'word':
+                command = _command(value.lower(), token, path, [])
+            else:
+                command = _command(None, token, path, [token])
+            commands.append(command)
+        else:
+            command['args'].append(token)
+        index += 1
+    return commands, index
+
+
+def parse(text, path='<qc>'):
+    return _parse_block(tokenize(text), 0, path, False)[0]
+
+
+def read_text(path):
+    with open(path, 'rb') as f:
+        return f.read().decode(ENCODING)
+
+
+def parse_file(path):
+    # Memoized per file; shared .qci files are parsed once however many QCs include them
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _parse_cache.get(path)
+    if cached is None or cached[0] != stamp:
+        cached = _parse_cache[path] = (stamp, parse(read_text(path), path))
+    return cached[1]
+
+
+def _resolve_include(name, including_file, root_dir):
+    # studiomdl resolves includes from the QC's folder; also accept paths relative
+    # to the file doing the including
+    name = name.replace('\\', '/')
+    for directory in (os.path.dirname(including_file), root_dir):
+        candidate = os.path.normpath(os.path.join(directory, name))
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def load_qc(path):
+    # Commands of the QC with every $include expanded in place
+    path = os.path.abspath(path)
+    root_dir = os.path.dirname(path)
+    qc = {'path': path, 'commands': [], 'files': [], 'errors': []}
+
+    def expand(file_path, chain):
+        qc['files'].append(file_path)
+        for command in parse_file(file_path):
+            if command['name'] != '$include':
+                qc['commands'].append(command)
+                continue
+            if not command['args']:
+                qc['errors'].append(f"{os.path.basename(file_path)}, line {command['line']}: $include without a file")
+                continue
+            include_path = _resolve_include(command['args'][0][1], file_path, root_dir)
+            if include_path is None:
+                qc['errors'].append(f"{os.path.basename(file_path)}, line {command['line']}: include not found: {command['args'][0][1]}")
+            elif include_path in chain:
+                qc['errors'].append(f"{os.path.basename(file_path)}, line {command['line']}: {command['args'][0][1]} includes itself")
+            else:
+                expand(include_path, chain | {include_path})
+
+    expand(path, {path})
+    return qc
+
+
+def _arg(command, index, default=None):
+    args = command['args']
+    return args[index][1] if len(args) > index else default
+
+
+def _float(command, index, default):
+    try:
+        return float(_arg(command, index))
+    except (TypeError, ValueError):
+        return default
+
+
+def _describe(command):
+    value = _arg(command, 0)
+    return f"{command['name']} {value}" if value else command['name']
+
+
+def qc_settings(qc):
+    # Settings for the form, plus the directives the form has no place for
+    settings = {
+        'staticprop': False,
+        'casttextureshadows': False,
+        'mostlyopaque': False,
+        'collisionmodel': "",
+        'concave': False,
+        'lods': [],
+    }
+    unsupported = []
+    sequences = []
+    qc_dir = os.path.dirname(qc['path'])
+    for command in qc['commands']:
+        name = command['name']
+        if name in ('$body', '$model') and ('body_smd' in settings or not _arg(command, 1)):
+            # The form has one body
+            unsupported.append(_describe(command))
+        elif name == '$cdmaterials' and 'cdmaterials' in settings:
+            unsupported.append(_describe(command))
+        elif name == '$sequence':
+            sequences.append(command)
+        elif name == '$modelname' and _arg(command, 0):
+            modelname = _arg(command, 0).replace('\\', '/').strip('/')
+            settings['model_working_folder'] = os.path.dirname(modelname)
+            settings['model_name'] = os.path.basename(modelname)
+        elif name in ('$body', '$model'):
+            settings['body_name'] = _arg(command, 0)
+            settings['body_smd'] = os.path.normpath(os.path.join(qc_dir, _arg(command, 1)))
+        elif name == '$surfaceprop' and _arg(command, 0):
+            settings['surfaceprop'] = _arg(command, 0)
+        elif name == '$cdmaterials' and _arg(command, 0) is not None:
+            settings['cdmaterials'] = _arg(command, 0).replace('\\', '/').strip('/')
+        elif name == '$scale':
+            settings['scale'] = _float(command, 0, 1.0)
+        elif name in ('$staticprop', '$casttextureshadows', '$mostlyopaque'):
+            settings[name[1:]] = True
+        elif name == '$opaque':
+            settings['mostlyopaque'] = False
+        elif name == '$collisionmodel' and _arg(command, 0):
+            settings['collisionmodel'] = _arg(command, 0)
+            for child in command['block'] or []:
+                if child['name'] == '$mass':
+                    settings['mass'] = _float(child, 0, None)
+                elif child['name'] == '$concave':
+                    settings['concave'] = True
+        elif name == '$lod' and _arg(command, 0):
+            for child in command['block'] or []:
+                if child['name'] == 'replacemodel' and _arg(child, 1):
+                    settings['lods'].append({'screen_size': _arg(command, 0), 'lod_model': _arg(child, 1)})
+        elif name not in FORM_DIRECTIVES:
+            unsupported.append(name or '{ }')
+    # The form writes a single idle sequence of the body SMD; only a sequence that
+    # matches it is covered, any other (or a second one) is not
+    for index, command in enumerate(sequences):
+        smd_path = _arg(command, 1)
+        if (index == 0 and smd_path and 'body_smd' in settings
+                and os.path.normcase(os.path.normpath(os.path.join(qc_dir, smd_path))) == os.path.normcase(settings['body_smd'])):
+            continue
+        unsupported.append(_describe(command))
+    if settings.get('mass') is None:
+        settings.pop('mass', None)
+    return settings, list(dict.fromkeys(unsupported))
+
+
+def _quote(original, value):
+    # Keep a bare word bare when the new value still is one
+    if original[0] == 'word' and value and not re.search(r'[\s{}"]|//', value):
+        return value
+    return f'"{value}"'
+
+
+def _same_value(a, b):
+    return a.replace('\\', '/').strip('/').lower() == b.replace('\\', '/').strip('/').lower()
+
+
+def rewrite_text(text, path, changes):
+    # changes is a list of (directive, new_value, old_value or None). The first
+    # argument of every top level matching directive is replaced, optionally only
+    # where it currently equals old_value. Returns (new_text, number of edits).
+    edits = []
+    for command in parse(text, path):
+        for directive, new_value, old_value in changes:
+            if command['name'] != directive.lower() or not command['args']:
+                continue
+            token = command['args'][0]
+            if old_value is not None and not _same_value(token[1], old_value):
+                continue
+            if token[1] == new_value:
+                continue
+            # Non-ASCII values are stored as UTF-8 bytes
+            replacement = _quote(token, new_value).encode('utf-8').decode(ENCODING)
+            edits.append((token[2], token[3], replacement))
+            break
+    if not edits:
+        return text, 0
+    parts = []
+    position = 0
+    for start, end, replacement in sorted(edits):
+        parts.append(text[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts), len(edits)
+
+
+def rewrite_file(path, changes, dry_run=False):
+    # Runs in a worker process; one unreadable file only fails itself
+    result = {'path': path, 'edits': 0, 'error': None}
+    try:
+        text = read_text(path)
+        new_text, result['edits'] = rewrite_text(text, path, changes)
+        if result['edits'] and not dry_run:
+            mode = os.stat(path).st_mode
+            cache.write_bytes(path, new_text.encode(ENCODING))
+            os.chmod(path, mode)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+def find_qc_files(root_dir):
+    qc_files = []
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(QC_EXTENSIONS):
+                qc_files.append(os.path.join(dirpath, filename))
+    return qc_files
+
+
+def rewrite_tree(root_dir, changes, workers=None, progress=None, dry_run=False):
+    # Each .qc and .qci is edited on its own, so a directive set in a shared .qci
+    # is changed once in that file rather than through every QC that includes it
+    paths = find_qc_files(root_dir)
+    if workers == 1 or len(paths) <= 1:
+        results = []
+        for path in paths:
+            results.append(rewrite_file(path, changes, dry_run))
+            if progress:
+                progress(results[-1])
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(rewrite_file, path, changes, dry_run) for path in paths]
+        if progress:
+            try:
+                for future in as_completed(futures):
+                    progress(future.result())
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        return [future.result() for future in futures]
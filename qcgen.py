@@ -0,0 +1,293 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import timing
+
+QC_HEADER = "//Made with QC File Generator by Jacob Robbins\n//https://github.com/Jacobdeanr/qc-generator\n"
+
+# Reduction ratios offered for generated LODs (lod.py reuses these)
+DEFAULT_LOD_RATIOS = (0.5, 0.25, 0.125)
+
+# Same defaults the GUI starts with
+DEFAULT_SETTINGS = {
+    'model_working_folder': "props_dev/dev",
+    'model_name': "",
+    'cdmaterials': "",
+    'body_name': "body",
+    'body_smd': "",
+    'surfaceprop': "",
+    'scale': 1.0,
+    'staticprop': False,
+    'casttextureshadows': False,
+    'mostlyopaque': False,
+    'collisionmodel': "",
+    'mass': 35.0,
+    'concave': False,
+    'lods': [],
+    # Batch only: generate LOD SMDs at these reduction ratios before writing the QC
+    'lod_ratios': [],
+    # Batch only: build the collision model ('hull' or 'decompose') from the body SMD
+    'collision_mode': None,
+    'max_convex_pieces': 20,
+    # Batch only: derive $mass from the collision volume and this density (kg/m^3)
+    'auto_mass': False,
+    'density': None,
+    # Batch only: check the SMDs against studiomdl limits and skip the QC on hard errors
+    'validate': False,
+    # QC template file rendered instead of DEFAULT_QC_TEMPLATE
+    'qc_template': "",
+}
+
+
+def default_settings(**overrides):
+    settings = dict(DEFAULT_SETTINGS)
+    settings['lods'] = []
+    settings.update(overrides)
+    return settings
+
+
+def normalize_working_folder(working_folder):
+    return working_folder.strip().strip("/\\").replace("\\", "/")
+
+
+def infer_cdmaterials(working_folder):
+    working_folder = normalize_working_folder(working_folder)
+    if working_folder:
+        return f"models/{working_folder}"
+    return ""
+
+
+def qc_path_for(smd_path):
+    # QC files are written in the same directory as the SMD file
+    return os.path.splitext(smd_path)[0] + '.qc'
+
+
+def settings_for_smd(smd_path, base_settings):
+    settings = dict(base_settings)
+    settings['lods'] = list(base_settings.get('lods', []))
+    settings['body_smd'] = smd_path
+    if not settings.get('model_name'):
+        smd_name_no_ext = os.path.splitext(os.path.basename(smd_path))[0]
+        settings['model_name'] = f'{smd_name_no_ext}.mdl'
+    return settings
+
+
+# Values a QC template can use; lods is a list of {screen_size, lod_model}
+TEMPLATE_FIELDS = frozenset({
+    'modelname', 'model_name', 'working_folder', 'cdmaterials', 'body_name', 'body', 'smd_name',
+    'surfaceprop', 'scale', 'staticprop', 'casttextureshadows', 'mostlyopaque',
+    'collisionmodel', 'mass', 'concave', 'lods',
+})
+
+# The QC written when no template is set; a user template starts from a copy of this
+DEFAULT_QC_TEMPLATE = QC_HEADER + """\
+$modelname "{{modelname}}"
+$body "{{body_name}}" "{{body}}"
+$surfaceprop "{{surfaceprop}}"
+$cdmaterials "{{cdmaterials}}"
+{% if scale %}
+$scale {{scale}}
+{% endif %}
+$sequence "idle" "{{body}}"
+{% if staticprop %}
+$staticprop
+{% endif %}
+{% if casttextureshadows %}
+$casttextureshadows
+{% endif %}
+{% if mostlyopaque %}
+$mostlyopaque
+{% else %}
+$opaque
+{% endif %}
+{% if collisionmodel %}
+$collisionmodel "{{collisionmodel}}"
+{
+{% if mass %}
+\t$mass {{mass}}
+{% endif %}
+{% if concave %}
+\t$concave
+{% endif %}
+}
+{% endif %}
+{% for lod in lods %}
+$lod {{lod.screen_size}}
+{
+\treplacemodel "{{body}}" "{{lod.lod_model}}"
+}
+{% endfor %}
+"""
+
+_default_template = None
+
+
+def qc_template(settings):
+    # Compiled once per process; user templates are recompiled when the file changes
+    global _default_template
+    import templates
+    if settings.get('qc_template'):
+        return templates.load_template(settings['qc_template'], TEMPLATE_FIELDS)
+    if _default_template is None:
+        _default_template = templates.Template(DEFAULT_QC_TEMPLATE, 'default template', TEMPLATE_FIELDS)
+    return _default_template
+
+
+def qc_values(settings):
+    if not settings.get('body_smd'):
+        raise ValueError("Please open an SMD file first.")
+
+    if not settings.get('model_working_folder') or not settings.get('model_name'):
+        raise ValueError("Model Working Folder or Model Name not specified.")
+
+    # Normalize working folder path
+    working_folder = normalize_working_folder(settings['model_working_folder'])
+    model_name = settings['model_name'].strip()
+
+    if not model_name.endswith(".mdl"):
+        model_name += ".mdl"
+
+    base_model = os.path.basename(settings['body_smd'])
+    surfaceprop = settings.get('surfaceprop')
+
+    return {
+        'modelname': f"{working_folder}/{model_name}",
+        'model_name': model_name,
+        'working_folder': working_folder,
+        'cdmaterials': infer_cdmaterials(working_folder),
+        'body_name': settings.get("body_name", "body"),
+        'body': base_model,
+        'smd_name': os.path.splitext(base_model)[0],
+        'surfaceprop': surfaceprop.split(" - ")[-1] if surfaceprop else "Default",
+        'scale': settings.get('scale'),
+        'staticprop': settings.get('staticprop'),
+        'casttextureshadows': settings.get('casttextureshadows'),
+        'mostlyopaque': settings.get('mostlyopaque'),
+        'collisionmodel': settings.get('collisionmodel'),
+        'mass': settings.get('mass'),
+        'concave': settings.get('concave'),
+        'lods': [lod_entry for lod_entry in settings.get('lods', [])
+                 if lod_entry.get('screen_size') and lod_entry.get('lod_model')],
+    }
+
+
+def build_qc_content(settings):
+    return qc_template(settings).render(qc_values(settings))
+
+
+@timing.traced('qcgen.write_qc_file')
+def write_qc_file(settings):
+    qc_content = build_qc_content(settings)
+    qc_file_path = qc_path_for(settings['body_smd'])
+
+    # Leave an identical file (and its mtime) alone so studiomdl does not recompile it
+    try:
+        with open(qc_file_path, 'r') as qc_file:
+            if qc_file.read() == qc_content:
+                return qc_file_path
+    except (OSError, UnicodeDecodeError):
+        pass
+
+    with open(qc_file_path, 'w') as qc_file:
+        qc_file.write(qc_content)
+    return qc_file_path
+
+
+def find_smd_files(root_dir):
+    smd_files = []
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith('.smd'):
+                smd_files.append(os.path.join(dirpath, filename))
+    return smd_files
+
+
+@timing.traced('qcgen.generate_one', 'smd_path')
+def _generate_one(smd_path, base_settings, previous=None):
+    # Runs in a worker process; never lets an exception escape so one bad SMD
+    # cannot take down the whole batch.
+    result = {'smd': smd_path, 'qc': None, 'error': None, 'skipped': False, 'digest': None, 'files': {}, 'validation': []}
+    try:
+        settings = settings_for_smd(smd_path, base_settings)
+        if previous is not None:
+            import manifest
+            result['digest'], result['files'] = manifest.input_digest(settings, previous['files'])
+            qc_file_path = qc_path_for(smd_path)
+            if (result['digest'] == previous['digest'] and os.path.isfile(qc_file_path)
+                    and all(os.path.isfile(path) for path in manifest.generated_files(settings))):
+                result['qc'] = qc_file_path
+                result['skipped'] = True
+                return result
+
+        mesh = None
+        if settings.get('lod_ratios') or settings.get('collision_mode') or settings.get('validate'):
+            import smd
+            # Parsed once and shared by every stage that needs the body mesh
+            mesh = smd.read_smd(smd_path)
+        if settings.get('lod_ratios'):
+            import lod
+            # Already one process per model, so levels are simplified serially here
+            settings['lods'] = lod.generate_lods(smd_path, settings['lod_ratios'], workers=1, mesh=mesh)
+        if settings.get('collision_mode'):
+            import collision
+            generated = collision.generate_collision(smd_path, settings['collision_mode'], settings['max_convex_pieces'], mesh=mesh)
+            settings['collisionmodel'] = generated['collisionmodel']
+            settings['concave'] = generated['concave']
+        if settings.get('auto_mass') and settings.get('collisionmodel') and settings.get('density'):
+            import collision
+            collision_smd = os.path.join(os.path.dirname(smd_path), settings['collisionmodel'])
+            settings['mass'] = collision.estimate_mass_from_smd(collision_smd, settings['density'], settings['scale'] or 1.0)
+        if settings.get('validate'):
+            import validate
+            result['validation'] = validate.validate_settings(settings, {smd_path: mesh})
+            if validate.has_errors(result['validation']):
+                result['error'] = "failed validation, QC not written"
+                return result
+        result['qc'] = write_qc_file(settings)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+def batch_generate(smd_files, base_settings, workers=None, progress=None, manifest=None):
+    # Every model is named after its own SMD
+    base_settings = dict(base_settings, model_name="")
+    return generate_many([(smd_path, base_settings) for smd_path in smd_files], workers, progress, manifest)
+
+
+def generate_many(jobs, workers=None, progress=None, manifest=None):
+    # jobs is a list of (smd_path, settings); settings may differ per job.
+    # With a manifest, models whose inputs hash the same as last time are skipped.
+    jobs = [(smd_path, settings, manifest.previous(qc_path_for(smd_path), settings_for_smd(smd_path, settings)) if manifest is not None else None)
+            for smd_path, settings in jobs]
+
+    results = []
+    if workers == 1 or len(jobs) <= 1:
+        for smd_path, settings, previous in jobs:
+            result = _generate_one(smd_path, settings, previous)
+            results.append(result)
+            if progress:
+                progress(result)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_generate_one, smd_path, settings, previous) for smd_path, settings, previous in jobs]
+            if progress:
+                try:
+                    for future in as_completed(futures):
+                        progress(future.result())
+                except BaseException:
+                    # progress may raise to stop the run; drop the jobs not started yet
+                    for future in futures:
+                        future.cancel()
+                    raise
+            # Report in job order regardless of completion order
+            results = [future.result() for future in futures]
+
+    if manifest is not None:
+        for result in results:
+            if result['error']:
+                manifest.forget(qc_path_for(result['smd']))
+            elif result['digest']:
+                manifest.record(result['qc'], result['digest'], result['files'])
+        manifest.save()
+    return results
@@ -0,0 +1,122 @@
+import re
+
+WORD = re.compile(r'[a-z0-9]+')
+
+# Typos are matched against words sharing at least this fraction of n-grams.
+# Bigrams survive a swapped or dropped letter in short words better than trigrams.
+NGRAM = 2
+FUZZY_THRESHOLD = 0.3
+# Shorter terms are too ambiguous to correct
+FUZZY_MIN_LENGTH = 3
+FUZZY_WORDS = 8
+
+
+def words(text):
+    return WORD.findall(text.lower())
+
+
+def _ngrams(word):
+    padded = f' {word} '
+    return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+
+class _Trie:
+    # Each node is [children, ids]; ids lists every entry with a word under that
+    # prefix, in entry order, so a prefix lookup is one walk down the tree.
+    def __init__(self):
+        self.root = [{}, []]
+
+    def add(self, word, idx):
+        node = self.root
+        for char in word:
+            child = node[0].get(char)
+            if child is None:
+                child = node[0][char] = [{}, []]
+            node = child
+            if not node[1] or node[1][-1] != idx:
+                node[1].append(idx)
+
+    def find(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node[0].get(char)
+            if node is None:
+                return ()
+        return node[1]
+
+
+class SearchIndex:
+    # Built once per catalog. Names (category and subtype) and descriptions have
+    # their own tries so name matches can be listed first; an n-gram index over
+    # the distinct words catches typos that match no prefix.
+    def __init__(self, entries):
+        # entries: [(name, description)] in catalog order
+        self.size = len(entries)
+        self.names = _Trie()
+        self.descriptions = _Trie()
+        vocabulary = {}
+        for idx, (name, description) in enumerate(entries):
+            for word in words(name):
+                self.names.add(word, idx)
+                vocabulary.setdefault(word, []).append(idx)
+            for word in words(description):
+                self.descriptions.add(word, idx)
+                vocabulary.setdefault(word, []).append(idx)
+
+        self.vocabulary = list(vocabulary)
+        self.word_ids = [vocabulary[word] for word in self.vocabulary]
+        self.ngram_counts = []
+        self.ngrams = {}
+        for word_id, word in enumerate(self.vocabulary):
+            ngrams = _ngrams(word)
+            self.ngram_counts.append(len(ngrams))
+            for ngram in ngrams:
+                self.ngrams.setdefault(ngram, []).append(word_id)
+        self._fuzzy_cache = {}
+
+    def fuzzy(self, term):
+        # Entry ids of the words closest to a term by shared n-grams (Jaccard)
+        cached = self._fuzzy_cache.get(term)
+        if cached is not None:
+            return cached
+        term_ngrams = _ngrams(term)
+        shared = {}
+        for ngram in term_ngrams:
+            for word_id in self.ngrams.get(ngram, ()):
+                shared[word_id] = shared.get(word_id, 0) + 1
+        scored = []
+        for word_id, count in shared.items():
+            score = count / (len(term_ngrams) + self.ngram_counts[word_id] - count)
+            if score >= FUZZY_THRESHOLD:
+                scored.append((score, word_id))
+        scored.sort(reverse=True)
+        ids = set()
+        for _, word_id in scored[:FUZZY_WORDS]:
+            ids.update(self.word_ids[word_id])
+        self._fuzzy_cache[term] = ids
+        return ids
+
+    def search(self, query, allowed=None):
+        # Entry ids matching every word of the query, by prefix or else fuzzily.
+        # Entries whose name matches come first; each group keeps catalog order.
+        terms = words(query)
+        if not terms:
+            return sorted(allowed) if allowed is not None else list(range(self.size))
+
+        matches = None
+        name_matches = None
+        for term in terms:
+            in_names = self.names.find(term)
+            term_matches = set(in_names)
+            term_matches.update(self.descriptions.find(term))
+            if not term_matches and len(term) >= FUZZY_MIN_LENGTH:
+                term_matches = self.fuzzy(term)
+            matches = term_matches if matches is None else matches & term_matches
+            name_matches = set(in_names) if name_matches is None else name_matches & set(in_names)
+            if not matches:
+                return []
+
+        if allowed is not None:
+            matches = matches & allowed
+        first = matches & name_matches
+        return sorted(first) + sorted(matches - first)
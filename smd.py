@@ -0,0 +1,409 @@
+import os
+import warnings
+import numpy as np
+import timing
+
+# Bytes read per chunk; triangles are parsed a chunk at a time
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# Columns before the optional weight links: parent, pos xyz, normal xyz, uv
+BASE_COLUMNS = 9
+
+
+class SMDParseError(ValueError):
+    pass
+
+
+class SMDMesh:
+    def __init__(self, path=""):
+        self.path = path
+        self.nodes = []              # (index, name, parent)
+        self.frame_times = []
+        self.skeleton = np.zeros((0, 0, 6), dtype=np.float32)  # frames x bones x (pos xyz, rot xyz)
+        self.materials = []
+        self.positions = np.zeros((0, 3), dtype=np.float32)
+        self.normals = np.zeros((0, 3), dtype=np.float32)
+        self.uvs = np.zeros((0, 2), dtype=np.float32)
+        self.parents = np.zeros(0, dtype=np.int16)
+        self.bone_ids = np.zeros((0, 1), dtype=np.int16)       # -1 pads unused links
+        self.bone_weights = np.zeros((0, 1), dtype=np.float32)
+        self.material_ids = np.zeros(0, dtype=np.int32)        # one per triangle
+
+    @property
+    def triangle_count(self):
+        return len(self.material_ids)
+
+    @property
+    def vertex_count(self):
+        return len(self.positions)
+
+    @property
+    def faces(self):
+        # SMD vertices are never shared, so triangle i is vertices 3i..3i+2
+        return np.arange(self.vertex_count, dtype=np.int64).reshape(-1, 3)
+
+    @property
+    def triangles(self):
+        return self.positions.reshape(-1, 3, 3)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.positions, self.normals, self.uvs, self.parents,
+                                              self.bone_ids, self.bone_weights, self.material_ids))
+
+
+class _GrowableArray:
+    # Amortized append into one preallocated buffer, so the finished array is
+    # not a concatenation of per-chunk copies.
+    def __init__(self, dtype, width=None, capacity=1024, fill=0):
+        self.width = width
+        self.fill = fill
+        self.data = np.full(self._shape(capacity), fill, dtype=dtype)
+        self.size = 0
+
+    def _shape(self, rows):
+        return (rows,) if self.width is None else (rows, self.width)
+
+    def reserve(self, rows):
+        if rows > len(self.data):
+            self.data.resize(self._shape(rows), refcheck=False)
+
+    def widen(self, width):
+        grown = np.full((len(self.data), width), self.fill, dtype=self.data.dtype)
+        grown[:, :self.width] = self.data
+        self.data = grown
+        self.width = width
+
+    def extend(self, values):
+        needed = self.size + len(values)
+        if needed > len(self.data):
+            self.reserve(max(needed, len(self.data) * 3 // 2))
+        if self.width is None:
+            self.data[self.size:needed] = values
+        else:
+            self.data[self.size:needed, :values.shape[1]] = values
+            self.data[self.size:needed, values.shape[1]:] = self.fill
+        self.size = needed
+
+    def finish(self):
+        self.data.resize(self._shape(self.size), refcheck=False)
+        return self.data
+
+
+def _parse_uniform_rows(lines, ncols):
+    if ncols < BASE_COLUMNS:
+        return None
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        try:
+            flat = np.fromstring(b' '.join(lines), dtype=np.float64, sep=' ')
+        except ValueError:
+            return None
+    if flat.size != len(lines) * ncols:
+        return None
+    rows = flat.reshape(-1, ncols)
+    if ncols > BASE_COLUMNS:
+        # A misaligned reshape would not agree with the declared link counts
+        if (ncols - BASE_COLUMNS - 1) % 2 or not np.all(rows[:, BASE_COLUMNS] == (ncols - BASE_COLUMNS - 1) // 2):
+            return None
+    return rows
+
+
+def _rows_to_links(rows):
+    # No links, whether the count column is missing or 0, binds the vertex fully
+    # to its parent bone, as studiomdl does
+    ncols = rows.shape[1]
+    if ncols <= BASE_COLUMNS + 1:
+        return rows[:, 0:1].astype(np.int16), np.ones((len(rows), 1), dtype=np.float32)
+    return rows[:, BASE_COLUMNS + 1::2].astype(np.int16), rows[:, BASE_COLUMNS + 2::2].astype(np.float32)
+
+
+def parse_vertex_lines(lines):
+    # Returns parent, position, normal, uv, bone ids and weights for each line
+    if not lines:
+        empty = np.zeros((0, BASE_COLUMNS))
+        return empty, np.zeros((0, 1), dtype=np.int16), np.zeros((0, 1), dtype=np.float32)
+
+    ncols = len(lines[0].split())
+    rows = _parse_uniform_rows(lines, ncols)
+    if rows is not None:
+        bone_ids, bone_weights = _rows_to_links(rows)
+        return rows[:, :BASE_COLUMNS], bone_ids, bone_weights
+
+    # Mixed link counts: parse each column count as its own uniform group
+    counts = np.fromiter((len(line.split()) for line in lines), dtype=np.int32, count=len(lines))
+    if counts.min() < BASE_COLUMNS:
+        bad = int(np.argmax(counts < BASE_COLUMNS))
+        raise SMDParseError(f"Malformed vertex line: {lines[bad][:80]!r}")
+
+    base = np.empty((len(lines), BASE_COLUMNS))
+    width = max(1, (int(counts.max()) - BASE_COLUMNS - 1) // 2)
+    bone_ids = np.full((len(lines), width), -1, dtype=np.int16)
+    bone_weights = np.zeros((len(lines), width), dtype=np.float32)
+    for ncols in np.unique(counts):
+        idx = np.flatnonzero(counts == ncols)
+        group = [lines[i] for i in idx]
+        rows = _parse_uniform_rows(group, int(ncols))
+        if rows is None:
+            raise SMDParseError(f"Malformed vertex line near: {group[0][:80]!r}")
+        base[idx] = rows[:, :BASE_COLUMNS]
+        group_ids, group_weights = _rows_to_links(rows)
+        bone_ids[idx, :group_ids.shape[1]] = group_ids
+        bone_weights[idx, :group_weights.shape[1]] = group_weights
+    return base, bone_ids, bone_weights
+
+
+class _MeshBuilder:
+    def __init__(self, mesh, file_size):
+        self.mesh = mesh
+        self.file_size = file_size
+        self.material_lookup = {}
+        self.positions = _GrowableArray(np.float32, 3)
+        self.normals = _GrowableArray(np.float32, 3)
+        self.uvs = _GrowableArray(np.float32, 2)
+        self.parents = _GrowableArray(np.int16)
+        self.bone_ids = _GrowableArray(np.int16, 1, fill=-1)
+        self.bone_weights = _GrowableArray(np.float32, 1)
+        self.material_ids = _GrowableArray(np.int32)
+        self.reserved = False
+
+    def add_triangles(self, lines, byte_count):
+        triangle_count = len(lines) // 4
+        if not triangle_count:
+            return
+
+        names, inverse = np.unique(np.array(lines[0::4]), return_inverse=True)
+        global_ids = np.empty(len(names), dtype=np.int32)
+        for idx, name in enumerate(names):
+            material = name.strip().decode('utf-8', errors='replace')
+            if material not in self.material_lookup:
+                self.material_lookup[material] = len(self.mesh.materials)
+                self.mesh.materials.append(material)
+            global_ids[idx] = self.material_lookup[material]
+
+        vertex_lines = [None] * (triangle_count * 3)
+        vertex_lines[0::3] = lines[1::4]
+        vertex_lines[1::3] = lines[2::4]
+        vertex_lines[2::3] = lines[3::4]
+        base, bone_ids, bone_weights = parse_vertex_lines(vertex_lines)
+
+        if not self.reserved:
+            # Size the buffers from the density of the first chunk
+            estimate = int(len(vertex_lines) * self.file_size / max(byte_count, 1) * 1.05)
+            for column in (self.positions, self.normals, self.uvs, self.parents, self.bone_ids, self.bone_weights):
+                column.reserve(estimate)
+            self.material_ids.reserve(estimate // 3 + 1)
+            self.reserved = True
+
+        if bone_ids.shape[1] > self.bone_ids.width:
+            self.bone_ids.widen(bone_ids.shape[1])
+            self.bone_weights.widen(bone_ids.shape[1])
+
+        self.parents.extend(base[:, 0].astype(np.int16))
+        self.positions.extend(base[:, 1:4])
+        self.normals.extend(base[:, 4:7])
+        self.uvs.extend(base[:, 7:9])
+        self.bone_ids.extend(bone_ids)
+        self.bone_weights.extend(bone_weights)
+        self.material_ids.extend(global_ids[inverse.reshape(-1)])
+
+    def finish(self):
+        mesh = self.mesh
+        mesh.positions = self.positions.finish()
+        mesh.normals = self.normals.finish()
+        mesh.uvs = self.uvs.finish()
+        mesh.parents = self.parents.finish()
+        mesh.bone_ids = self.bone_ids.finish()
+        mesh.bone_weights = self.bone_weights.finish()
+        mesh.material_ids = self.material_ids.finish()
+        return mesh
+
+
+def _parse_node(line):
+    # 0 "root" -1
+    parts = line.split(b'"')
+    if len(parts) < 3:
+        raise SMDParseError(f"Malformed node line: {line[:80]!r}")
+    return int(parts[0]), parts[1].decode('utf-8', errors='replace'), int(parts[2])
+
+
+def _iter_lines(f, chunk_size):
+    # Yields (lines, byte_count) for each chunk, always split on whole lines
+    tail = b''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            if tail.strip():
+                yield tail.replace(b'\r', b'').split(b'\n'), len(tail)
+            return
+        data = tail + chunk
+        cut = data.rfind(b'\n')
+        if cut < 0:
+            tail = data
+            continue
+        tail = data[cut + 1:]
+        yield data[:cut].replace(b'\r', b'').split(b'\n'), cut + 1
+
+
+class _MaterialCollector:
+    # Stands in for _MeshBuilder when only the material names are wanted
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self.seen = set()
+
+    def add_triangles(self, lines, byte_count):
+        for name in dict.fromkeys(lines[0::4]):
+            material = name.strip().decode('utf-8', errors='replace')
+            if material not in self.seen:
+                self.seen.add(material)
+                self.mesh.materials.append(material)
+
+    def finish(self):
+        return self.mesh
+
+
+def read_smd(path, chunk_size=CHUNK_SIZE, triangles=True):
+    with timing.span('smd.read_smd', path=path) as span:
+        mesh = SMDMesh(path)
+        builder = _MeshBuilder(mesh, os.path.getsize(path)) if triangles else None
+        mesh = _read(path, mesh, builder, chunk_size)
+        span.set(triangles=mesh.triangle_count)
+        return mesh
+
+
+def read_materials(path, chunk_size=CHUNK_SIZE):
+    # Material names in first-use order, without parsing any vertex data
+    mesh = SMDMesh(path)
+    return _read(path, mesh, _MaterialCollector(mesh), chunk_size).materials
+
+
+def _read(path, mesh, builder, chunk_size):
+    frames = []
+    section = None
+    pending = []
+
+    with open(path, 'rb') as f:
+        for lines, byte_count in _iter_lines(f, chunk_size):
+            if pending:
+                lines = pending + lines
+                pending = []
+            # Indentation, trailing spaces, blank lines and // comments may appear in any
+            # block, triangles included, so rows are grouped only after they are dropped
+            lines = [line for line in map(bytes.strip, lines) if line and not line.startswith(b'//')]
+
+            i = 0
+            while i < len(lines):
+                if section == b'triangles':
+                    try:
+                        end = lines.index(b'end', i)
+                    except ValueError:
+                        end = None
+                    stop = len(lines) if end is None else end
+                    whole = i + (stop - i) // 4 * 4
+                    if end is not None and whole != stop:
+                        raise SMDParseError("triangles block ends in the middle of a triangle")
+                    if builder is not None:
+                        builder.add_triangles(lines[i:whole], byte_count)
+                    if end is None:
+                        # Carry a partial triangle over to the next chunk
+                        pending = lines[whole:]
+                        break
+                    section = None
+                    i = end + 1
+                    continue
+
+                line = lines[i]
+                i += 1
+                if section is None:
+                    if line in (b'nodes', b'skeleton', b'triangles', b'vertexanimation'):
+                        section = line
+                    elif not line.startswith(b'version'):
+                        raise SMDParseError(f"Unexpected line outside of a block: {line[:80]!r}")
+                elif line == b'end':
+                    section = None
+                elif section == b'nodes':
+                    mesh.nodes.append(_parse_node(line))
+                elif section == b'skeleton':
+                    if line.startswith(b'time'):
+                        mesh.frame_times.append(int(line.split()[1]))
+                        frames.append([])
+                    elif frames:
+                        frames[-1].append(line)
+
+    if section == b'triangles' and pending:
+        raise SMDParseError("triangles block ends in the middle of a triangle")
+
+    if frames:
+        bone_count = max([len(mesh.nodes)] + [len(frame) for frame in frames])
+        mesh.skeleton = np.zeros((len(frames), bone_count, 6), dtype=np.float32)
+        for frame_idx, frame in enumerate(frames):
+            for line in frame:
+                values = line.split()
+                try:
+                    bone = int(values[0])
+                    transform = [float(value) for value in values[1:7]]
+                except ValueError:
+                    raise SMDParseError(f"Malformed skeleton line: {line[:80]!r}") from None
+                if not 0 <= bone < bone_count or len(transform) != 6:
+                    raise SMDParseError(f"Malformed skeleton line: {line[:80]!r}")
+                mesh.skeleton[frame_idx, bone] = transform
+
+    return builder.finish() if builder is not None else mesh
+
+
+# Triangles formatted per batch when writing, bounding the size of the text buffer
+WRITE_BATCH = 100000
+
+
+def _format_vertex_lines(mesh, vertex_idx):
+    # One formatted line per vertex, grouped by how many weight links it carries
+    bone_ids = mesh.bone_ids[vertex_idx]
+    bone_weights = mesh.bone_weights[vertex_idx]
+    link_counts = (bone_ids >= 0).sum(axis=1)
+    base = np.column_stack([mesh.parents[vertex_idx], mesh.positions[vertex_idx],
+                            mesh.normals[vertex_idx], mesh.uvs[vertex_idx]])
+    lines = [None] * len(vertex_idx)
+    base_fmt = '%d %.6f %.6f %.6f %.6f %.6f %.6f %.6f %.6f'
+    for link_count in np.unique(link_counts):
+        rows = np.flatnonzero(link_counts == link_count)
+        if link_count == 0:
+            fmt = base_fmt
+            values = base[rows]
+        else:
+            fmt = base_fmt + ' %d' + ' %d %.6f' * link_count
+            # Valid links are packed first, so the leading columns are the ones to write
+            links = np.empty((len(rows), link_count * 2))
+            links[:, 0::2] = bone_ids[rows, :link_count]
+            links[:, 1::2] = bone_weights[rows, :link_count]
+            values = np.column_stack([base[rows], np.full(len(rows), link_count), links])
+        for row, formatted in zip(rows.tolist(), map(fmt.__mod__, map(tuple, values.tolist()))):
+            lines[row] = formatted
+    return lines
+
+
+@timing.traced('smd.write_smd', 'path')
+def write_smd(path, mesh):
+    with open(path, 'w', newline='\n') as f:
+        f.write('version 1\nnodes\n')
+        for index, name, parent in mesh.nodes:
+            f.write(f'{index} "{name}" {parent}\n')
+        f.write('end\nskeleton\n')
+        frame_times = mesh.frame_times or [0]
+        for frame_idx, frame_time in enumerate(frame_times):
+            f.write(f'time {frame_time}\n')
+            if frame_idx < len(mesh.skeleton):
+                for bone, values in enumerate(mesh.skeleton[frame_idx].tolist()):
+                    f.write(f'{bone} ' + ' '.join(f'{value:.6f}' for value in values) + '\n')
+        f.write('end\ntriangles\n')
+
+        for start in range(0, mesh.triangle_count, WRITE_BATCH):
+            stop = min(start + WRITE_BATCH, mesh.triangle_count)
+            vertex_lines = _format_vertex_lines(mesh, np.arange(start * 3, stop * 3))
+            out = [None] * ((stop - start) * 4)
+            out[0::4] = [mesh.materials[material_id] for material_id in mesh.material_ids[start:stop].tolist()]
+            out[1::4] = vertex_lines[0::3]
+            out[2::4] = vertex_lines[1::3]
+            out[3::4] = vertex_lines[2::3]
+            f.write('\n'.join(out))
+            f.write('\n')
+        f.write('end\n')
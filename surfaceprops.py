@@ -0,0 +1,415 @@
+import os
+import cache
+import timing
+
+# Bump when the layout of the cached catalog changes
+CATALOG_FORMAT = 2
+
+
+# Entries tagged with this are offered whatever games are selected
+ALL_GAMES = 'ALL'
+
+# Bump when the parsing or cached layout of surfaceproperties*.txt files changes
+GAME_SCRIPTS_FORMAT = 2
+
+SURFACEPROPERTIES_MANIFEST = 'surfaceproperties_manifest.txt'
+
+# Category for a game's own surfaceprops, from their gamematerial when the
+# base chain does not lead to a catalog entry
+GAMEMATERIAL_CATEGORIES = {
+    'C': 'Concrete_Rock',
+    'M': 'Metal',
+    'V': 'Metal',
+    'G': 'Metal',
+    'W': 'Wood',
+    'D': 'Terrain',
+    'N': 'Terrain',
+    'O': 'Organic',
+    'F': 'Organic',
+    'B': 'Organic',
+    'A': 'Organic',
+    'H': 'Organic',
+    'E': 'Organic',
+    'S': 'Liquid',
+    'Y': 'Manufactured',
+    'L': 'Manufactured',
+    'P': 'Manufactured',
+    'T': 'Manufactured',
+    'X': 'Special',
+    'I': 'Special',
+}
+CUSTOM_CATEGORY = 'Custom'
+
+
+class SurfacePropCatalog:
+    def __init__(self, surfaceprops, game_list, version=""):
+        self.surfaceprops = surfaceprops
+        self.game_list = game_list
+        self.version = version
+        # Problems reading game folders' surfaceproperties files, if any were merged
+        self.errors = []
+        self.build_game_index()
+
+    def __len__(self):
+        return len(self.surfaceprops)
+
+    def find(self, name):
+        # Accepts either the full "Category - Subtype" key or just the subtype
+        if name in self.surfaceprops:
+            return name
+        subtype = name.split(" - ")[-1].strip().lower()
+        for key in self.keys:
+            if key.split(" - ")[-1].lower() == subtype:
+                return key
+        return None
+
+    def density(self, name):
+        key = self.find(name) if name else None
+        return self.surfaceprops[key].get('density') if key else None
+
+    def build_game_index(self):
+        # One bitset per game over the catalog order, so filtering is a union of ints
+        self.keys = list(self.surfaceprops)
+        self.game_masks = {}
+        for idx, key in enumerate(self.keys):
+            bit = 1 << idx
+            for game in self.surfaceprops[key].get('supported_games', []):
+                self.game_masks[game] = self.game_masks.get(game, 0) | bit
+        self._filter_cache = {}
+        self._search_index = None
+
+    def filter_ids_by_games(self, selected_games):
+        # Catalog indexes of the entries offered for the selected games
+        selection = frozenset(selected_games)
+        if not selection:
+            return []
+
+        filtered = self._filter_cache.get(selection)
+        if filtered is None:
+            mask = self.game_masks.get(ALL_GAMES, 0)
+            for game in selection:
+                mask |= self.game_masks.get(game, 0)
+
+            # Walk the set bits lowest first, which keeps catalog order
+            filtered = [idx for idx, bit in enumerate(reversed(bin(mask)[2:])) if bit == '1']
+            self._filter_cache[selection] = filtered
+        return filtered
+
+    def filter_by_games(self, selected_games):
+        return [self.keys[idx] for idx in self.filter_ids_by_games(selected_games)]
+
+    def search_index(self):
+        # Built on first use; load_catalog callers on a worker thread can build it there
+        if self._search_index is None:
+            import search
+            with timing.span('surfaceprops.search_index', entries=len(self.keys)):
+                self._search_index = search.SearchIndex([(key.replace(' - ', ' '), self.surfaceprops[key].get('description') or '')
+                                                         for key in self.keys])
+        return self._search_index
+
+    def search(self, query, selected_games=None):
+        # Keys matching the query as you type, limited to the selected games when given
+        allowed = None if selected_games is None else set(self.filter_ids_by_games(selected_games))
+        return [self.keys[idx] for idx in self.search_index().search(query, allowed)]
+
+
+def parse_surfaceprop_yaml(data):
+    surfaceprops = {}
+    for type_category, subtypes in (data or {}).get('types', {}).items():
+        for subtype, details in subtypes.items():
+            key = f"{type_category} - {subtype}"
+            supported_games = details.get('supported_games', '').split(', ')
+            surfaceprops[key] = {
+                'description': details.get('description', ''),
+                'supported_games': supported_games,
+                'density': details.get('density'),
+            }
+    return surfaceprops
+
+
+def build_game_list(surfaceprops):
+    games = set()
+    for details in surfaceprops.values():
+        games.update(details.get('supported_games', []))
+    return sorted(games)
+
+
+def _pack(surfaceprops, game_list):
+    # Store columns instead of a dict per entry; games become indexes into game_list
+    game_ids = {game: idx for idx, game in enumerate(game_list)}
+    keys = list(surfaceprops)
+    descriptions = [surfaceprops[key]['description'] for key in keys]
+    games = [tuple(game_ids[game] for game in surfaceprops[key]['supported_games']) for key in keys]
+    densities = [surfaceprops[key].get('density') for key in keys]
+    return keys, descriptions, games, densities
+
+
+def _unpack(keys, descriptions, games, densities, game_list):
+    return {
+        key: {'description': description, 'supported_games': [game_list[idx] for idx in game_idxs], 'density': density}
+        for key, description, game_idxs, density in zip(keys, descriptions, games, densities)
+    }
+
+
+def _load_yaml(raw):
+    # Imported here: with a warm cache the YAML is never parsed, so startup skips yaml entirely
+    import yaml
+    # libyaml is several times faster than the pure-Python loader when available
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    return yaml.load(raw, Loader=loader)
+
+
+def _cache_file(yaml_path):
+    return os.path.join(cache.cache_dir('catalog'), cache.path_key(yaml_path) + '.pickle')
+
+
+def _load_yaml_catalog(yaml_path, use_cache=True):
+    if not os.path.isfile(yaml_path):
+        raise FileNotFoundError(f"surfaceprop.yaml file not found at {yaml_path}")
+
+    stat = os.stat(yaml_path)
+    cache_file = _cache_file(yaml_path) if use_cache else None
+    cached = cache.read_pickle(cache_file) if cache_file else None
+    if cached and cached.get('format') != CATALOG_FORMAT:
+        cached = None
+
+    # Fast path: the file has not been touched since it was compiled
+    if cached and cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+        return SurfacePropCatalog(_unpack(*cached['columns'], cached['game_list']), cached['game_list'], cached['sha256'])
+
+    with open(yaml_path, 'rb') as file:
+        raw = file.read()
+    sha256 = cache.bytes_sha256(raw)
+
+    if cached and cached['sha256'] == sha256:
+        # Touched but unchanged (e.g. re-extracted by PyInstaller); refresh the stamp only
+        surfaceprops = _unpack(*cached['columns'], cached['game_list'])
+        game_list = cached['game_list']
+    else:
+        surfaceprops = parse_surfaceprop_yaml(_load_yaml(raw))
+        game_list = build_game_list(surfaceprops)
+
+    if cache_file:
+        try:
+            cache.write_pickle(cache_file, {
+                'format': CATALOG_FORMAT,
+                'path': os.path.abspath(yaml_path),
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'sha256': sha256,
+                'game_list': game_list,
+                'columns': _pack(surfaceprops, game_list),
+            })
+        except OSError:
+            pass
+
+    return SurfacePropCatalog(surfaceprops, game_list, sha256)
+
+
+@timing.traced('surfaceprops.load_catalog', 'yaml_path', 'use_cache', 'game_dirs')
+def load_catalog(yaml_path, use_cache=True, game_dirs=()):
+    # surfaceprop.yaml plus the surfaceproperties*.txt shipped by each game folder
+    catalog = _load_yaml_catalog(yaml_path, use_cache)
+    if game_dirs:
+        catalog = merge_game_surfaceprops(catalog, game_dirs, use_cache)
+    return catalog
+
+
+def game_name(game_dir):
+    # Game folders are tagged with their folder name, e.g. hl2 or a mod's folder
+    return os.path.basename(os.path.normpath(game_dir))
+
+
+def surfaceproperties_files(game_dir):
+    # The files listed in surfaceproperties_manifest.txt in its order, or every
+    # scripts/surfaceproperties*.txt when the game has no manifest
+    scripts_dir = os.path.join(game_dir, 'scripts')
+    try:
+        names = sorted(entry.name for entry in os.scandir(scripts_dir)
+                       if entry.is_file() and entry.name.lower().startswith('surfaceproperties') and entry.name.lower().endswith('.txt'))
+    except OSError:
+        return []
+
+    manifest = next((name for name in names if name.lower() == SURFACEPROPERTIES_MANIFEST), None)
+    if manifest is None:
+        return [os.path.join(scripts_dir, name) for name in names]
+
+    import keyvalues
+    files = []
+    for _, block in keyvalues.parse_file(os.path.join(scripts_dir, manifest)):
+        if isinstance(block, list):
+            for key, value in block:
+                if key.lower() == 'file' and isinstance(value, str):
+                    path = os.path.normpath(os.path.join(game_dir, value.replace('\\', '/')))
+                    if os.path.isfile(path):
+                        files.append(path)
+    return files
+
+
+def parse_surfaceproperties(path):
+    # [(name, base, density, gamematerial)] in file order
+    import keyvalues
+    entries = []
+    for name, block in keyvalues.parse_file(path):
+        if not isinstance(block, list):
+            continue
+        values = {key.lower(): value for key, value in block if isinstance(value, str)}
+        try:
+            density = float(values['density']) if 'density' in values else None
+        except ValueError:
+            density = None
+        entries.append((name, values.get('base'), density, values.get('gamematerial')))
+    return entries
+
+
+def _game_scripts_cache_file():
+    return os.path.join(cache.cache_dir('catalog'), 'surfaceproperties.pickle')
+
+
+def load_game_surfaceprops(game_dirs, use_cache=True):
+    # Returns ([(game, path, sha256, entries)], errors). Files are re-parsed only
+    # when their mtime or size differs from the cached copy.
+    cache_file = _game_scripts_cache_file() if use_cache else None
+    cached = cache.read_pickle(cache_file) if cache_file else None
+    if not cached or cached.get('format') != GAME_SCRIPTS_FORMAT:
+        cached = {'format': GAME_SCRIPTS_FORMAT, 'files': {}}
+    changed = False
+
+    loaded = []
+    errors = []
+    for game_dir in game_dirs:
+        game = game_name(game_dir)
+        try:
+            paths = surfaceproperties_files(game_dir)
+        except (OSError, ValueError) as e:
+            errors.append(f"{game}: {e}")
+            continue
+        if not paths:
+            errors.append(f"{game}: no scripts/surfaceproperties*.txt in {game_dir}")
+        for path in paths:
+            path = os.path.abspath(path)
+            try:
+                stat = os.stat(path)
+                entry = cached['files'].get(path)
+                if entry is None or entry['mtime_ns'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+                    entry = {
+                        'mtime_ns': stat.st_mtime_ns,
+                        'size': stat.st_size,
+                        'sha256': cache.file_sha256(path),
+                        'entries': parse_surfaceproperties(path),
+                    }
+                    cached['files'][path] = entry
+                    changed = True
+            except OSError as e:
+                errors.append(f"{game}: {e}")
+                continue
+            loaded.append((game, path, entry['sha256'], entry['entries']))
+
+    if changed and cache_file:
+        # Forget files that are gone so the cache does not grow forever
+        cached['files'] = {path: entry for path, entry in cached['files'].items() if os.path.exists(path)}
+        try:
+            cache.write_pickle(cache_file, cached)
+        except OSError:
+            pass
+    return loaded, errors
+
+
+@timing.traced('surfaceprops.merge_game_surfaceprops', 'game_dirs')
+def merge_game_surfaceprops(catalog, game_dirs, use_cache=True):
+    # Entries already in the catalog gain the game as a supported game; new ones
+    # are added under the category of their base (or their gamematerial).
+    loaded, errors = load_game_surfaceprops(game_dirs, use_cache)
+    if not loaded:
+        catalog.errors = errors
+        return catalog
+
+    # The merge only depends on the YAML and the contents of the loaded files
+    digest = [f"{GAME_SCRIPTS_FORMAT}", catalog.version]
+    digest += [f"{game}\0{path}\0{sha256}" for game, path, sha256, _ in loaded]
+    version = cache.bytes_sha256("\n".join(digest).encode('utf-8'))
+    merged_file = os.path.join(cache.cache_dir('catalog'), 'merged.pickle') if use_cache else None
+    cached = cache.read_pickle(merged_file) if merged_file else None
+    if cached and cached.get('version') == version:
+        merged = SurfacePropCatalog(_unpack(*cached['columns'], cached['game_list']), cached['game_list'], version)
+        merged.errors = errors
+        return merged
+
+    surfaceprops = dict(catalog.surfaceprops)
+    by_subtype = {key.split(" - ")[-1].lower(): key for key in surfaceprops}
+
+    # Base chains can point at entries of any loaded file
+    imported = {}
+    for _, _, _, entries in loaded:
+        for name, base, density, gamematerial in entries:
+            imported.setdefault(name.lower(), (base, density, gamematerial))
+
+    def inherited(name, field):
+        seen = set()
+        while name and name.lower() not in seen:
+            seen.add(name.lower())
+            key = by_subtype.get(name.lower())
+            if key is not None and field == 'category':
+                return key.split(" - ")[0]
+            if key is not None and field == 'density' and surfaceprops[key].get('density'):
+                return surfaceprops[key]['density']
+            entry = imported.get(name.lower())
+            if entry is None:
+                return None
+            if field == 'density' and entry[1]:
+                return entry[1]
+            name = entry[0]
+        return None
+
+    for game, path, sha256, entries in loaded:
+        source = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+        for name, base, density, gamematerial in entries:
+            key = by_subtype.get(name.lower())
+            if key is not None:
+                details = dict(surfaceprops[key])
+                if game not in details['supported_games']:
+                    details['supported_games'] = details['supported_games'] + [game]
+                if not details.get('density'):
+                    details['density'] = density or inherited(base, 'density')
+                surfaceprops[key] = details
+                continue
+            category = inherited(base, 'category') or GAMEMATERIAL_CATEGORIES.get((gamematerial or '').upper(), CUSTOM_CATEGORY)
+            key = f"{category} - {name}"
+            description = f"From {game}/{source}" + (f", based on {base}." if base else ".")
+            surfaceprops[key] = {'description': description, 'supported_games': [game], 'density': density or inherited(base, 'density')}
+            by_subtype[name.lower()] = key
+
+    game_list = build_game_list(surfaceprops)
+    if merged_file:
+        try:
+            cache.write_pickle(merged_file, {'version': version, 'game_list': game_list, 'columns': _pack(surfaceprops, game_list)})
+        except OSError:
+            pass
+    merged = SurfacePropCatalog(surfaceprops, game_list, version)
+    merged.errors = errors
+    return merged
+
+
+def _game_dirs_file():
+    return os.path.join(cache.config_dir(), 'game_dirs.json')
+
+
+def load_game_dirs():
+    # Game folders picked in the GUI, remembered between sessions. Earlier
+    # versions kept them in the cache folder, which is still read as a fallback.
+    import json
+    for path in (_game_dirs_file(), os.path.join(cache.cache_dir(), 'settings', 'game_dirs.json')):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                game_dirs = json.load(f)
+            break
+        except (OSError, ValueError):
+            continue
+    else:
+        return []
+    return [game_dir for game_dir in game_dirs if isinstance(game_dir, str)] if isinstance(game_dirs, list) else []
+
+
+def save_game_dirs(game_dirs):
+    import json
+    cache.write_bytes(_game_dirs_file(), json.dumps(list(game_dirs), indent=2).encode('utf-8'))
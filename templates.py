@@ -0,0 +1,167 @@
+import os
+import re
+
+# {{ field }} and {{ loop.field }} insert a value; {% if field %} / {% if not field %},
+# {% else %}, {% endif %}, {% for item in field %} and {% endfor %} control blocks.
+# A line holding nothing but one {% %} tag is dropped entirely, newline included.
+TOKEN = re.compile(
+    r'^[ \t]*\{%(?P<line_tag>.*?)%\}[ \t]*(?:\r?\n|\Z)'
+    r'|\{%(?P<tag>.*?)%\}'
+    r'|\{\{(?P<field>.*?)\}\}',
+    re.MULTILINE)
+FIELD = re.compile(r'[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*$')
+NAME = re.compile(r'[A-Za-z_]\w*$')
+
+# Compiled templates keyed by absolute path, with the (mtime, size) they were read at
+_compiled = {}
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def _text(value):
+    return '' if value is None else str(value)
+
+
+def _field(value, name):
+    if isinstance(value, dict):
+        return value.get(name)
+    return getattr(value, name, None)
+
+
+class Template:
+    # Parsed once into Python source for a single render(values) function. Every
+    # block is joined from a tuple whose size is fixed at compile time, so
+    # rendering does no template parsing and sizes each join up front.
+    def __init__(self, text, name='<template>', fields=None):
+        self.name = name
+        self.fields = fields
+        self.source = f"def render(_values):\n    return {self._block(self._parse(text))}\n"
+        namespace = {'_text': _text, '_field': _field}
+        exec(compile(self.source, name, 'exec'), namespace)
+        self.render = namespace['render']
+
+    def _error(self, line, message):
+        return TemplateError(f"{self.name}, line {line}: {message}")
+
+    def _parse(self, text):
+        # Nested lists of ('text', str), ('field', line, path),
+        # ('if', line, negate, path, body, else_body) and ('for', line, name, path, body)
+        root = []
+        stack = [('root', 0, root)]
+        position = 0
+        line = 1
+        for match in TOKEN.finditer(text):
+            if match.start() > position:
+                stack[-1][2].append(('text', text[position:match.start()]))
+            line += text.count('\n', position, match.start())
+            position = match.end()
+            token_line = line
+            line += match.group(0).count('\n')
+
+            if match.group('field') is not None:
+                path = match.group('field').strip()
+                if not FIELD.match(path):
+                    raise self._error(token_line, f"'{{{{{match.group('field')}}}}}' is not a field name")
+                stack[-1][2].append(('field', token_line, path))
+                continue
+
+            tag = match.group('line_tag') if match.group('line_tag') is not None else match.group('tag')
+            words = tag.split()
+            keyword = words[0] if words else ''
+            if keyword == 'if' and len(words) in (2, 3) and (len(words) == 2 or words[1] == 'not') and FIELD.match(words[-1]):
+                node = ['if', token_line, len(words) == 3, words[-1], [], None]
+                stack[-1][2].append(node)
+                stack.append(('if', token_line, node[4], node))
+            elif keyword == 'else' and len(words) == 1:
+                if stack[-1][0] != 'if' or stack[-1][3][5] is not None:
+                    raise self._error(token_line, "{% else %} without a matching {% if %}")
+                node = stack.pop()[3]
+                node[5] = []
+                stack.append(('else', token_line, node[5], node))
+            elif keyword == 'endif' and len(words) == 1:
+                if stack[-1][0] not in ('if', 'else'):
+                    raise self._error(token_line, "{% endif %} without a matching {% if %}")
+                stack.pop()
+            elif keyword == 'for' and len(words) == 4 and words[2] == 'in' and NAME.match(words[1]) and FIELD.match(words[3]):
+                node = ['for', token_line, words[1], words[3], []]
+                stack[-1][2].append(node)
+                stack.append(('for', token_line, node[4], node))
+            elif keyword == 'endfor' and len(words) == 1:
+                if stack[-1][0] != 'for':
+                    raise self._error(token_line, "{% endfor %} without a matching {% for %}")
+                stack.pop()
+            else:
+                raise self._error(token_line, f"unknown tag '{{%{tag}%}}'")
+
+        if position < len(text):
+            stack[-1][2].append(('text', text[position:]))
+        if len(stack) > 1:
+            kind, open_line = stack[-1][0], stack[-1][1]
+            raise self._error(open_line, f"{{% {'if' if kind == 'else' else kind} %}} is never closed")
+        return root
+
+    def _lookup(self, line, path, scope):
+        name, *attributes = path.split('.')
+        if name in scope:
+            expression = scope[name]
+        elif self.fields is not None and name not in self.fields:
+            raise self._error(line, f"unknown field '{name}', expected one of: {', '.join(sorted(self.fields))}")
+        else:
+            expression = f"_values.get({name!r})"
+        for attribute in attributes:
+            expression = f"_field({expression}, {attribute!r})"
+        return expression
+
+    def _block(self, nodes, scope=None):
+        scope = scope or {}
+        parts = []
+        for node in nodes:
+            kind = node[0]
+            if kind == 'text':
+                # Neighbouring text merges into one constant
+                if parts and isinstance(parts[-1], str):
+                    parts[-1] += node[1]
+                else:
+                    parts.append(node[1])
+                continue
+            if kind == 'field':
+                expression = f"_text({self._lookup(node[1], node[2], scope)})"
+            elif kind == 'if':
+                _, line, negate, path, body, else_body = node
+                then_expression = self._block(body, scope)
+                else_expression = self._block(else_body or [], scope)
+                if negate:
+                    then_expression, else_expression = else_expression, then_expression
+                expression = f"({then_expression} if {self._lookup(line, path, scope)} else {else_expression})"
+            else:
+                _, line, name, path, body = node
+                variable = f"_loop{len(scope)}"
+                body_expression = self._block(body, dict(scope, **{name: variable}))
+                expression = f"''.join([{body_expression} for {variable} in ({self._lookup(line, path, scope)} or ())])"
+            parts.append(('expression', expression))
+
+        expressions = [repr(part) if isinstance(part, str) else part[1] for part in parts]
+        if not expressions:
+            return "''"
+        if len(expressions) == 1:
+            return expressions[0]
+        return f"''.join(({', '.join(expressions)},))"
+
+
+def load_template(path, fields=None):
+    # Recompiled only when the file's mtime or size changes
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise FileNotFoundError(f"QC template not found: {path}") from e
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _compiled.get(path)
+    if cached is not None and cached[0] == stamp and cached[1].fields == fields:
+        return cached[1]
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        template = Template(f.read(), os.path.basename(path), fields)
+    _compiled[path] = (stamp, template)
+    return template
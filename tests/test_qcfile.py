@@ -0,0 +1,32 @@
+import qcfile
+
+
+def write_qc(tmp_path, text):
+    path = tmp_path / 'model.qc'
+    path.write_text(text)
+    return str(path)
+
+
+def test_extra_sequences_and_cdmaterials_are_reported(tmp_path):
+    path = write_qc(tmp_path, '$modelname "props/crate.mdl"\n'
+                              '$body "body" "crate.smd"\n'
+                              '$cdmaterials "models/props"\n'
+                              '$cdmaterials "models/shared"\n'
+                              '$sequence "idle" "crate.smd"\n'
+                              '$sequence "walk" "crate_walk.smd"\n')
+    settings, unsupported = qcfile.qc_settings(qcfile.load_qc(path))
+
+    assert settings['cdmaterials'] == 'models/props'
+    assert settings['body_smd'] == str(tmp_path / 'crate.smd')
+    assert unsupported == ['$cdmaterials models/shared', '$sequence walk']
+
+
+def test_second_body_and_custom_sequence_are_reported(tmp_path):
+    path = write_qc(tmp_path, '$modelname "props/crate.mdl"\n'
+                              '$body "body" "crate.smd"\n'
+                              '$model "lid" "crate_lid.smd"\n'
+                              '$sequence "open" "crate_open.smd"\n')
+    settings, unsupported = qcfile.qc_settings(qcfile.load_qc(path))
+
+    assert settings['body_name'] == 'body'
+    assert unsupported == ['$model lid', '$sequence open']
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import threading
+import functools
+
+# Set QCGEN_TRACE to a file path to append one JSON object per timed span to it,
+# or to "-" for stderr. Unset, every hook below is a no-op.
+TRACE_ENV = 'QCGEN_TRACE'
+
+_target = os.environ.get(TRACE_ENV) or None
+_lock = threading.Lock()
+_fd = None
+
+
+def enabled():
+    return _target is not None
+
+
+def _emit(record):
+    global _fd
+    line = (json.dumps(record, default=str) + '\n').encode('utf-8')
+    with _lock:
+        if _target == '-':
+            os.write(2, line)
+            return
+        if _fd is None:
+            # O_APPEND keeps lines from worker processes writing the same file whole
+            _fd = os.open(_target, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        os.write(_fd, line)
+
+
+class _Span:
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.time()
+        self.counter = time.perf_counter()
+        return self
+
+    def set(self, **fields):
+        # Add fields known only once the work is done, e.g. a triangle count
+        self.fields.update(fields)
+
+    def __exit__(self, exc_type, exc, tb):
+        record = {
+            'name': self.name,
+            'ms': round((time.perf_counter() - self.counter) * 1000, 3),
+            'start': round(self.start, 6),
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name,
+        }
+        record.update(self.fields)
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        try:
+            _emit(record)
+        except OSError:
+            pass
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def set(self, **fields):
+        pass
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, **fields):
+    # with timing.span('stage', path=...) as s: ...; s.set(triangles=n)
+    if _target is None:
+        return _NO_SPAN
+    return _Span(name, fields)
+
+
+def record(name, started, **fields):
+    # A span that began at perf_counter() value `started` and ends now
+    if _target is None:
+        return
+    span = _Span(name, fields)
+    span.counter = started
+    span.start = time.time() - (time.perf_counter() - started)
+    span.__exit__(None, None, None)
+
+
+def traced(name, *arg_names):
+    # Decorator timing every call; arg_names are parameters copied into the record.
+    # Without QCGEN_TRACE the function is returned unwrapped.
+    def decorate(func):
+        if _target is None:
+            return func
+        import inspect
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            fields = {}
+            if arg_names:
+                bound = signature.bind_partial(*args, **kwargs)
+                fields = {arg: bound.arguments[arg] for arg in arg_names if arg in bound.arguments}
+            with _Span(name, fields):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def read_trace(path):
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+
+def summarize(records):
+    # {name: {count, total_ms, mean_ms, p50_ms, p95_ms, max_ms}}, slowest total first
+    by_name = {}
+    for record in records:
+        by_name.setdefault(record['name'], []).append(record['ms'])
+    summary = {}
+    for name, times in sorted(by_name.items(), key=lambda item: -sum(item[1])):
+        times.sort()
+        summary[name] = {
+            'count': len(times),
+            'total_ms': round(sum(times), 3),
+            'mean_ms': round(sum(times) / len(times), 3),
+            'p50_ms': times[len(times) // 2],
+            'p95_ms': times[min(len(times) - 1, int(len(times) * 0.95))],
+            'max_ms': times[-1],
+        }
+    return summary
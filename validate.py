@@ -0,0 +1,203 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import smd
+import timing
+
+# studiomdl limits (studio.h)
+MAX_MESH_VERTICES = 65536       # MAXSTUDIOVERTS, per material mesh after welding
+MAX_BONE_WEIGHTS = 3            # MAXSTUDIOBONEWEIGHTS
+MAX_MATERIALS = 32              # MAXSTUDIOSKINS
+MAX_BONES = 128                 # MAXSTUDIOBONES
+
+# Triangles smaller than this fraction of the model size squared count as zero-area
+DEGENERATE_AREA = 1e-12
+
+ERROR = 'error'
+WARNING = 'warning'
+
+# Reports keyed by path with the (mtime, size) they were made for, so regenerating
+# the same model does not parse and check its SMDs again. Only the latest version
+# of each file is kept, for the most recently used REPORT_CACHE_SIZE files.
+REPORT_CACHE_SIZE = 256
+_report_cache = OrderedDict()
+_report_lock = threading.Lock()
+
+
+def _issue(severity, check, message, count=None):
+    return {'severity': severity, 'check': check, 'message': message, 'count': count}
+
+
+# Low bits of a vertex key hold a hash of its attributes, the high bits its material
+HASH_BITS = 48
+
+
+def _vertex_keys(mesh):
+    # FNV-style hash of everything studiomdl compares when welding vertices, so
+    # equal keys are the same vertex of the same mesh
+    prime = np.uint64(0x100000001b3)
+    hashes = np.full(mesh.vertex_count, 0xcbf29ce484222325, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for array in (mesh.positions, mesh.normals, mesh.uvs, mesh.bone_weights):
+            bits = np.ascontiguousarray(array, dtype=np.float32).view(np.uint32)
+            for column in range(bits.shape[1]):
+                hashes ^= bits[:, column]
+                hashes *= prime
+        for column in range(mesh.bone_ids.shape[1]):
+            hashes ^= mesh.bone_ids[:, column].astype(np.uint64)
+            hashes *= prime
+    hashes &= np.uint64((1 << HASH_BITS) - 1)
+    hashes |= np.repeat(mesh.material_ids.astype(np.uint64), 3) << np.uint64(HASH_BITS)
+    return hashes
+
+
+def mesh_vertex_counts(mesh):
+    # Unique vertices per material, which is how studiomdl splits a model into meshes.
+    # A plain sort is far cheaper than np.unique(return_index=True) on millions of keys.
+    if mesh.vertex_count == 0:
+        return np.zeros(len(mesh.materials), dtype=np.int64)
+    keys = np.sort(_vertex_keys(mesh))
+    first = np.empty(len(keys), dtype=bool)
+    first[0] = True
+    np.not_equal(keys[1:], keys[:-1], out=first[1:])
+    materials = (keys[first] >> np.uint64(HASH_BITS)).astype(np.int64)
+    return np.bincount(materials, minlength=len(mesh.materials))
+
+
+def _finite_rows(array):
+    # Column-wise AND of a flat isfinite; much cheaper than .all(axis=1) on narrow rows
+    finite = np.isfinite(array.reshape(-1)).reshape(array.shape)
+    rows = finite[:, 0].copy()
+    for column in range(1, array.shape[1]):
+        rows &= finite[:, column]
+    return rows
+
+
+def degenerate_triangles(mesh, finite=None):
+    # Contiguous per-corner coordinate rows keep every step a simple 1-D loop
+    corners = mesh.positions.reshape(-1, 3, 3).transpose(1, 2, 0).astype(np.float64)
+    edge1 = corners[1] - corners[0]
+    edge2 = corners[2] - corners[0]
+    cross_x = edge1[1] * edge2[2] - edge1[2] * edge2[1]
+    cross_y = edge1[2] * edge2[0] - edge1[0] * edge2[2]
+    cross_z = edge1[0] * edge2[1] - edge1[1] * edge2[0]
+    area2_squared = cross_x * cross_x + cross_y * cross_y + cross_z * cross_z
+    if finite is None:
+        finite = _finite_rows(mesh.positions)
+    if finite.all():
+        size = max(float(corners[:, axis].max() - corners[:, axis].min()) for axis in range(3))
+    elif finite.any():
+        size = float(np.ptp(mesh.positions[finite], axis=0).max())
+    else:
+        size = 0.0
+    # Compare squared doubled areas to avoid a square root per triangle
+    return np.flatnonzero(area2_squared <= (2 * DEGENERATE_AREA * size * size) ** 2)
+
+
+@timing.traced('validate.validate_mesh')
+def validate_mesh(mesh):
+    issues = []
+    if mesh.triangle_count == 0:
+        issues.append(_issue(ERROR, 'empty', "has no triangles"))
+        return issues, {'triangles': 0, 'vertices': 0, 'materials': 0, 'bones': len(mesh.nodes)}
+
+    finite = _finite_rows(mesh.positions)
+    bad_positions = ~finite
+    bad_attributes = ~(_finite_rows(mesh.normals) & _finite_rows(mesh.uvs))
+    if bad_positions.any():
+        issues.append(_issue(ERROR, 'nan', f"{int(bad_positions.sum())} vertices have NaN or infinite positions, first in triangle {int(np.argmax(bad_positions)) // 3}", int(bad_positions.sum())))
+    if bad_attributes.any():
+        issues.append(_issue(ERROR, 'nan', f"{int(bad_attributes.sum())} vertices have NaN or infinite normals or UVs, first in triangle {int(np.argmax(bad_attributes)) // 3}", int(bad_attributes.sum())))
+
+    degenerate = degenerate_triangles(mesh, finite)
+    if len(degenerate):
+        issues.append(_issue(WARNING, 'degenerate', f"{len(degenerate)} zero-area triangles, first is triangle {int(degenerate[0])}", len(degenerate)))
+
+    links = ((mesh.bone_ids >= 0) & (mesh.bone_weights > 0)).sum(axis=1)
+    too_many_links = links > MAX_BONE_WEIGHTS
+    if too_many_links.any():
+        issues.append(_issue(WARNING, 'bone_weights', f"{int(too_many_links.sum())} vertices have more than {MAX_BONE_WEIGHTS} bone weights (up to {int(links.max())}); studiomdl keeps only the {MAX_BONE_WEIGHTS} strongest", int(too_many_links.sum())))
+
+    if len(mesh.materials) > MAX_MATERIALS:
+        issues.append(_issue(ERROR, 'materials', f"uses {len(mesh.materials)} materials, studiomdl allows {MAX_MATERIALS}", len(mesh.materials)))
+
+    if len(mesh.nodes) > MAX_BONES:
+        issues.append(_issue(ERROR, 'bones', f"has {len(mesh.nodes)} bones, studiomdl allows {MAX_BONES}", len(mesh.nodes)))
+
+    vertex_counts = mesh_vertex_counts(mesh)
+    for material_id in np.flatnonzero(vertex_counts > MAX_MESH_VERTICES):
+        issues.append(_issue(ERROR, 'mesh_vertices', f"material '{mesh.materials[material_id]}' has {int(vertex_counts[material_id])} vertices, studiomdl allows {MAX_MESH_VERTICES} per mesh; split it or use more materials", int(vertex_counts[material_id])))
+
+    stats = {
+        'triangles': mesh.triangle_count,
+        'vertices': int(vertex_counts.sum()),
+        'materials': len(mesh.materials),
+        'bones': len(mesh.nodes),
+        'max_mesh_vertices': int(vertex_counts.max()) if len(vertex_counts) else 0,
+    }
+    return issues, stats
+
+
+@timing.traced('validate.validate_smd', 'smd_path', 'role')
+def validate_smd(smd_path, role='body', mesh=None):
+    try:
+        stat = os.stat(smd_path)
+    except OSError as e:
+        return {'file': smd_path, 'role': role, 'issues': [_issue(ERROR, 'missing', f"cannot be read: {e.strerror}")], 'stats': {}}
+
+    path = os.path.abspath(smd_path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _report_lock:
+        cached = _report_cache.get(path)
+        if cached is not None and cached['stamp'] == stamp:
+            _report_cache.move_to_end(path)
+        else:
+            cached = None
+    if cached is None:
+        try:
+            if mesh is None:
+                mesh = smd.read_smd(smd_path)
+            issues, stats = validate_mesh(mesh)
+        except (ValueError, OSError) as e:
+            issues, stats = [_issue(ERROR, 'parse', str(e))], {}
+        cached = {'stamp': stamp, 'issues': issues, 'stats': stats}
+        with _report_lock:
+            _report_cache.pop(path, None)
+            _report_cache[path] = cached
+            while len(_report_cache) > REPORT_CACHE_SIZE:
+                _report_cache.popitem(last=False)
+    return {'file': smd_path, 'role': role, 'issues': cached['issues'], 'stats': cached['stats']}
+
+
+def smd_files_for(settings):
+    # The body plus every LOD and collision SMD the QC references
+    smd_dir = os.path.dirname(settings['body_smd'])
+    files = [(settings['body_smd'], 'body')]
+    for lod_entry in settings.get('lods', []):
+        if lod_entry.get('lod_model'):
+            files.append((os.path.join(smd_dir, lod_entry['lod_model']), 'lod'))
+    if settings.get('collisionmodel'):
+        files.append((os.path.join(smd_dir, settings['collisionmodel']), 'collision'))
+    return files
+
+
+def validate_settings(settings, meshes=None):
+    meshes = meshes or {}
+    return [validate_smd(path, role, meshes.get(path)) for path, role in smd_files_for(settings)]
+
+
+def has_errors(reports):
+    return any(issue['severity'] == ERROR for report in reports for issue in report['issues'])
+
+
+def summarize(reports):
+    # One line per issue, errors first
+    lines = []
+    for severity in (ERROR, WARNING):
+        for report in reports:
+            name = os.path.basename(report['file'])
+            for issue in report['issues']:
+                if issue['severity'] == severity:
+                    lines.append(f"{severity.upper()}: {name} ({report['role']}) {issue['message']}")
+    return lines
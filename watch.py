@@ -0,0 +1,59 @@
+import os
+import time
+
+WATCHED_EXTENSIONS = ('.smd',)
+
+
+def snapshot(root_dir, extra_paths=()):
+    # mtime/size stamp of every watched file, gathered with os.scandir
+    stamps = {}
+    pending = [root_dir]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.name.lower().endswith(WATCHED_EXTENSIONS):
+                        stat = entry.stat()
+                        stamps[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    continue
+    for path in extra_paths:
+        try:
+            stat = os.stat(path)
+            stamps[path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stamps[path] = None
+    return stamps
+
+
+def changed_paths(before, after):
+    return {path for path in before.keys() | after.keys() if before.get(path) != after.get(path)}
+
+
+def watch(root_dir, on_change, extra_paths=(), interval=1.0, debounce=0.5, should_stop=None):
+    # Calls on_change(paths) once a burst of changes has been quiet for
+    # `debounce` seconds, so a flurry of saves becomes a single pass.
+    previous = snapshot(root_dir, extra_paths)
+    pending = set()
+    last_change = 0.0
+    while not (should_stop and should_stop()):
+        time.sleep(min(interval, debounce) if pending else interval)
+        current = snapshot(root_dir, extra_paths)
+        changed = changed_paths(previous, current)
+        previous = current
+        if changed:
+            pending |= changed
+            last_change = time.monotonic()
+            continue
+        if pending and time.monotonic() - last_change >= debounce:
+            on_change(pending)
+            pending = set()
+            # Whatever the pass wrote itself is not a change to react to
+            previous = snapshot(root_dir, extra_paths)